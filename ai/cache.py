@@ -0,0 +1,193 @@
+import asyncio
+import hashlib
+import logging
+import re
+import time
+import unicodedata
+from collections import OrderedDict
+from datetime import timedelta
+
+from channels.db import database_sync_to_async
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+from django.utils import timezone
+
+from .models import ModelResult
+
+logger = logging.getLogger(__name__)
+
+DEFAULTS = {
+    "ENABLED": False,
+    "MAX_ENTRIES": 1024,  # 프로세스 메모리(LRU)에 보관하는 결과 수
+    "TTL": 60 * 60 * 24,  # seconds, 메모리·DB 모두 이보다 오래된 결과는 쓰지 않음
+    "DB_TIER": True,  # ModelResult.input_digest로 프로세스 간 결과 공유
+}
+
+_WHITESPACE = re.compile(r"\s+")
+
+
+def normalize_input(text):
+    """유니코드 정규화(NFKC) 후 공백을 하나로 합치고 앞뒤 공백을 없앤다."""
+    return _WHITESPACE.sub(" ", unicodedata.normalize("NFKC", text)).strip()
+
+
+def input_digest(model_version, text):
+    payload = f"{model_version}\0{normalize_input(text)}"
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+class InferenceCache:
+    """
+    (model_version, 정규화한 입력) 해시를 키로 하는 추론 결과 캐시.
+
+    프로세스 메모리 LRU → ModelResult(input_digest 인덱스) 순으로 찾고,
+    둘 다 없으면 compute()를 실행해 결과를 두 곳에 저장한다. 같은 키로
+    동시에 들어온 요청은 진행 중인 compute() 하나를 함께 기다린다.
+    """
+
+    def __init__(self, max_entries=1024, ttl=60 * 60 * 24, db_tier=True):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.db_tier = db_tier
+        self._entries = OrderedDict()  # digest -> (output, expires_at)
+        self._inflight = {}  # digest -> asyncio.Future
+        self.memory_hits = 0
+        self.db_hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.evictions = 0
+
+    def stats(self):
+        lookups = self.memory_hits + self.db_hits + self.misses + self.coalesced
+        hits = lookups - self.misses
+        return {
+            "entries": len(self._entries),
+            "memory_hits": self.memory_hits,
+            "db_hits": self.db_hits,
+            "misses": self.misses,
+            "coalesced": self.coalesced,
+            "evictions": self.evictions,
+            "hit_rate": hits / lookups if lookups else 0.0,
+        }
+
+    def _get_memory(self, digest):
+        entry = self._entries.get(digest)
+        if entry is None:
+            return None
+        output, expires_at = entry
+        if expires_at <= time.monotonic():
+            del self._entries[digest]
+            self.evictions += 1
+            return None
+        self._entries.move_to_end(digest)
+        return output
+
+    def _put_memory(self, digest, output):
+        self._entries[digest] = (output, time.monotonic() + self.ttl)
+        self._entries.move_to_end(digest)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def _get_db(self, digest):
+        fresh_after = timezone.now() - timedelta(seconds=self.ttl)
+        return (
+            ModelResult.objects.filter(input_digest=digest, created_at__gte=fresh_after)
+            .order_by("-created_at")
+            .values_list("output_data", flat=True)
+            .first()
+        )
+
+    def _put_db(self, digest, model_version, text, output, request_log):
+        ModelResult.objects.create(
+            request=request_log,
+            model_version=model_version,
+            input_data=text,
+            input_digest=digest,
+            output_data=output,
+        )
+
+    async def get_or_compute(self, model_version, text, compute, request_log=None):
+        """캐시된 결과를 반환하고, 없으면 `await compute()` 결과를 저장해 반환한다."""
+        digest = input_digest(model_version, text)
+        output = self._get_memory(digest)
+        if output is not None:
+            self.memory_hits += 1
+            return output
+
+        inflight = self._inflight.get(digest)
+        if inflight is not None:
+            self.coalesced += 1
+            try:
+                return await asyncio.shield(inflight)
+            except asyncio.CancelledError:
+                if not inflight.cancelled():
+                    raise
+            # 먼저 시작한 요청이 취소(연결 종료)되었으면 직접 다시 시도한다
+            self.coalesced -= 1
+            return await self.get_or_compute(model_version, text, compute, request_log)
+
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[digest] = future
+        try:
+            output = await self._load_or_compute(
+                digest, model_version, text, compute, request_log
+            )
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as exc:
+            # 기다리던 요청에도 같은 오류를 전달하고, 실패한 결과는 저장하지 않는다
+            future.set_exception(exc)
+            future.exception()  # 기다리는 쪽이 없어도 경고가 나지 않도록 소비
+            raise
+        finally:
+            del self._inflight[digest]
+        self._put_memory(digest, output)
+        future.set_result(output)
+        return output
+
+    async def _load_or_compute(self, digest, model_version, text, compute, request_log):
+        if self.db_tier:
+            output = await database_sync_to_async(self._get_db)(digest)
+            if output is not None:
+                self.db_hits += 1
+                return output
+
+        self.misses += 1
+        output = await compute()
+        if self.db_tier:
+            try:
+                await database_sync_to_async(self._put_db)(
+                    digest, model_version, text, output, request_log
+                )
+            except Exception:
+                # 저장 실패로 이미 만든 응답을 버리지 않는다
+                logger.exception("Failed to store cached model result")
+        return output
+
+
+_cache = None
+
+
+def get_result_cache():
+    """AI_RESULT_CACHE["ENABLED"]일 때만 프로세스 공용 캐시를 반환한다."""
+    global _cache
+    config = {**DEFAULTS, **getattr(settings, "AI_RESULT_CACHE", {})}
+    if not config["ENABLED"]:
+        return None
+    if _cache is None:
+        _cache = InferenceCache(
+            max_entries=config["MAX_ENTRIES"],
+            ttl=config["TTL"],
+            db_tier=config["DB_TIER"],
+        )
+    return _cache
+
+
+@receiver(setting_changed)
+def reset_result_cache(*, setting, **kwargs):
+    global _cache
+    if setting == "AI_RESULT_CACHE":
+        _cache = None
@@ -0,0 +1,449 @@
+import asyncio
+import json
+import logging
+import ssl
+import time
+from collections import deque
+from urllib.parse import urlsplit
+
+from channels.db import database_sync_to_async
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.core.signals import setting_changed
+from django.db import transaction
+from django.dispatch import receiver
+
+from .middleware import get_recorder
+from .models import ModelResult, RequestLog
+
+logger = logging.getLogger(__name__)
+
+DEFAULTS = {
+    "BASE_URL": None,  # 예: "http://model-server:8080/v1/generate"
+    "MODEL_VERSION": "default",
+    "POOL_SIZE": 10,  # 모델 서버로 열어 두는 keep-alive 연결 수
+    "MAX_CONCURRENCY": 32,  # 프로세스 전체 동시 호출 수
+    "PER_USER_CONCURRENCY": 2,  # 사용자별 동시 호출 수
+    "TIMEOUT": 30.0,  # seconds, deadline을 주지 않은 호출의 기본 제한 시간
+    "HEDGE_AFTER": None,  # seconds, 응답이 늦으면 다른 연결로 같은 요청을 한 번 더 보냄
+    "MAX_ATTEMPTS": 2,  # 재시도와 hedge를 합친 최대 요청 수
+    # 호출마다 RequestLog/ModelResult 저장. AI_REQUEST_LOG가 켜져 있으면
+    # RequestLogRecorder로 모아서 저장하고, 아니면 호출마다 바로 저장한다
+    "RECORD": True,
+    "BODY_MAX_LENGTH": 2048,  # RequestLog.request_body에 남기는 최대 길이
+}
+
+
+class AIBackendError(Exception):
+    def __init__(self, message, status=None, retryable=False):
+        super().__init__(message)
+        self.status = status
+        self.retryable = retryable
+
+
+class ConnectionPool:
+    """
+    한 호스트로의 HTTP/1.1 keep-alive 연결 풀. 최대 size개까지 열고, 쓰고 난
+    연결은 idle 목록에 돌려놓았다가 다음 요청에 다시 쓴다.
+    """
+
+    def __init__(self, host, port, use_ssl=False, size=10):
+        self.host = host
+        self.port = port
+        self.ssl = ssl.create_default_context() if use_ssl else None
+        self._slots = asyncio.Semaphore(size)
+        self._idle = deque()  # (reader, writer)
+        self.opened = 0
+        self.reused = 0
+
+    async def acquire(self):
+        await self._slots.acquire()
+        try:
+            while self._idle:
+                reader, writer = self._idle.pop()
+                if not reader.at_eof() and not writer.is_closing():
+                    self.reused += 1
+                    return reader, writer
+                writer.close()
+            connection = await asyncio.open_connection(
+                self.host, self.port, ssl=self.ssl
+            )
+        except BaseException:
+            self._slots.release()
+            raise
+        self.opened += 1
+        return connection
+
+    def release(self, connection, reusable):
+        if reusable:
+            self._idle.append(connection)
+        else:
+            connection[1].close()
+        self._slots.release()
+
+    def close(self):
+        while self._idle:
+            self._idle.pop()[1].close()
+
+
+async def _read_head(reader):
+    """상태 줄과 헤더를 읽어 (version, status, headers)를 반환한다."""
+    status_line = await reader.readline()
+    if not status_line:
+        raise ConnectionResetError("Connection closed by model server.")
+    version, status = status_line.decode("latin-1").split()[:2]
+    headers = {}
+    while (line := await reader.readline()) not in (b"\r\n", b"\n", b""):
+        name, _, value = line.decode("latin-1").partition(":")
+        headers[name.strip().lower()] = value.strip()
+    return version, int(status), headers
+
+
+async def _read_body(reader, status, headers):
+    """
+    응답 본문과 본문 끝을 길이로 알 수 있었는지(연결 재사용 가능 여부)를 반환한다.
+    chunked는 trailer까지 읽고, 길이 정보가 없으면 연결이 닫힐 때까지 읽는다.
+    """
+    if status in (204, 304):
+        return b"", True
+    if "chunked" in headers.get("transfer-encoding", "").lower():
+        chunks = []
+        while size := int((await reader.readline()).split(b";")[0], 16):
+            chunks.append(await reader.readexactly(size))
+            await reader.readline()
+        # trailer 헤더는 쓰지 않고 빈 줄까지 버린다
+        while (await reader.readline()) not in (b"\r\n", b"\n", b""):
+            pass
+        return b"".join(chunks), True
+    if "content-length" in headers:
+        return await reader.readexactly(int(headers["content-length"])), True
+    return await reader.read(), False
+
+
+async def post_json(connection, host, path, payload, headers=()):
+    """연결 하나로 JSON POST를 보내고 (status, body, keep_alive)를 반환한다."""
+    reader, writer = connection
+    body = json.dumps(payload).encode()
+    lines = [
+        f"POST {path} HTTP/1.1",
+        f"Host: {host}",
+        "Content-Type: application/json",
+        f"Content-Length: {len(body)}",
+        "Connection: keep-alive",
+        *(f"{name}: {value}" for name, value in headers),
+    ]
+    writer.write(("\r\n".join(lines) + "\r\n\r\n").encode() + body)
+    await writer.drain()
+
+    # 100 Continue 같은 1xx 중간 응답은 건너뛴다
+    version, status, response_headers = await _read_head(reader)
+    while 100 <= status < 200:
+        version, status, response_headers = await _read_head(reader)
+    body, delimited = await _read_body(reader, status, response_headers)
+    connection_tokens = {
+        token.strip().lower()
+        for token in response_headers.get("connection", "").split(",")
+    }
+    keep_alive = (
+        delimited and version == "HTTP/1.1" and "close" not in connection_tokens
+    )
+    return status, body, keep_alive
+
+
+class AIClient:
+    """
+    모델 서버 비동기 클라이언트.
+
+    - 프로세스 공용 keep-alive 연결 풀을 쓴다.
+    - 전체(MAX_CONCURRENCY)와 사용자별(PER_USER_CONCURRENCY) 세마포어로
+      동시 호출 수를 제한한다.
+    - deadline(time.monotonic 기준)이 대기, 연결, 응답 읽기 전체에 걸리고,
+      남은 시간을 X-Request-Timeout-Ms 헤더로 모델 서버에 전달한다.
+    - HEDGE_AFTER가 지나도 응답이 없으면 다른 연결로 같은 요청을 보내고
+      먼저 온 응답을 쓴다. 연결 오류, 429, 5xx는 MAX_ATTEMPTS까지 재시도한다.
+    - 호출마다 RequestLog(지연 시간 포함)와 ModelResult를 남긴다.
+      RequestLogRecorder가 있으면 큐에 넣고 배치로 저장한다.
+
+    모델 서버 계약: POST {"prompt", "model"} -> 200 {"output": str}
+    """
+
+    def __init__(
+        self,
+        base_url,
+        model_version="default",
+        pool_size=10,
+        max_concurrency=32,
+        per_user_concurrency=2,
+        timeout=30.0,
+        hedge_after=None,
+        max_attempts=2,
+        record=True,
+        body_max_length=2048,
+    ):
+        url = urlsplit(base_url)
+        self.base_url = base_url
+        self.host = url.hostname
+        self.port = url.port or (443 if url.scheme == "https" else 80)
+        self.use_ssl = url.scheme == "https"
+        self.path = (url.path or "/") + (f"?{url.query}" if url.query else "")
+        self.model_version = model_version
+        self.pool_size = pool_size
+        self.max_concurrency = max_concurrency
+        self.per_user_concurrency = per_user_concurrency
+        self.timeout = timeout
+        self.hedge_after = hedge_after
+        self.max_attempts = max_attempts
+        self.record = record
+        self.body_max_length = body_max_length
+        self._loop = None
+        self.pool = None
+        self.calls = 0
+        self.failures = 0
+        self.retries = 0
+        self.hedges = 0
+
+    @classmethod
+    def from_settings(cls):
+        config = get_config()
+        return cls(
+            config["BASE_URL"],
+            model_version=config["MODEL_VERSION"],
+            pool_size=config["POOL_SIZE"],
+            max_concurrency=config["MAX_CONCURRENCY"],
+            per_user_concurrency=config["PER_USER_CONCURRENCY"],
+            timeout=config["TIMEOUT"],
+            hedge_after=config["HEDGE_AFTER"],
+            max_attempts=config["MAX_ATTEMPTS"],
+            record=config["RECORD"],
+            body_max_length=config["BODY_MAX_LENGTH"],
+        )
+
+    def _bind_loop(self):
+        # 연결과 세마포어는 이벤트 루프에 묶이므로 루프마다 새로 만든다
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            self._loop = loop
+            self.pool = ConnectionPool(
+                self.host, self.port, use_ssl=self.use_ssl, size=self.pool_size
+            )
+            self._global = asyncio.Semaphore(self.max_concurrency)
+            self._per_user = {}  # user_id -> [Semaphore, 사용 중인 호출 수]
+
+    def stats(self):
+        pool = self.pool
+        return {
+            "calls": self.calls,
+            "failures": self.failures,
+            "retries": self.retries,
+            "hedges": self.hedges,
+            "connections_opened": pool.opened if pool else 0,
+            "connections_reused": pool.reused if pool else 0,
+        }
+
+    async def generate(self, prompt, user_id=None, deadline=None):
+        """모델 출력 텍스트를 반환한다. 시간이 다 되면 asyncio.TimeoutError."""
+        self._bind_loop()
+        deadline = deadline or time.monotonic() + self.timeout
+        self.calls += 1
+        started = time.perf_counter()
+        status = output = None
+        try:
+            await self._acquire(user_id, deadline)
+            try:
+                status, output = await self._hedged(prompt, deadline)
+            finally:
+                self._release(user_id)
+        except Exception as exc:
+            self.failures += 1
+            status = getattr(exc, "status", None)
+            raise
+        finally:
+            if self.record:
+                latency_ms = round((time.perf_counter() - started) * 1000)
+                try:
+                    await self._record(user_id, prompt, status, output, latency_ms)
+                except Exception:
+                    logger.exception("Failed to record AI backend call")
+        return output
+
+    async def _acquire(self, user_id, deadline):
+        await asyncio.wait_for(self._global.acquire(), deadline - time.monotonic())
+        if user_id is None:
+            return
+        entry = self._per_user.setdefault(
+            user_id, [asyncio.Semaphore(self.per_user_concurrency), 0]
+        )
+        entry[1] += 1
+        try:
+            await asyncio.wait_for(entry[0].acquire(), deadline - time.monotonic())
+        except BaseException:
+            self._release(user_id, acquired=False)
+            raise
+
+    def _release(self, user_id, acquired=True):
+        if user_id is not None:
+            entry = self._per_user[user_id]
+            if acquired:
+                entry[0].release()
+            entry[1] -= 1
+            if not entry[1]:
+                del self._per_user[user_id]
+        self._global.release()
+
+    def _wait_timeout(self, started, launched, deadline):
+        """다음 hedge 시각 또는 deadline까지 남은 시간."""
+        timeout = deadline - time.monotonic()
+        if self.hedge_after is not None and launched < self.max_attempts:
+            hedge_at = started + self.hedge_after * launched
+            timeout = min(timeout, hedge_at - time.monotonic())
+        return max(timeout, 0)
+
+    async def _hedged(self, prompt, deadline):
+        attempts = set()
+        started = time.monotonic()
+        launched = 0
+        error = None
+
+        def launch():
+            nonlocal launched
+            launched += 1
+            attempts.add(asyncio.create_task(self._attempt(prompt, deadline)))
+
+        launch()
+        try:
+            while attempts:
+                done, attempts = await asyncio.wait(
+                    attempts,
+                    timeout=self._wait_timeout(started, launched, deadline),
+                    return_when=asyncio.FIRST_COMPLETED,
+                )
+                if not done:
+                    if time.monotonic() >= deadline:
+                        raise asyncio.TimeoutError
+                    self.hedges += 1
+                    launch()
+                    continue
+                for task in done:
+                    error = task.exception()
+                    if error is None:
+                        return task.result()
+                    if isinstance(error, asyncio.TimeoutError) or not getattr(
+                        error, "retryable", True
+                    ):
+                        raise error
+                if not attempts and launched < self.max_attempts:
+                    self.retries += 1
+                    launch()
+            raise error
+        finally:
+            for task in attempts:
+                task.cancel()
+
+    async def _attempt(self, prompt, deadline):
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            raise asyncio.TimeoutError
+        connection = await asyncio.wait_for(self.pool.acquire(), remaining)
+        reusable = False
+        try:
+            remaining = deadline - time.monotonic()
+            status, body, reusable = await asyncio.wait_for(
+                post_json(
+                    connection,
+                    self.host,
+                    self.path,
+                    {"prompt": prompt, "model": self.model_version},
+                    headers=[("X-Request-Timeout-Ms", max(int(remaining * 1000), 1))],
+                ),
+                remaining,
+            )
+        except asyncio.TimeoutError:
+            # 3.11부터 asyncio.TimeoutError는 OSError의 하위 클래스인 TimeoutError
+            raise
+        except (OSError, asyncio.IncompleteReadError, ValueError) as exc:
+            raise AIBackendError(f"Model server request failed: {exc}", retryable=True)
+        finally:
+            self.pool.release(connection, reusable)
+        if status != 200:
+            raise AIBackendError(
+                f"Model server returned {status}.",
+                status=status,
+                retryable=status == 429 or status >= 500,
+            )
+        return status, json.loads(body)["output"]
+
+    async def _record(self, user_id, prompt, status, output, latency_ms):
+        request_log = RequestLog(
+            user_id=user_id,
+            endpoint=self.base_url[:255],
+            method="POST",
+            request_body=prompt[: self.body_max_length],
+            status_code=status,
+            latency_ms=latency_ms,
+        )
+        model_result = None
+        if output is not None:
+            model_result = ModelResult(
+                model_version=self.model_version,
+                input_data=prompt,
+                output_data=output,
+            )
+        recorder = get_recorder()
+        if recorder is not None:
+            recorder.record(request_log, model_result)
+        else:
+            await database_sync_to_async(self._save)(request_log, model_result)
+
+    def _save(self, request_log, model_result):
+        with transaction.atomic():
+            request_log.save()
+            if model_result is not None:
+                model_result.request = request_log
+                model_result.save()
+
+
+_client = None
+
+
+def get_config():
+    return {**DEFAULTS, **getattr(settings, "AI_CLIENT", {})}
+
+
+def get_client():
+    """AI_CLIENT["BASE_URL"]이 있을 때만 프로세스 공용 클라이언트를 반환한다."""
+    global _client
+    if _client is None:
+        if not get_config()["BASE_URL"]:
+            return None
+        _client = AIClient.from_settings()
+    return _client
+
+
+@receiver(setting_changed)
+def reset_client(*, setting, **kwargs):
+    global _client
+    if setting == "AI_CLIENT":
+        _client = None
+
+
+class ClientGenerator:
+    """
+    AI_REPLY_GENERATOR로 쓸 수 있는 생성기. 모델 서버 응답을 한 번에 내보낸다.
+
+        AI_REPLY_GENERATOR = "ai.client.client_generator"
+    """
+
+    @property
+    def model_version(self):
+        # BASE_URL이 없어도 결과 캐시 키는 설정의 모델 버전으로 만든다
+        client = get_client()
+        return client.model_version if client else get_config()["MODEL_VERSION"]
+
+    async def __call__(self, prompt, user_id=None):
+        client = get_client()
+        if client is None:
+            raise ImproperlyConfigured("AI_CLIENT['BASE_URL'] is not set.")
+        yield await client.generate(prompt, user_id=user_id)
+
+
+client_generator = ClientGenerator()
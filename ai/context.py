@@ -0,0 +1,77 @@
+from django.conf import settings
+from django.db.models import Q
+
+from chat.models import ChatLog
+
+from .memory import get_memory_store
+from .tokens import count_tokens
+
+DEFAULTS = {
+    "TOKEN_BUDGET": 4096,  # 프롬프트 전체(기억 + 대화) 최대 토큰 수
+    "MEMORY_BUDGET": 512,  # 그중 AICharacterState 기억이 차지할 수 있는 토큰 수
+    "MESSAGE_OVERHEAD": 3,  # 메시지마다 붙는 역할 표시 등의 토큰 수
+    "CHUNK_SIZE": 128,  # 한 번에 읽는 메시지 수
+}
+
+
+def get_config():
+    return {**DEFAULTS, **getattr(settings, "AI_CONTEXT", {})}
+
+
+def build_context(session_id, user_id, budget=None):
+    """
+    최신 메시지부터 (timestamp, id) 역순으로 거슬러 올라가며 예산이 찰 때까지
+    대화를 모은다. 토큰 수는 저장 시 계산한 ChatLog.token_count를 쓰므로
+    매 턴 전체 대화를 다시 세지 않고, 예산에 들어가는 메시지만 읽는다.
+
+    반환값: {"memory": str, "messages": [{"sender", "message"}, ...] (시간 순),
+    "token_count": int}
+    """
+    config = get_config()
+    budget = config["TOKEN_BUDGET"] if budget is None else budget
+    overhead = config["MESSAGE_OVERHEAD"]
+    chunk_size = config["CHUNK_SIZE"]
+
+    memory = get_memory_store().read(
+        user_id, budget=min(config["MEMORY_BUDGET"], budget)
+    )
+    used = count_tokens(memory)
+
+    messages = []
+    for _, _, sender, message, token_count in _recent_messages(session_id, chunk_size):
+        # 대화가 중간에 끊기지 않도록 처음으로 넘치는 메시지에서 멈춘다
+        if used + token_count + overhead > budget:
+            break
+        messages.append({"sender": sender, "message": message})
+        used += token_count + overhead
+
+    messages.reverse()
+    return {"memory": memory, "messages": messages, "token_count": used}
+
+
+def _recent_messages(session_id, chunk_size):
+    """세션 메시지를 최신부터 chunk_size개씩 (timestamp, id) keyset으로 읽는다."""
+    logs = ChatLog.objects.filter(session_id=session_id).order_by("-timestamp", "-id")
+    while True:
+        chunk = list(
+            logs.values_list("id", "timestamp", "sender", "message", "token_count")[
+                :chunk_size
+            ]
+        )
+        yield from chunk
+        if len(chunk) < chunk_size:
+            return
+        log_id, timestamp = chunk[-1][:2]
+        logs = logs.filter(
+            Q(timestamp__lt=timestamp) | Q(timestamp=timestamp, id__lt=log_id)
+        )
+
+
+def render_prompt(context):
+    """build_context() 결과를 생성기에 넘길 텍스트 프롬프트로 만든다."""
+    lines = [
+        f"{message['sender']}: {message['message']}" for message in context["messages"]
+    ]
+    if context["memory"]:
+        lines.insert(0, f"memory:\n{context['memory']}\n")
+    return "\n".join(lines)
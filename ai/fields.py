@@ -0,0 +1,91 @@
+import zlib
+
+from django.db import models
+
+try:
+    import zstandard
+except ImportError:  # 선택 의존성: 없으면 zlib만 쓴다
+    zstandard = None
+
+# 저장 값의 첫 바이트가 코덱을 나타낸다
+RAW = 0
+ZLIB = 1
+ZSTD = 2
+
+
+def compress_text(text, threshold=256, level=6):
+    """
+    text를 헤더 바이트 + 본문으로 인코딩한다. threshold 바이트보다 짧거나
+    압축해도 줄지 않으면 그대로(RAW) 저장한다. zstandard가 설치되어 있으면
+    zstd, 아니면 zlib을 쓴다.
+    """
+    data = text.encode()
+    if len(data) >= threshold:
+        if zstandard is not None:
+            codec, compressed = ZSTD, zstandard.ZstdCompressor(level).compress(data)
+        else:
+            codec, compressed = ZLIB, zlib.compress(data, level)
+        if len(compressed) < len(data):
+            return bytes([codec]) + compressed
+    return bytes([RAW]) + data
+
+
+def decompress_text(value):
+    value = bytes(value)  # PostgreSQL은 memoryview를 돌려준다
+    if not value:
+        return ""
+    codec, data = value[0], value[1:]
+    if codec == ZLIB:
+        data = zlib.decompress(data)
+    elif codec == ZSTD:
+        if zstandard is None:
+            raise RuntimeError("zstandard is required to read zstd-compressed text.")
+        data = zstandard.ZstdDecompressor().decompress(data)
+    elif codec != RAW:
+        raise ValueError(f"Unknown compressed text codec: {codec}")
+    return data.decode()
+
+
+class CompressedTextField(models.BinaryField):
+    """
+    파이썬에서는 str, DB에는 압축한 bytes(bytea/BLOB)로 저장하는 텍스트 필드.
+    내용으로 검색(contains 등)할 수 없으므로 그대로 조회할 일이 없는 큰
+    프롬프트/응답 본문에만 쓴다.
+    """
+
+    description = "Text stored compressed with a one-byte codec header"
+
+    def __init__(self, *args, threshold=256, level=6, **kwargs):
+        self.threshold = threshold
+        self.level = level
+        kwargs.setdefault("editable", True)
+        super().__init__(*args, **kwargs)
+
+    def deconstruct(self):
+        name, path, args, kwargs = super().deconstruct()
+        if self.threshold != 256:
+            kwargs["threshold"] = self.threshold
+        if self.level != 6:
+            kwargs["level"] = self.level
+        kwargs.pop("editable", None)
+        if not self.editable:
+            kwargs["editable"] = False
+        return name, path, args, kwargs
+
+    def from_db_value(self, value, expression, connection):
+        if value is None:
+            return value
+        return decompress_text(value)
+
+    def to_python(self, value):
+        if value is None or isinstance(value, str):
+            return value
+        return decompress_text(value)
+
+    def get_db_prep_value(self, value, connection, prepared=False):
+        if isinstance(value, str):
+            value = compress_text(value, self.threshold, self.level)
+        return super().get_db_prep_value(value, connection, prepared)
+
+    def value_to_string(self, obj):
+        return self.value_from_object(obj)
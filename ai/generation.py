@@ -0,0 +1,40 @@
+import asyncio
+import re
+
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+
+def get_reply_generator():
+    """
+    AI_REPLY_GENERATOR 설정(dotted path)의 응답 생성기를 반환한다.
+
+    생성기는 `generator(prompt, user_id=...)` 형태로 호출되며 토큰 문자열을
+    차례로 내보내는 async iterator를 반환해야 한다. 설정이 없으면 None.
+    """
+    path = getattr(settings, "AI_REPLY_GENERATOR", None)
+    return import_string(path) if path else None
+
+
+def generator_version(generator):
+    """결과 캐시 키에 쓰는 생성기 버전. 생성기에 model_version 속성이 있으면 그 값."""
+    return getattr(generator, "model_version", None) or (
+        f"{generator.__module__}.{generator.__qualname__}"
+    )
+
+
+async def stub_generator(prompt, user_id=None):
+    """테스트/로컬 개발용 생성기: 입력을 단어 단위로 되돌려준다."""
+    for token in re.findall(r"\S+\s*", f"You said: {prompt}"):
+        # 실제 모델처럼 토큰 사이에 이벤트 루프 제어권을 넘긴다
+        await asyncio.sleep(0)
+        yield token
+
+
+async def stub_batch_model(prompts):
+    """
+    테스트/로컬 개발용 배치 모델 (ai.scheduler의 BACKEND). 실제 모델처럼
+    호출마다 고정 비용이 있고 배치 크기에 따라 조금씩 느려진다.
+    """
+    await asyncio.sleep(0.002 + 0.0001 * len(prompts))
+    return [f"You said: {prompt}" for prompt in prompts]
@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand
+
+from ai.preprocessing import Preprocessor, preprocess_request_logs
+
+
+class Command(BaseCommand):
+    help = "RequestLog 본문을 전처리해 PreprocessedData로 저장합니다."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=500)
+        parser.add_argument(
+            "--max-tokens",
+            type=int,
+            default=256,
+            help="전처리한 입력에 남길 최대 토큰 수",
+        )
+
+    def handle(self, *args, batch_size, max_tokens, **options):
+        preprocessor = Preprocessor(max_tokens=max_tokens)
+        created = preprocess_request_logs(preprocessor, batch_size=batch_size)
+        self.stdout.write(self.style.SUCCESS(f"Preprocessed {created} request logs."))
+        self.stdout.write(
+            "entries={entries} hits={hits} misses={misses}".format(
+                **preprocessor.stats()
+            )
+        )
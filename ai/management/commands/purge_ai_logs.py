@@ -0,0 +1,31 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from ai.retention import RetentionJob, get_config
+
+
+class Command(BaseCommand):
+    help = "보존 기간이 지난 ai 로그를 일별 집계로 남기고 삭제합니다."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--once",
+            action="store_true",
+            help="한 번만 실행하고 종료합니다. 없으면 INTERVAL마다 반복합니다.",
+        )
+
+    def handle(self, *args, once, **options):
+        job = RetentionJob.from_settings()
+        try:
+            while True:
+                for source, result in job.run().items():
+                    self.stdout.write(
+                        f"{source}: rolled_up_days={result['rolled_up_days']} "
+                        f"deleted={result['deleted']}"
+                    )
+                if once:
+                    break
+                time.sleep(get_config()["INTERVAL"])
+        except KeyboardInterrupt:
+            pass
@@ -0,0 +1,273 @@
+import atexit
+import logging
+import threading
+from collections import deque
+
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.db import close_old_connections, transaction
+from django.db.models import F
+from django.dispatch import receiver
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from .models import AICharacterState, AIMemoryEntry
+from .tokens import count_tokens, truncate_tokens
+
+logger = logging.getLogger(__name__)
+
+DEFAULTS = {
+    "TOKEN_BUDGET": 1024,  # 프롬프트에 넣는 기억(요약 + 최근 항목)의 최대 토큰 수
+    "SUMMARY_BUDGET": 256,  # 그중 요약이 차지할 수 있는 토큰 수
+    "COMPACT_AT": 2048,  # 요약되지 않은 항목이 이만큼 쌓이면 압축을 예약
+    "MIN_IMPORTANCE": 1,  # 이보다 importance가 낮은 항목은 요약하지 않고 버림
+    # dotted path, (summary, contents, budget) -> 새 요약
+    "SUMMARIZER": "ai.memory.extractive_summary",
+    "BACKGROUND": True,  # False면 run_pending()을 직접 호출해야 압축된다 (테스트용)
+}
+
+
+def extractive_summary(summary, contents, budget):
+    """기존 요약 뒤에 접힌 항목을 이어 붙이고, 최근 줄부터 budget만큼 남긴다."""
+    lines = (summary.splitlines() if summary else []) + list(contents)
+    kept = []
+    used = 0
+    for line in reversed(lines):
+        tokens = count_tokens(line)
+        if used + tokens > budget:
+            break
+        kept.append(line)
+        used += tokens
+    return "\n".join(reversed(kept))
+
+
+class MemoryStore:
+    """
+    AICharacterState 기억을 요약(memory) + 최근 항목(AIMemoryEntry)으로 나눠
+    관리한다.
+
+    remember()는 항목 한 행을 추가하고 합계·last_interaction만 UPDATE 하므로
+    기억 전체를 다시 쓰지 않는다. 합계가 COMPACT_AT을 넘으면 백그라운드
+    스레드가 오래된 항목을 요약에 접고(중요도가 낮으면 버리고) 지운다.
+    read()는 요약과 최신 항목을 TOKEN_BUDGET까지만 읽는다.
+    """
+
+    def __init__(
+        self,
+        token_budget=1024,
+        summary_budget=256,
+        compact_at=2048,
+        min_importance=1,
+        summarizer=extractive_summary,
+        background=True,
+    ):
+        self.token_budget = token_budget
+        self.summary_budget = min(summary_budget, token_budget)
+        self.compact_at = compact_at
+        self.min_importance = min_importance
+        self.summarizer = summarizer
+        self.background = background
+        self._pending = deque()
+        self._scheduled = set()
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stopped = threading.Event()
+        self._thread = None
+        self.compactions = 0
+        self.folded = 0
+        self.evicted = 0
+        self.failed = 0
+
+    @classmethod
+    def from_settings(cls):
+        config = {**DEFAULTS, **getattr(settings, "AI_MEMORY", {})}
+        return cls(
+            token_budget=config["TOKEN_BUDGET"],
+            summary_budget=config["SUMMARY_BUDGET"],
+            compact_at=config["COMPACT_AT"],
+            min_importance=config["MIN_IMPORTANCE"],
+            summarizer=import_string(config["SUMMARIZER"]),
+            background=config["BACKGROUND"],
+        )
+
+    def stats(self):
+        return {
+            "pending": len(self._pending),
+            "compactions": self.compactions,
+            "folded": self.folded,
+            "evicted": self.evicted,
+            "failed": self.failed,
+        }
+
+    def remember(self, user_id, content, importance=1):
+        token_count = count_tokens(content)
+        if not token_count:
+            return None
+        with transaction.atomic():
+            state, _ = AICharacterState.objects.get_or_create(user_id=user_id)
+            entry = AIMemoryEntry.objects.create(
+                state=state,
+                content=content,
+                token_count=token_count,
+                importance=importance,
+            )
+            AICharacterState.objects.filter(id=state.id).update(
+                token_count=F("token_count") + token_count,
+                last_interaction=timezone.now(),
+            )
+            total = (
+                AICharacterState.objects.filter(id=state.id)
+                .values_list("token_count", flat=True)
+                .get()
+            )
+            if total > self.compact_at:
+                transaction.on_commit(lambda: self.schedule(state.id))
+        return entry
+
+    def touch(self, user_id):
+        """기억은 그대로 두고 last_interaction만 갱신한다."""
+        return AICharacterState.objects.filter(user_id=user_id).update(
+            last_interaction=timezone.now()
+        )
+
+    def read(self, user_id, budget=None):
+        """요약과 최근 항목을 시간 순으로 합친 텍스트. 최대 budget 토큰."""
+        budget = self.token_budget if budget is None else budget
+        state = (
+            AICharacterState.objects.filter(user_id=user_id)
+            .values_list("id", "memory")
+            .first()
+        )
+        if state is None:
+            return ""
+        state_id, summary = state
+        summary = truncate_tokens(summary or "", min(self.summary_budget, budget))
+        remaining = budget - count_tokens(summary)
+
+        # 항목은 최소 1토큰이므로 remaining 행까지만 읽으면 된다
+        lines = []
+        recent = (
+            AIMemoryEntry.objects.filter(state_id=state_id)
+            .order_by("-created_at", "-id")
+            .values_list("content", "token_count")[: max(remaining, 0)]
+        )
+        for content, token_count in recent:
+            if token_count > remaining:
+                continue
+            lines.append(content)
+            remaining -= token_count
+        if summary:
+            lines.append(summary)
+        return "\n".join(reversed(lines))
+
+    def compact(self, state_id):
+        """
+        요약되지 않은 항목이 (TOKEN_BUDGET - SUMMARY_BUDGET) 이하가 되도록
+        오래된 항목부터 요약에 접거나 버린다. 처리한 항목 수를 반환한다.
+        """
+        target = self.token_budget - self.summary_budget
+        with transaction.atomic():
+            state = AICharacterState.objects.select_for_update().get(id=state_id)
+            if state.token_count <= target:
+                return 0
+            excess = state.token_count - target
+            removed = []
+            folded = []
+            removed_tokens = 0
+            entries = (
+                AIMemoryEntry.objects.filter(state_id=state_id)
+                .order_by("created_at", "id")
+                .values_list("id", "content", "token_count", "importance")
+            )
+            for entry_id, content, token_count, importance in entries.iterator():
+                if removed_tokens >= excess:
+                    break
+                removed.append(entry_id)
+                removed_tokens += token_count
+                if importance >= self.min_importance:
+                    folded.append(content)
+
+            summary = state.memory or ""
+            if folded:
+                summary = self.summarizer(summary, folded, self.summary_budget)
+            AIMemoryEntry.objects.filter(id__in=removed).delete()
+            AICharacterState.objects.filter(id=state_id).update(
+                memory=summary, token_count=F("token_count") - removed_tokens
+            )
+        self.compactions += 1
+        self.folded += len(folded)
+        self.evicted += len(removed) - len(folded)
+        return len(removed)
+
+    def schedule(self, state_id):
+        with self._lock:
+            if state_id in self._scheduled:
+                return
+            self._scheduled.add(state_id)
+            self._pending.append(state_id)
+        if self.background:
+            if self._thread is None:
+                self._start()
+            self._wakeup.set()
+
+    def _start(self):
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(
+                    target=self._run, name="ai-memory-compactor", daemon=True
+                )
+                self._thread.start()
+
+    def _run(self):
+        while not self._stopped.is_set():
+            self._wakeup.wait()
+            self._wakeup.clear()
+            close_old_connections()
+            self.run_pending()
+
+    def run_pending(self):
+        """예약된 상태를 모두 압축하고 처리한 상태 수를 반환한다."""
+        processed = 0
+        while self._pending:
+            with self._lock:
+                state_id = self._pending.popleft()
+                self._scheduled.discard(state_id)
+            try:
+                self.compact(state_id)
+            except Exception:
+                self.failed += 1
+                logger.exception("Failed to compact AI memory %s", state_id)
+            processed += 1
+        return processed
+
+    def stop(self):
+        self._stopped.set()
+        self._wakeup.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+
+_store = None
+
+
+def get_memory_store():
+    global _store
+    if _store is None:
+        _store = MemoryStore.from_settings()
+    return _store
+
+
+@receiver(setting_changed)
+def reset_memory_store(*, setting, **kwargs):
+    global _store
+    if setting == "AI_MEMORY":
+        if _store is not None:
+            _store.stop()
+        _store = None
+
+
+@atexit.register
+def _stop_on_shutdown():
+    if _store is not None:
+        _store.stop()
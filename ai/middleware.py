@@ -0,0 +1,250 @@
+import atexit
+import logging
+import random
+import threading
+import time
+from collections import deque
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.db import close_old_connections, transaction
+from django.dispatch import receiver
+
+from .models import ModelResult, RequestLog
+
+logger = logging.getLogger(__name__)
+
+DEFAULTS = {
+    "ENABLED": False,
+    "BACKGROUND": True,  # False면 flush()를 직접 호출해야 저장된다 (테스트용)
+    "MAX_QUEUE": 10000,  # 저장 대기 중인 로그 최대 개수, 넘치면 버리고 센다
+    "BATCH_SIZE": 500,
+    "FLUSH_INTERVAL": 1.0,  # seconds
+    "BODY_SAMPLE_RATE": 0.1,  # 요청 본문을 남길 비율 (0~1)
+    "BODY_MAX_LENGTH": 2048,  # 저장하는 본문 최대 길이 (문자)
+    "BODY_READ_LIMIT": 64 * 1024,  # bytes, 이보다 큰 본문(업로드 등)은 읽지 않음
+    # prefix, 로그 자체를 남기지 않음
+    "EXCLUDE_PATHS": ["/admin/", "/static/", "/media/"],
+    # prefix, 본문을 남기지 않음 (비밀번호 등)
+    "BODY_EXCLUDE_PATHS": ["/api/auth/", "/api/users/"],
+}
+
+
+class RequestLogRecorder:
+    """
+    요청 로그를 프로세스 메모리의 bounded 큐에 넣고, 백그라운드 스레드가
+    BATCH_SIZE 또는 FLUSH_INTERVAL 단위로 bulk_create 한다. 요청 경로에서는
+    deque.append만 하므로 DB 왕복이 없다. 큐가 가득 차면 새 로그를 버리고
+    dropped로 센다. 로그에 딸린 ModelResult도 같은 배치에서 함께 저장한다.
+    """
+
+    def __init__(
+        self, max_queue=10000, batch_size=500, flush_interval=1.0, background=True
+    ):
+        self.max_queue = max_queue
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.background = background
+        self._pending = deque()
+        self._wakeup = threading.Event()
+        self._flush_lock = threading.Lock()
+        self._thread = None
+        self._stopped = threading.Event()
+        self.recorded = 0
+        self.dropped = 0
+        self.failed = 0
+        self.flush_count = 0
+        self.last_flush_latency = 0.0
+
+    @property
+    def depth(self):
+        return len(self._pending)
+
+    def stats(self):
+        return {
+            "depth": self.depth,
+            "recorded": self.recorded,
+            "dropped": self.dropped,
+            "failed": self.failed,
+            "flush_count": self.flush_count,
+            "last_flush_latency_ms": self.last_flush_latency * 1000,
+        }
+
+    def record(self, request_log, model_result=None):
+        if len(self._pending) >= self.max_queue:
+            self.dropped += 1
+            return False
+        self._pending.append((request_log, model_result))
+        if self.background:
+            if self._thread is None:
+                self._start()
+            if len(self._pending) >= self.batch_size:
+                self._wakeup.set()
+        return True
+
+    def _start(self):
+        with self._flush_lock:
+            if self._thread is None:
+                self._thread = threading.Thread(
+                    target=self._run, name="request-log-flusher", daemon=True
+                )
+                self._thread.start()
+
+    def _run(self):
+        while not self._stopped.is_set():
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            close_old_connections()
+            self.flush()
+
+    def flush(self):
+        """쌓인 로그를 BATCH_SIZE씩 저장하고 저장한 개수를 반환한다."""
+        written = 0
+        with self._flush_lock:
+            while self._pending:
+                batch = []
+                while self._pending and len(batch) < self.batch_size:
+                    batch.append(self._pending.popleft())
+                started = time.perf_counter()
+                try:
+                    self._write(batch)
+                except Exception:
+                    self.failed += len(batch)
+                    logger.exception("Failed to write %d request logs", len(batch))
+                    continue
+                self.last_flush_latency = time.perf_counter() - started
+                self.flush_count += 1
+                self.recorded += len(batch)
+                written += len(batch)
+        return written
+
+    def _write(self, batch):
+        with transaction.atomic():
+            RequestLog.objects.bulk_create([request_log for request_log, _ in batch])
+            results = []
+            for request_log, model_result in batch:
+                if model_result is not None:
+                    model_result.request = request_log
+                    results.append(model_result)
+            if results:
+                ModelResult.objects.bulk_create(results)
+
+    def stop(self):
+        self._stopped.set()
+        self._wakeup.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        self.flush()
+
+
+_recorder = None
+_config = None
+
+
+def get_config():
+    global _config
+    if _config is None:
+        _config = {**DEFAULTS, **getattr(settings, "AI_REQUEST_LOG", {})}
+    return _config
+
+
+def get_recorder():
+    """AI_REQUEST_LOG["ENABLED"]일 때만 프로세스 공용 recorder를 반환한다."""
+    global _recorder
+    config = get_config()
+    if not config["ENABLED"]:
+        return None
+    if _recorder is None:
+        _recorder = RequestLogRecorder(
+            max_queue=config["MAX_QUEUE"],
+            batch_size=config["BATCH_SIZE"],
+            flush_interval=config["FLUSH_INTERVAL"],
+            background=config["BACKGROUND"],
+        )
+    return _recorder
+
+
+@receiver(setting_changed)
+def reset_recorder(*, setting, **kwargs):
+    global _recorder, _config
+    if setting == "AI_REQUEST_LOG":
+        if _recorder is not None:
+            _recorder.stop()
+        _recorder = None
+        _config = None
+
+
+@atexit.register
+def _flush_on_shutdown():
+    if _recorder is not None:
+        _recorder.stop()
+
+
+class RequestLogMiddleware:
+    """
+    endpoint, method, status, 처리 시간, user와 (샘플링·잘라낸) 요청 본문을 RequestLog로
+    남긴다. 저장은 RequestLogRecorder가 백그라운드에서 모아서 한다.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        recorder = get_recorder()
+        if recorder is None or self.is_excluded(request.path):
+            return self.get_response(request)
+        body = self.capture_body(request)
+        started = time.perf_counter()
+        response = self.get_response(request)
+        recorder.record(self.build_log(request, response, body, started))
+        return response
+
+    async def __acall__(self, request):
+        recorder = get_recorder()
+        if recorder is None or self.is_excluded(request.path):
+            return await self.get_response(request)
+        body = self.capture_body(request)
+        started = time.perf_counter()
+        response = await self.get_response(request)
+        recorder.record(self.build_log(request, response, body, started))
+        return response
+
+    def is_excluded(self, path):
+        return path.startswith(tuple(get_config()["EXCLUDE_PATHS"]))
+
+    def capture_body(self, request):
+        # 뷰가 스트림을 읽기 전에 가져와야 한다. 큰 본문(업로드)은 읽지 않는다
+        config = get_config()
+        if (
+            request.method in ("GET", "HEAD", "OPTIONS")
+            or random.random() >= config["BODY_SAMPLE_RATE"]
+            or request.path.startswith(tuple(config["BODY_EXCLUDE_PATHS"]))
+        ):
+            return None
+        try:
+            content_length = int(request.META.get("CONTENT_LENGTH") or 0)
+        except ValueError:
+            return None
+        if not content_length or content_length > config["BODY_READ_LIMIT"]:
+            return None
+        return request.body.decode("utf-8", "replace")[: config["BODY_MAX_LENGTH"]]
+
+    def build_log(self, request, response, body, started):
+        user = getattr(request, "user", None)
+        return RequestLog(
+            user_id=user.pk if user is not None and user.is_authenticated else None,
+            endpoint=request.path[:255],
+            method=request.method,
+            request_body=body,
+            status_code=response.status_code,
+            latency_ms=round((time.perf_counter() - started) * 1000),
+        )
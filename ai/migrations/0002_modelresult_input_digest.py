@@ -0,0 +1,28 @@
+# Generated by Django 5.2.18 on 2026-10-18 04:44
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ai', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='modelresult',
+            name='input_digest',
+            field=models.CharField(blank=True, default='', max_length=64),
+        ),
+        migrations.AlterField(
+            model_name='modelresult',
+            name='request',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='model_results', to='ai.requestlog'),
+        ),
+        migrations.AddIndex(
+            model_name='modelresult',
+            index=models.Index(fields=['input_digest', '-created_at'], name='modelresult_digest_idx'),
+        ),
+    ]
@@ -0,0 +1,71 @@
+# Generated by Django 5.2.18 on 2026-10-18 04:50
+
+import re
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+TOKEN = re.compile(r"\w+|[^\w\s]")
+
+
+def split_legacy_memory(apps, schema_editor):
+    """기존 memory 텍스트를 줄 단위 AIMemoryEntry로 옮긴다. 요약은 압축이 만든다."""
+    AICharacterState = apps.get_model("ai", "AICharacterState")
+    AIMemoryEntry = apps.get_model("ai", "AIMemoryEntry")
+    states = AICharacterState.objects.exclude(memory__isnull=True).exclude(memory="")
+    for state in states.iterator():
+        entries = [
+            AIMemoryEntry(
+                state_id=state.id,
+                content=line.strip(),
+                token_count=max(len(TOKEN.findall(line)), 1),
+            )
+            for line in state.memory.splitlines()
+            if line.strip()
+        ]
+        AIMemoryEntry.objects.bulk_create(entries)
+        AICharacterState.objects.filter(id=state.id).update(
+            memory=None, token_count=sum(entry.token_count for entry in entries)
+        )
+
+
+def join_memory_entries(apps, schema_editor):
+    AICharacterState = apps.get_model("ai", "AICharacterState")
+    AIMemoryEntry = apps.get_model("ai", "AIMemoryEntry")
+    for state in AICharacterState.objects.iterator():
+        lines = [state.memory] if state.memory else []
+        lines += AIMemoryEntry.objects.filter(state_id=state.id).order_by(
+            "created_at", "id"
+        ).values_list("content", flat=True)
+        if lines:
+            AICharacterState.objects.filter(id=state.id).update(memory="\n".join(lines))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ai', '0002_modelresult_input_digest'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='aicharacterstate',
+            name='token_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.CreateModel(
+            name='AIMemoryEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('content', models.TextField()),
+                ('token_count', models.PositiveIntegerField()),
+                ('importance', models.PositiveSmallIntegerField(default=1)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('state', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='entries', to='ai.aicharacterstate')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['state', '-created_at'], name='aimemoryentry_recent_idx')],
+            },
+        ),
+        migrations.RunPython(split_legacy_memory, join_memory_entries),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 04:57
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ai', '0003_memory_entries'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='requestlog',
+            name='latency_ms',
+            field=models.PositiveIntegerField(blank=True, null=True),
+        ),
+    ]
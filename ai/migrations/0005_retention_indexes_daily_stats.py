@@ -0,0 +1,48 @@
+# Generated by Django 5.2.18 on 2026-10-18 04:59
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ai', '0004_requestlog_latency_ms'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AIDailyStats',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('source', models.CharField(choices=[('request_log', 'Request log'), ('model_result', 'Model result'), ('preprocessed_data', 'Preprocessed data')], max_length=20)),
+                ('endpoint', models.CharField(blank=True, default='', max_length=255)),
+                ('method', models.CharField(blank=True, default='', max_length=10)),
+                ('status_code', models.IntegerField(blank=True, null=True)),
+                ('model_version', models.CharField(blank=True, default='', max_length=100)),
+                ('count', models.PositiveIntegerField()),
+                ('latency_p50_ms', models.PositiveIntegerField(blank=True, null=True)),
+                ('latency_p95_ms', models.PositiveIntegerField(blank=True, null=True)),
+                ('latency_p99_ms', models.PositiveIntegerField(blank=True, null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='modelresult',
+            index=models.Index(fields=['created_at'], name='modelresult_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='preprocesseddata',
+            index=models.Index(fields=['created_at'], name='preprocessed_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='requestlog',
+            index=models.Index(fields=['created_at'], name='requestlog_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='aidailystats',
+            index=models.Index(fields=['source', 'date'], name='aidailystats_source_date_idx'),
+        ),
+    ]
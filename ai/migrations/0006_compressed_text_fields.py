@@ -0,0 +1,77 @@
+from django.db import migrations
+
+import ai.fields
+
+BATCH_SIZE = 500
+
+FIELDS = {
+    "requestlog": ["request_body"],
+    "modelresult": ["input_data", "output_data"],
+    "preprocesseddata": ["original_input", "cleaned_input"],
+}
+
+
+def copy_fields(apps, source_suffix, target_suffix):
+    # 배치마다 따로 커밋되도록 이 마이그레이션은 atomic = False
+    for model_name, fields in FIELDS.items():
+        Model = apps.get_model("ai", model_name)
+        sources = [f"{field}{source_suffix}" for field in fields]
+        targets = [f"{field}{target_suffix}" for field in fields]
+        last_id = 0
+        while True:
+            batch = list(
+                Model.objects.filter(id__gt=last_id)
+                .order_by("id")
+                .only("id", *sources)[:BATCH_SIZE]
+            )
+            if not batch:
+                break
+            for row in batch:
+                for source, target in zip(sources, targets):
+                    setattr(row, target, getattr(row, source))
+            Model.objects.bulk_update(batch, targets)
+            last_id = batch[-1].id
+
+
+def compress_rows(apps, schema_editor):
+    copy_fields(apps, "", "_compressed")
+
+
+def decompress_rows(apps, schema_editor):
+    copy_fields(apps, "_compressed", "")
+
+
+class Migration(migrations.Migration):
+
+    atomic = False
+
+    dependencies = [
+        ('ai', '0005_retention_indexes_daily_stats'),
+    ]
+
+    operations = [
+        *(
+            migrations.AddField(
+                model_name=model_name,
+                name=f'{field}_compressed',
+                field=ai.fields.CompressedTextField(blank=True, null=True),
+            )
+            for model_name, fields in FIELDS.items()
+            for field in fields
+        ),
+        migrations.RunPython(compress_rows, decompress_rows),
+        *(
+            migrations.RemoveField(model_name=model_name, name=field)
+            for model_name, fields in FIELDS.items()
+            for field in fields
+        ),
+        *(
+            migrations.RenameField(
+                model_name=model_name,
+                old_name=f'{field}_compressed',
+                new_name=field,
+            )
+            for model_name, fields in FIELDS.items()
+            for field in fields
+        ),
+    ]
@@ -1,5 +1,8 @@
 from django.conf import settings
 from django.db import models
+from django.utils.translation import gettext_lazy as _
+
+from .fields import CompressedTextField
 
 
 class RequestLog(models.Model):
@@ -8,38 +11,65 @@ class RequestLog(models.Model):
     )
     endpoint = models.CharField(max_length=255)
     method = models.CharField(max_length=10)
-    request_body = models.TextField(null=True, blank=True)
+    request_body = CompressedTextField(null=True, blank=True)
     status_code = models.IntegerField(null=True, blank=True)
+    latency_ms = models.PositiveIntegerField(null=True, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=["created_at"], name="requestlog_created_idx"),
+        ]
+
     def __str__(self):
         return f"{self.method} {self.endpoint} - {self.status_code}"
 
 
 class ModelResult(models.Model):
+    # 웹소켓 응답처럼 RequestLog 없이 캐시에 저장되는 결과도 있다
     request = models.ForeignKey(
-        RequestLog, on_delete=models.CASCADE, related_name="model_results"
+        RequestLog,
+        on_delete=models.CASCADE,
+        related_name="model_results",
+        null=True,
+        blank=True,
     )
     model_version = models.CharField(max_length=100)
-    input_data = models.TextField(null=True, blank=True)
-    output_data = models.TextField(null=True, blank=True)
+    input_data = CompressedTextField(null=True, blank=True)
+    # sha256(model_version, 정규화한 input_data), 결과 캐시 조회 키 (ai/cache.py)
+    input_digest = models.CharField(max_length=64, blank=True, default="")
+    output_data = CompressedTextField(null=True, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=["input_digest", "-created_at"],
+                name="modelresult_digest_idx",
+            ),
+            models.Index(fields=["created_at"], name="modelresult_created_idx"),
+        ]
+
     def __str__(self):
-        return f"Model result for request {self.request.id}"
+        return f"Model result for request {self.request_id}"
 
 
 class PreprocessedData(models.Model):
     request = models.ForeignKey(
         RequestLog, on_delete=models.CASCADE, related_name="preprocessed_data"
     )
-    original_input = models.TextField(null=True, blank=True)
-    cleaned_input = models.TextField(null=True, blank=True)
+    original_input = CompressedTextField(null=True, blank=True)
+    cleaned_input = CompressedTextField(null=True, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=["created_at"], name="preprocessed_created_idx"),
+        ]
+
     def __str__(self):
         return f"Preprocessed data for request {self.request.id}"
 
@@ -50,10 +80,67 @@ class AICharacterState(models.Model):
         on_delete=models.CASCADE,
         related_name="ai_character_state",
     )
+    # 압축(compaction)으로 접힌 오래된 기억의 요약. 최근 기억은 AIMemoryEntry
     memory = models.TextField(null=True, blank=True)
+    # 아직 요약되지 않은 AIMemoryEntry.token_count 합계
+    token_count = models.PositiveIntegerField(default=0)
     last_interaction = models.DateTimeField(null=True, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
     def __str__(self):
         return f"AI character state for {self.user.email}"
+
+
+class AIMemoryEntry(models.Model):
+    state = models.ForeignKey(
+        AICharacterState, on_delete=models.CASCADE, related_name="entries"
+    )
+    content = models.TextField()
+    token_count = models.PositiveIntegerField()
+    # 높을수록 오래 남는다. 압축 때 낮은 항목은 요약에 넣지 않고 버린다
+    importance = models.PositiveSmallIntegerField(default=1)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=["state", "-created_at"], name="aimemoryentry_recent_idx"
+            ),
+        ]
+
+    def __str__(self):
+        return f"Memory entry {self.id} for state {self.state_id}"
+
+
+class StatsSource(models.TextChoices):
+    REQUEST_LOG = "request_log", _("Request log")
+    MODEL_RESULT = "model_result", _("Model result")
+    PREPROCESSED_DATA = "preprocessed_data", _("Preprocessed data")
+
+
+class AIDailyStats(models.Model):
+    """보존 기간이 지나 삭제되는 로그 행의 일별 집계 (ai/retention.py)."""
+
+    date = models.DateField()
+    source = models.CharField(max_length=20, choices=StatsSource.choices)
+    # source에 해당하지 않는 항목은 빈 값 (예: model_result의 endpoint)
+    endpoint = models.CharField(max_length=255, blank=True, default="")
+    method = models.CharField(max_length=10, blank=True, default="")
+    status_code = models.IntegerField(null=True, blank=True)
+    model_version = models.CharField(max_length=100, blank=True, default="")
+    count = models.PositiveIntegerField()
+    latency_p50_ms = models.PositiveIntegerField(null=True, blank=True)
+    latency_p95_ms = models.PositiveIntegerField(null=True, blank=True)
+    latency_p99_ms = models.PositiveIntegerField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=["source", "date"], name="aidailystats_source_date_idx"
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.source} stats for {self.date}"
@@ -0,0 +1,141 @@
+import json
+import re
+import unicodedata
+from collections import OrderedDict
+
+from .models import PreprocessedData, RequestLog
+
+# 배치를 한 문자열로 이어 붙일 때 쓰는 구분자 (ASCII record separator)
+SEPARATOR = "\x1e"
+
+_CONTROL = re.compile(r"[\x00-\x08\x0b-\x1d\x1f\x7f-\x9f\u200b\u200c\u2060\ufeff]")
+_EMOJI = re.compile(
+    "["
+    "\U0001f000-\U0001faff"  # 이모지, 기호, 그림 문자
+    "\u2600-\u27bf"  # 기타 기호, 딩뱃
+    "\u2b00-\u2bff"
+    "\ufe0e\ufe0f\u200d\u20e3"  # variation selector, ZWJ, keycap
+    "]+"
+)
+# ㅋㅋㅋㅋㅋ, !!!!! 처럼 같은 문자가 네 번 이상 반복되면 세 번으로 줄인다
+_REPEAT = re.compile(r"([^\x1e])\1{3,}")
+# 한글과 영문/숫자가 붙어 있으면 토큰을 나눈다 (예: "GPT가" -> "GPT 가")
+_SCRIPT_BOUNDARY = re.compile(
+    r"(?<=[가-힣ㄱ-ㅎㅏ-ㅣ])(?=[A-Za-z0-9])|(?<=[A-Za-z0-9])(?=[가-힣ㄱ-ㅎㅏ-ㅣ])"
+)
+_PUNCTUATION = re.compile(r"([^\w\s])")
+# NFKC는 ㅋ, ㅠ 같은 호환 자모를 조합용 자모로 바꾸므로 그 구간은 건너뛴다
+_COMPAT_JAMO = re.compile("([\u3131-\u318e]+)")
+# 구분자를 제외한 공백 (\s는 \x1e도 포함한다)
+_WHITESPACE = re.compile(r"[^\S\x1e]+")
+
+
+def _normalize(text):
+    parts = _COMPAT_JAMO.split(text)
+    parts[::2] = [unicodedata.normalize("NFKC", part) for part in parts[::2]]
+    return "".join(parts)
+
+
+class Preprocessor:
+    """
+    모델 입력 전처리: 유니코드 정규화(NFKC), 제어 문자·이모지 제거, 반복 문자
+    축약, 한글/영문 경계와 문장 부호 기준 토큰 분리, 토큰 수 제한.
+
+    입력을 하나씩 처리하지 않고 배치 전체를 구분자로 이어 붙여 정규식을
+    한 번씩만 적용한다. 같은 입력은 LRU로 기억해 다시 계산하지 않는다.
+    """
+
+    def __init__(self, max_tokens=256, cache_size=4096):
+        self.max_tokens = max_tokens
+        self.cache_size = cache_size
+        self._cache = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def stats(self):
+        return {"entries": len(self._cache), "hits": self.hits, "misses": self.misses}
+
+    def process(self, text):
+        return self.process_batch([text])[0]
+
+    def process_batch(self, texts):
+        results = [None] * len(texts)
+        pending = {}  # 캐시에 없는 입력 -> 결과를 채울 위치들
+        for index, text in enumerate(texts):
+            cleaned = self._cache.get(text)
+            if cleaned is not None:
+                self._cache.move_to_end(text)
+                self.hits += 1
+                results[index] = cleaned
+            else:
+                pending.setdefault(text, []).append(index)
+
+        if pending:
+            self.misses += len(pending)
+            for text, cleaned in zip(pending, self._clean(list(pending))):
+                for index in pending[text]:
+                    results[index] = cleaned
+                self._remember(text, cleaned)
+        return results
+
+    def _remember(self, text, cleaned):
+        self._cache[text] = cleaned
+        if len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+
+    def _clean(self, texts):
+        joined = SEPARATOR.join(text.replace(SEPARATOR, " ") for text in texts)
+        joined = _normalize(joined)
+        joined = _CONTROL.sub(" ", joined)
+        joined = _EMOJI.sub(" ", joined)
+        joined = _REPEAT.sub(r"\1\1\1", joined)
+        joined = _SCRIPT_BOUNDARY.sub(" ", joined)
+        joined = _PUNCTUATION.sub(r" \1 ", joined)
+        joined = _WHITESPACE.sub(" ", joined)
+        return [self._truncate(item) for item in joined.split(SEPARATOR)]
+
+    def _truncate(self, text):
+        tokens = text.split()
+        return " ".join(tokens[: self.max_tokens])
+
+
+def extract_input(request_body):
+    """JSON 본문이면 "message" 필드를, 아니면 본문 전체를 모델 입력으로 본다."""
+    try:
+        payload = json.loads(request_body)
+    except ValueError:
+        return request_body
+    if isinstance(payload, dict) and isinstance(payload.get("message"), str):
+        return payload["message"]
+    return request_body
+
+
+def preprocess_request_logs(preprocessor, batch_size=500):
+    """
+    아직 PreprocessedData가 없는 RequestLog를 id 순으로 batch_size씩 읽어
+    한 번에 전처리하고 bulk_create 한다. 저장한 행 수를 반환한다.
+    """
+    created = 0
+    last_id = 0
+    while True:
+        batch = list(
+            RequestLog.objects.filter(
+                id__gt=last_id,
+                request_body__isnull=False,
+                preprocessed_data__isnull=True,
+            )
+            .order_by("id")
+            .values_list("id", "request_body")[:batch_size]
+        )
+        if not batch:
+            return created
+        last_id = batch[-1][0]
+        inputs = [extract_input(body) for _, body in batch]
+        cleaned = preprocessor.process_batch(inputs)
+        PreprocessedData.objects.bulk_create(
+            PreprocessedData(
+                request_id=request_id, original_input=original, cleaned_input=result
+            )
+            for (request_id, _), original, result in zip(batch, inputs, cleaned)
+        )
+        created += len(batch)
@@ -0,0 +1,181 @@
+import logging
+import math
+import time
+from datetime import datetime, timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Exists, OuterRef
+from django.utils import timezone
+
+from .models import AIDailyStats, ModelResult, PreprocessedData, RequestLog, StatsSource
+
+logger = logging.getLogger(__name__)
+
+DEFAULTS = {
+    # 이 기간(일)보다 오래된 행은 일별 집계를 남기고 삭제
+    "REQUEST_LOG_DAYS": 30,
+    "MODEL_RESULT_DAYS": 30,
+    "PREPROCESSED_DATA_DAYS": 30,
+    "BATCH_SIZE": 1000,  # 한 번에 삭제하는 행 수 (짧은 트랜잭션 유지)
+    "BATCH_SLEEP": 0.0,  # seconds, 배치 사이 대기 (DB 부하 완화)
+    "INTERVAL": 60 * 60,  # seconds, purge_ai_logs를 계속 실행할 때 주기
+}
+
+# (source, model, 보존 기간 설정, 집계 기준 필드)
+# 자식 테이블을 먼저 처리하고, 보존 기간이 남은 자식 행이 있는 RequestLog는
+# 지우지 않는다 (지우면 자식 행이 CASCADE로 함께 지워진다)
+SOURCES = [
+    (StatsSource.PREPROCESSED_DATA, PreprocessedData, "PREPROCESSED_DATA_DAYS", ()),
+    (StatsSource.MODEL_RESULT, ModelResult, "MODEL_RESULT_DAYS", ("model_version",)),
+    (
+        StatsSource.REQUEST_LOG,
+        RequestLog,
+        "REQUEST_LOG_DAYS",
+        ("endpoint", "method", "status_code"),
+    ),
+]
+
+
+def get_config():
+    return {**DEFAULTS, **getattr(settings, "AI_RETENTION", {})}
+
+
+def percentile(values, fraction):
+    """정렬된 values의 nearest-rank 백분위수."""
+    if not values:
+        return None
+    return values[max(math.ceil(fraction * len(values)) - 1, 0)]
+
+
+class RetentionJob:
+    """
+    ai 로그 테이블의 보존 기간 처리.
+
+    보존 기간이 지난 날짜마다 일별 집계(AIDailyStats)를 먼저 만들고, 그 뒤
+    created_at 인덱스 순서로 BATCH_SIZE개씩 짧은 트랜잭션으로 삭제한다.
+    집계가 이미 있는 날짜는 다시 집계하지 않으므로, 삭제 도중 중단되어도
+    다시 실행하면 남은 행만 지운다.
+    """
+
+    def __init__(self, retention_days, batch_size=1000, batch_sleep=0.0):
+        self.retention_days = retention_days  # source -> days
+        self.batch_size = batch_size
+        self.batch_sleep = batch_sleep
+
+    @classmethod
+    def from_settings(cls):
+        config = get_config()
+        return cls(
+            {source: config[key] for source, _, key, _ in SOURCES},
+            batch_size=config["BATCH_SIZE"],
+            batch_sleep=config["BATCH_SLEEP"],
+        )
+
+    def cutoff(self, source, now=None):
+        # 날짜 단위로 자르므로 한 날짜의 행은 모두 같은 실행에서 집계된다
+        today = timezone.localdate(now)
+        first_kept = today - timedelta(days=self.retention_days[source])
+        return timezone.make_aware(datetime.combine(first_kept, datetime.min.time()))
+
+    def run(self, now=None):
+        """{source: {"rolled_up_days", "deleted"}}를 반환한다."""
+        results = {}
+        for source, model, _, dimensions in SOURCES:
+            cutoff = self.cutoff(source, now)
+            results[source] = {
+                "rolled_up_days": self.rollup(source, model, dimensions, cutoff),
+                "deleted": self.purge(model, cutoff),
+            }
+        return results
+
+    def rollup(self, source, model, dimensions, cutoff):
+        oldest = (
+            model.objects.filter(created_at__lt=cutoff)
+            .order_by("created_at")
+            .values_list("created_at", flat=True)
+            .first()
+        )
+        if oldest is None:
+            return 0
+        day = timezone.localdate(oldest)
+        rolled_up = 0
+        while day < timezone.localdate(cutoff):
+            if not AIDailyStats.objects.filter(source=source, date=day).exists():
+                rolled_up += self.rollup_day(source, model, dimensions, day)
+            day += timedelta(days=1)
+        return rolled_up
+
+    def rollup_day(self, source, model, dimensions, day):
+        start = timezone.make_aware(datetime.combine(day, datetime.min.time()))
+        rows = model.objects.filter(
+            created_at__gte=start, created_at__lt=start + timedelta(days=1)
+        )
+        with_latency = source == StatsSource.REQUEST_LOG
+        fields = dimensions + (("latency_ms",) if with_latency else ())
+
+        groups = {}  # dimensions -> [count, latencies]
+        for values in rows.values_list(*fields).iterator():
+            key = values[: len(dimensions)]
+            group = groups.setdefault(key, [0, []])
+            group[0] += 1
+            if with_latency and values[-1] is not None:
+                group[1].append(values[-1])
+        if not groups:
+            return 0
+
+        stats = []
+        for key, (count, latencies) in groups.items():
+            latencies.sort()
+            stats.append(
+                AIDailyStats(
+                    date=day,
+                    source=source,
+                    count=count,
+                    latency_p50_ms=percentile(latencies, 0.5),
+                    latency_p95_ms=percentile(latencies, 0.95),
+                    latency_p99_ms=percentile(latencies, 0.99),
+                    **dict(zip(dimensions, key)),
+                )
+            )
+        AIDailyStats.objects.bulk_create(stats)
+        return 1
+
+    def expired(self, model, cutoff):
+        rows = model.objects.filter(created_at__lt=cutoff)
+        if model is RequestLog:
+            for child in (ModelResult, PreprocessedData):
+                rows = rows.exclude(
+                    Exists(child.objects.filter(request=OuterRef("pk")))
+                )
+        return rows
+
+    def purge(self, model, cutoff):
+        deleted = 0
+        while True:
+            with transaction.atomic():
+                ids = list(
+                    self.expired(model, cutoff)
+                    .order_by("created_at")
+                    .values_list("id", flat=True)[: self.batch_size]
+                )
+                if not ids:
+                    return deleted
+                model.objects.filter(id__in=ids).delete()
+            deleted += len(ids)
+            if self.batch_sleep:
+                time.sleep(self.batch_sleep)
+
+
+def run_retention(now=None):
+    """스케줄러(cron 등)에서 호출하는 진입점. purge_ai_logs와 같은 작업."""
+    results = RetentionJob.from_settings().run(now)
+    for source, result in results.items():
+        if result["deleted"]:
+            logger.info(
+                "Purged %d %s rows (%d days rolled up)",
+                result["deleted"],
+                source,
+                result["rolled_up_days"],
+            )
+    return results
@@ -0,0 +1,168 @@
+import asyncio
+import logging
+import time
+
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+from django.utils.module_loading import import_string
+
+logger = logging.getLogger(__name__)
+
+DEFAULTS = {
+    # dotted path, async (prompts: list[str]) -> list[str] (같은 순서)
+    "BACKEND": "ai.generation.stub_batch_model",
+    "MAX_BATCH_SIZE": 16,
+    "MAX_WAIT": 0.01,  # seconds, 첫 요청 이후 배치를 채우려고 기다리는 최대 시간
+    "MAX_CONCURRENCY": 1,  # 동시에 실행하는 배치 수
+}
+
+
+class BatchScheduler:
+    """
+    워커 프로세스의 모든 연결에서 들어온 추론 요청을 모아 배치로 실행한다.
+
+    submit()은 요청을 큐에 넣고 결과 future를 기다린다. 디스패처 태스크는
+    첫 요청이 들어오면 MAX_BATCH_SIZE가 차거나 MAX_WAIT이 지날 때까지 모아
+    backend(prompts)를 한 번 호출하고, 결과를 요청한 순서대로 각 future에
+    돌려준다. 결과를 기다리는 쪽은 요청한 consumer 태스크이므로 응답은
+    자연히 그 연결로 간다. 연결이 끊겨 취소된 요청은 배치에서 뺀다.
+    """
+
+    def __init__(self, backend, max_batch_size=16, max_wait=0.01, max_concurrency=1):
+        self.backend = backend
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+        self.max_concurrency = max_concurrency
+        self._loop = None
+        self._queue = None
+        self._dispatcher = None
+        self._running = set()
+        self.submitted = 0
+        self.batches = 0
+        self.batched_requests = 0
+        self.failed_batches = 0
+
+    @classmethod
+    def from_settings(cls):
+        config = {**DEFAULTS, **getattr(settings, "AI_BATCH_SCHEDULER", {})}
+        return cls(
+            backend=import_string(config["BACKEND"]),
+            max_batch_size=config["MAX_BATCH_SIZE"],
+            max_wait=config["MAX_WAIT"],
+            max_concurrency=config["MAX_CONCURRENCY"],
+        )
+
+    @property
+    def depth(self):
+        return self._queue.qsize() if self._queue is not None else 0
+
+    def stats(self):
+        return {
+            "depth": self.depth,
+            "submitted": self.submitted,
+            "batches": self.batches,
+            "failed_batches": self.failed_batches,
+            "avg_batch_size": (
+                self.batched_requests / self.batches if self.batches else 0.0
+            ),
+        }
+
+    async def submit(self, prompt):
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            # 이벤트 루프마다 큐와 디스패처를 따로 둔다 (테스트에서 asyncio.run 반복)
+            self._loop = loop
+            self._queue = asyncio.Queue()
+            self._running = set()
+            self._dispatcher = loop.create_task(self._dispatch())
+        future = loop.create_future()
+        self._queue.put_nowait((prompt, future))
+        self.submitted += 1
+        return await future
+
+    async def _collect(self):
+        batch = [await self._queue.get()]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            timeout = deadline - time.monotonic()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+        return [(prompt, future) for prompt, future in batch if not future.done()]
+
+    async def _dispatch(self):
+        slots = asyncio.Semaphore(self.max_concurrency)
+        while True:
+            await slots.acquire()
+            batch = await self._collect()
+            if not batch:
+                slots.release()
+                continue
+            task = asyncio.create_task(self._run_batch(batch))
+            self._running.add(task)
+            task.add_done_callback(self._running.discard)
+            task.add_done_callback(lambda _: slots.release())
+
+    async def _run_batch(self, batch):
+        self.batches += 1
+        self.batched_requests += len(batch)
+        try:
+            outputs = await self.backend([prompt for prompt, _ in batch])
+            if len(outputs) != len(batch):
+                raise ValueError(
+                    f"Batch backend returned {len(outputs)} results "
+                    f"for {len(batch)} prompts."
+                )
+        except Exception as exc:
+            self.failed_batches += 1
+            logger.exception("Batch inference failed (%d prompts)", len(batch))
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(exc)
+            return
+        for (_, future), output in zip(batch, outputs):
+            if not future.done():
+                future.set_result(output)
+
+
+_scheduler = None
+
+
+def get_scheduler():
+    global _scheduler
+    if _scheduler is None:
+        _scheduler = BatchScheduler.from_settings()
+    return _scheduler
+
+
+@receiver(setting_changed)
+def reset_scheduler(*, setting, **kwargs):
+    global _scheduler
+    if setting == "AI_BATCH_SCHEDULER":
+        _scheduler = None
+
+
+class BatchedGenerator:
+    """
+    AI_REPLY_GENERATOR로 쓸 수 있는 생성기. 요청을 프로세스 공용
+    BatchScheduler에 넣고, 배치 결과가 나오면 한 번에 내보낸다.
+
+        AI_REPLY_GENERATOR = "ai.scheduler.batched_generator"
+    """
+
+    @property
+    def model_version(self):
+        backend = get_scheduler().backend
+        return getattr(backend, "model_version", None) or (
+            f"{backend.__module__}.{backend.__qualname__}"
+        )
+
+    async def __call__(self, prompt, user_id=None):
+        yield await get_scheduler().submit(prompt)
+
+
+batched_generator = BatchedGenerator()
@@ -0,0 +1,20 @@
+import hashlib
+from pathlib import PurePosixPath
+from urllib.parse import urlparse
+
+
+def stub_transcribe(audio_url):
+    """테스트/로컬 개발용 STT: 파일 이름을 그대로 텍스트로 돌려준다."""
+    name = PurePosixPath(urlparse(audio_url).path).stem or "audio"
+    return f"[transcript] {name}"
+
+
+def stub_synthesize(text):
+    """테스트/로컬 개발용 TTS: 텍스트 해시로 만든 가짜 오디오 URL을 돌려준다."""
+    digest = hashlib.sha1(text.encode()).hexdigest()[:16]
+    return f"https://tts.invalid/{digest}.wav"
+
+
+def stub_transcribe_partial(path, size):
+    """테스트/로컬 개발용 부분 STT: 지금까지 받은 바이트 수를 알려준다."""
+    return f"[partial transcript] {size} bytes"
@@ -1 +1,882 @@
-# Create your tests here.
+import asyncio
+import json
+import logging
+import time
+from datetime import datetime, timedelta
+from datetime import timezone as dt_timezone
+from io import StringIO
+
+import pytest
+from channels.db import database_sync_to_async
+from django.core.exceptions import ImproperlyConfigured
+from django.core.management import call_command
+from django.db import connection
+from django.test import override_settings
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from chat.models import ChatLog, ChatSession, Sender
+from users.models import User
+
+from .cache import InferenceCache, input_digest
+from .client import AIBackendError, AIClient, client_generator, get_client, post_json
+from .context import build_context, render_prompt
+from .fields import RAW, compress_text, decompress_text
+from .generation import stub_batch_model
+from .memory import MemoryStore
+from .middleware import RequestLogRecorder, get_recorder
+from .models import (
+    AICharacterState,
+    AIDailyStats,
+    AIMemoryEntry,
+    ModelResult,
+    PreprocessedData,
+    RequestLog,
+)
+from .preprocessing import Preprocessor
+from .retention import RetentionJob
+from .scheduler import BatchScheduler, batched_generator
+from .tokens import count_tokens
+
+logger = logging.getLogger(__name__)
+
+
+@pytest.fixture
+def api_client():
+    return APIClient()
+
+
+@pytest.fixture
+def authenticated_user(api_client):
+    user = User.objects.create_user(
+        email="testuser@example.com", password="testpassword"
+    )
+    api_client.force_authenticate(user=user)
+    return user, api_client
+
+
+REQUEST_LOG = {
+    "ENABLED": True,
+    "BACKGROUND": False,
+    "BODY_SAMPLE_RATE": 1.0,
+    "BODY_MAX_LENGTH": 20,
+    "EXCLUDE_PATHS": ["/api/chat-messages/search"],
+}
+
+
+@pytest.mark.django_db
+class TestRequestLogMiddleware:
+    @override_settings(AI_REQUEST_LOG=REQUEST_LOG)
+    def test_requests_are_recorded_in_batches(self, authenticated_user):
+        """요청 로그는 큐에 쌓였다가 flush 때 한 번에 저장된다."""
+        user, client = authenticated_user
+        session = ChatSession.objects.create(user=user, title="Logged")
+        url = reverse("chat-messages-list-create")
+
+        client.post(url, {"session": session.id, "message": "x" * 100}, format="json")
+        client.get(url, {"session_id": session.id})
+        client.get(reverse("chat-messages-search"), {"q": "x"})
+        client.post(
+            reverse("user-login"),
+            {"email": user.email, "password": "testpassword"},
+            format="json",
+        )
+        assert not RequestLog.objects.exists()
+
+        recorder = get_recorder()
+        assert recorder.depth == 3
+        assert recorder.flush() == 3
+
+        post, get, login = RequestLog.objects.order_by("id")
+        assert (post.method, post.endpoint, post.status_code) == (
+            "POST",
+            url,
+            status.HTTP_201_CREATED,
+        )
+        assert post.user == user
+        assert post.latency_ms is not None
+        assert len(post.request_body) == 20
+        assert get.request_body is None
+        # 인증 관련 경로는 본문(비밀번호)을 남기지 않는다
+        assert login.endpoint == reverse("user-login")
+        assert login.request_body is None
+        assert recorder.stats()["recorded"] == 3
+
+    @override_settings(AI_REQUEST_LOG={**REQUEST_LOG, "MAX_QUEUE": 2})
+    def test_overflow_is_counted(self, authenticated_user):
+        """큐가 가득 차면 요청은 그대로 처리되고 버린 로그 수만 센다."""
+        _, client = authenticated_user
+        url = reverse("chat-sessions-list-create")
+
+        for _ in range(5):
+            assert client.get(url).status_code == status.HTTP_200_OK
+
+        recorder = get_recorder()
+        assert recorder.stats()["dropped"] == 3
+        assert recorder.flush() == 2
+        assert RequestLog.objects.count() == 2
+
+    def test_background_flusher_drains_queue(self):
+        recorder = RequestLogRecorder(batch_size=10, flush_interval=0.01)
+        recorder.flush = lambda: recorder._pending.clear()  # DB 없이 스레드만 확인
+        for _ in range(25):
+            recorder.record(RequestLog(endpoint="/api/x", method="GET"))
+        deadline = time.monotonic() + 2
+        while recorder.depth and time.monotonic() < deadline:
+            time.sleep(0.01)
+        assert recorder.depth == 0
+        recorder.stop()
+
+    def test_record_is_cheap(self):
+        recorder = RequestLogRecorder(max_queue=100_000, background=False)
+        request_log = RequestLog(endpoint="/api/x", method="GET", status_code=200)
+        started = time.perf_counter()
+        for _ in range(50_000):
+            recorder.record(request_log)
+        per_call = (time.perf_counter() - started) / 50_000
+        logger.info("RequestLogRecorder.record: %.2f us/call", per_call * 1e6)
+        assert per_call < 50e-6
+
+
+@pytest.mark.django_db(transaction=True)
+class TestInferenceCache:
+    def test_memory_and_db_tiers(self):
+        asyncio.run(self._test_memory_and_db_tiers())
+
+    async def _test_memory_and_db_tiers(self):
+        calls = []
+
+        async def compute():
+            calls.append(1)
+            return "안녕하세요!"
+
+        cache = InferenceCache()
+        assert (
+            await cache.get_or_compute("v1", "Hello   world ", compute) == "안녕하세요!"
+        )
+        # 공백만 다른 입력은 같은 키
+        assert await cache.get_or_compute("v1", "Hello world", compute) == "안녕하세요!"
+        assert len(calls) == 1
+
+        result = await ModelResult.objects.aget()
+        assert result.input_digest == input_digest("v1", "Hello world")
+        assert result.request_id is None
+
+        # 다른 프로세스(새 캐시)는 DB에서 찾고, 모델 버전이 다르면 다시 계산
+        other = InferenceCache()
+        assert await other.get_or_compute("v1", "Hello world", compute) == "안녕하세요!"
+        await other.get_or_compute("v2", "Hello world", compute)
+        assert len(calls) == 2
+
+        assert cache.stats()["memory_hits"] == 1
+        assert other.stats()["db_hits"] == 1
+        assert other.stats()["hit_rate"] == 0.5
+
+    def test_concurrent_identical_prompts_share_one_inference(self):
+        asyncio.run(self._test_concurrent_identical_prompts_share_one_inference())
+
+    async def _test_concurrent_identical_prompts_share_one_inference(self):
+        calls = []
+        release = asyncio.Event()
+
+        async def compute():
+            calls.append(1)
+            await release.wait()
+            return "reply"
+
+        cache = InferenceCache(db_tier=False)
+        tasks = [
+            asyncio.create_task(cache.get_or_compute("v1", "hi", compute))
+            for _ in range(10)
+        ]
+        await asyncio.sleep(0)
+        release.set()
+        assert await asyncio.gather(*tasks) == ["reply"] * 10
+        assert len(calls) == 1
+        assert cache.stats()["coalesced"] == 9
+
+        async def failing():
+            await asyncio.sleep(0)
+            raise RuntimeError("model down")
+
+        tasks = [
+            asyncio.create_task(cache.get_or_compute("v1", "bye", failing))
+            for _ in range(3)
+        ]
+        results = await asyncio.gather(*tasks, return_exceptions=True)
+        assert all(isinstance(result, RuntimeError) for result in results)
+        # 실패한 결과는 캐시에 남지 않는다
+        assert await cache.get_or_compute("v1", "bye", compute) == "reply"
+
+    def test_size_and_ttl_eviction(self):
+        asyncio.run(self._test_size_and_ttl_eviction())
+
+    async def _test_size_and_ttl_eviction(self):
+        calls = []
+
+        async def compute():
+            calls.append(1)
+            return "reply"
+
+        cache = InferenceCache(max_entries=2, db_tier=False)
+        for text in ["a", "b", "a", "c"]:
+            await cache.get_or_compute("v1", text, compute)
+        # 가장 오래 쓰지 않은 b가 밀려난다
+        assert cache.stats()["entries"] == 2
+        await cache.get_or_compute("v1", "a", compute)
+        assert len(calls) == 3
+        await cache.get_or_compute("v1", "b", compute)
+        assert len(calls) == 4
+
+        cache = InferenceCache(ttl=0.01, db_tier=False)
+        await cache.get_or_compute("v1", "a", compute)
+        await asyncio.sleep(0.02)
+        await cache.get_or_compute("v1", "a", compute)
+        assert len(calls) == 6
+        assert cache.stats()["evictions"] == 1
+
+
+class TestPreprocessor:
+    def test_cleaning(self):
+        preprocessor = Preprocessor(max_tokens=4)
+        assert preprocessor.process_batch(
+            [
+                "ＡＩ야\u200b  안녕😀😀 ㅋㅋㅋㅋㅋ",
+                "GPT가 좋아요!!!!",
+                "",
+                "a b c d e f",
+            ]
+        ) == ["AI 야 안녕 ㅋㅋㅋ", "GPT 가 좋아요 !", "", "a b c d"]
+
+    def test_batch_matches_single_and_memoizes(self):
+        texts = ["안녕하세요", "Hello,world", "안녕하세요", "", "", "", "", "x\x1ey"]
+        preprocessor = Preprocessor()
+        batch = preprocessor.process_batch(texts)
+        assert batch == [Preprocessor().process(text) for text in texts]
+        assert batch[-1] == "x y"
+        # 배치 안의 중복 입력은 한 번만 처리한다
+        assert preprocessor.stats()["misses"] == 4
+
+        preprocessor.process_batch(texts)
+        assert preprocessor.stats()["hits"] == len(texts)
+
+    def test_throughput(self):
+        texts = [f"메시지 {i}번 GPT랑 얘기하기ㅋㅋㅋㅋ 😀!!" for i in range(1024)]
+        for batch_size in (1, 4, 16, 64, 256, 1024):
+            preprocessor = Preprocessor(cache_size=0)
+            started = time.perf_counter()
+            for offset in range(0, len(texts), batch_size):
+                preprocessor.process_batch(texts[offset : offset + batch_size])
+            elapsed = time.perf_counter() - started
+            logger.info(
+                "Preprocessor batch_size=%d: %.0f inputs/sec",
+                batch_size,
+                len(texts) / elapsed,
+            )
+        assert elapsed < 1
+
+
+@pytest.mark.django_db
+def test_preprocess_request_logs_command():
+    RequestLog.objects.bulk_create(
+        [
+            RequestLog(endpoint="/api/x", method="POST", request_body=body)
+            for body in ['{"message": "안녕😀"}', "plain  text", None]
+        ]
+    )
+    call_command("preprocess_request_logs", batch_size=1)
+    rows = PreprocessedData.objects.order_by("request_id")
+    assert [(row.original_input, row.cleaned_input) for row in rows] == [
+        ("안녕😀", "안녕"),
+        ("plain  text", "plain text"),
+    ]
+    # 이미 처리한 로그는 다시 처리하지 않는다
+    call_command("preprocess_request_logs")
+    assert PreprocessedData.objects.count() == 2
+
+
+@pytest.mark.django_db
+class TestMemoryStore:
+    @pytest.fixture
+    def user(self):
+        return User.objects.create_user(email="memory@example.com", password="pw")
+
+    def test_read_is_bounded_by_budget(self, user, django_assert_num_queries):
+        store = MemoryStore(token_budget=10, summary_budget=4, compact_at=10_000)
+        for i in range(50):
+            store.remember(user.id, f"fact {i}")  # 2 tokens
+        AICharacterState.objects.filter(user=user).update(memory="likes cats a lot")
+
+        with django_assert_num_queries(2):
+            memory = store.read(user.id)
+        # 요약은 SUMMARY_BUDGET, 항목은 최신 것부터 남은 예산만큼
+        assert memory.splitlines() == [
+            "likes cats a lot",
+            "fact 47",
+            "fact 48",
+            "fact 49",
+        ]
+        assert store.read(user.id, budget=3) == "likes cats a"
+        assert store.read(0) == ""
+
+    def test_compaction_folds_and_evicts_old_entries(
+        self, user, django_capture_on_commit_callbacks
+    ):
+        store = MemoryStore(
+            token_budget=8, summary_budget=4, compact_at=8, background=False
+        )
+        with django_capture_on_commit_callbacks(execute=True):
+            store.remember(user.id, "name is Minji")  # 3 tokens
+            store.remember(user.id, "said hi", importance=0)
+            store.remember(user.id, "likes jazz")
+            store.remember(user.id, "lives in Seoul")
+
+        state = AICharacterState.objects.get(user=user)
+        assert state.token_count == 10
+        assert state.last_interaction is not None
+        assert store.stats()["pending"] == 1
+
+        assert store.run_pending() == 1
+        state.refresh_from_db()
+        # 요약되지 않은 항목이 TOKEN_BUDGET - SUMMARY_BUDGET 이하가 된다
+        assert state.token_count == 3
+        assert state.memory == "likes jazz"
+        assert list(
+            AIMemoryEntry.objects.filter(state=state).values_list("content", flat=True)
+        ) == ["lives in Seoul"]
+        assert store.stats()["folded"] == 2
+        assert store.stats()["evicted"] == 1
+        assert store.read(user.id) == "likes jazz\nlives in Seoul"
+
+    def test_touch_updates_last_interaction_only(self, user):
+        store = MemoryStore()
+        store.remember(user.id, "hello")
+        AICharacterState.objects.filter(user=user).update(last_interaction=None)
+        assert store.touch(user.id) == 1
+        state = AICharacterState.objects.get(user=user)
+        assert state.last_interaction is not None
+        assert state.token_count == 1
+
+
+@pytest.mark.django_db
+class TestContextBuilder:
+    def create_messages(self, session, count):
+        started = timezone.now()
+        return ChatLog.objects.create_in_sequence(
+            [
+                ChatLog(
+                    user=session.user,
+                    session=session,
+                    message=f"message number {i}",  # 3 tokens
+                    sender=Sender.USER if i % 2 else Sender.AI,
+                    timestamp=started + timedelta(seconds=i),
+                )
+                for i in range(count)
+            ]
+        )
+
+    def test_token_count_is_stored_at_write_time(self, authenticated_user):
+        user, client = authenticated_user
+        session = ChatSession.objects.create(user=user, title="Tokens")
+        response = client.post(
+            reverse("chat-messages-list-create"),
+            {"session": session.id, "message": "안녕, GPT야!"},
+            format="json",
+        )
+        assert response.status_code == status.HTTP_201_CREATED
+        assert ChatLog.objects.get().token_count == 4  # 안녕 , GPT야 !
+
+    @override_settings(AI_CONTEXT={"MESSAGE_OVERHEAD": 1, "CHUNK_SIZE": 4})
+    def test_walks_back_from_newest_within_budget(
+        self, authenticated_user, django_assert_num_queries
+    ):
+        user, _ = authenticated_user
+        session = ChatSession.objects.create(user=user, title="Context")
+        self.create_messages(session, 20)
+        MemoryStore().remember(user.id, "likes jazz")
+
+        # 기억 2토큰 + 메시지 4토큰씩 -> 최신 메시지 6개
+        with django_assert_num_queries(4):
+            context = build_context(session.id, user.id, budget=27)
+        assert context["memory"] == "likes jazz"
+        assert [message["message"] for message in context["messages"]] == [
+            f"message number {i}" for i in range(14, 20)
+        ]
+        assert context["token_count"] == 26
+        assert render_prompt(context).splitlines()[:3] == [
+            "memory:",
+            "likes jazz",
+            "",
+        ]
+
+        context = build_context(session.id, user.id, budget=1000)
+        assert len(context["messages"]) == 20
+
+    def test_benchmark(self, authenticated_user):
+        user, _ = authenticated_user
+        for history in (100, 1000, 5000):
+            session = ChatSession.objects.create(user=user, title=f"{history}")
+            self.create_messages(session, history)
+
+            started = time.perf_counter()
+            context = build_context(session.id, user.id, budget=1024)
+            cached = time.perf_counter() - started
+
+            # 비교: 매 턴 전체 대화를 읽어 다시 세는 방식
+            started = time.perf_counter()
+            messages = ChatLog.objects.filter(session=session).values_list(
+                "message", flat=True
+            )
+            sum(count_tokens(message) for message in messages)
+            recount = time.perf_counter() - started
+
+            logger.info(
+                "history=%d: build_context %.2f ms, full recount %.2f ms",
+                history,
+                cached * 1000,
+                recount * 1000,
+            )
+            assert len(context["messages"]) == min(history, 1024 // 6)
+
+
+class TestBatchScheduler:
+    def test_batches_and_routes_results(self):
+        asyncio.run(self._test_batches_and_routes_results())
+
+    async def _test_batches_and_routes_results(self):
+        sizes = []
+
+        async def backend(prompts):
+            sizes.append(len(prompts))
+            await asyncio.sleep(0)
+            return [prompt.upper() for prompt in prompts]
+
+        scheduler = BatchScheduler(backend, max_batch_size=4, max_wait=0.05)
+        prompts = [f"prompt {i}" for i in range(10)]
+        results = await asyncio.gather(*(scheduler.submit(p) for p in prompts))
+        # 각 요청은 자기 결과를 받는다
+        assert results == [prompt.upper() for prompt in prompts]
+        assert sizes == [4, 4, 2]
+        assert scheduler.stats()["avg_batch_size"] == 10 / 3
+
+    def test_failure_and_cancellation(self):
+        asyncio.run(self._test_failure_and_cancellation())
+
+    async def _test_failure_and_cancellation(self):
+        received = []
+
+        async def backend(prompts):
+            received.append(prompts)
+            if "boom" in prompts:
+                raise RuntimeError("model down")
+            return prompts
+
+        scheduler = BatchScheduler(backend, max_batch_size=8, max_wait=0.01)
+        results = await asyncio.gather(
+            scheduler.submit("boom"), scheduler.submit("ok"), return_exceptions=True
+        )
+        assert all(isinstance(result, RuntimeError) for result in results)
+
+        # 연결이 끊겨 취소된 요청은 배치에 넣지 않는다
+        cancelled = asyncio.create_task(scheduler.submit("gone"))
+        kept = asyncio.create_task(scheduler.submit("kept"))
+        await asyncio.sleep(0)
+        cancelled.cancel()
+        assert await kept == "kept"
+        assert received[-1] == ["kept"]
+        assert scheduler.stats()["failed_batches"] == 1
+
+    @override_settings(AI_BATCH_SCHEDULER={"MAX_WAIT": 0.001})
+    def test_batched_generator(self):
+        async def collect():
+            return [delta async for delta in batched_generator("hi")]
+
+        assert asyncio.run(collect()) == ["You said: hi"]
+        assert batched_generator.model_version == "ai.generation.stub_batch_model"
+
+    def test_benchmark(self):
+        async def run(max_batch_size, requests=200):
+            scheduler = BatchScheduler(
+                stub_batch_model, max_batch_size=max_batch_size, max_wait=0.002
+            )
+            latencies = []
+
+            async def one(i):
+                started = time.perf_counter()
+                await scheduler.submit(f"prompt {i}")
+                latencies.append(time.perf_counter() - started)
+
+            started = time.perf_counter()
+            await asyncio.gather(*(one(i) for i in range(requests)))
+            elapsed = time.perf_counter() - started
+            latencies.sort()
+            p99 = latencies[int(len(latencies) * 0.99) - 1]
+            return requests / elapsed, p99
+
+        unbatched = asyncio.run(run(1))
+        batched = asyncio.run(run(32))
+        for name, (throughput, p99) in (("unbatched", unbatched), ("batched", batched)):
+            logger.info("%s: %.0f req/s, p99 %.1f ms", name, throughput, p99 * 1000)
+        assert batched[0] > unbatched[0]
+        assert batched[1] < unbatched[1]
+
+
+class StandInModelServer:
+    """테스트용 모델 서버. respond(prompt, n) -> (status, output, delay)"""
+
+    def __init__(self, respond):
+        self.respond = respond
+        self.connections = 0
+        self.requests = []
+        self.active = 0
+        self.max_active = 0
+        self.handlers = set()
+
+    async def __aenter__(self):
+        self.server = await asyncio.start_server(self.serve, "127.0.0.1", 0)
+        port = self.server.sockets[0].getsockname()[1]
+        self.url = f"http://127.0.0.1:{port}/v1/generate"
+        return self
+
+    async def __aexit__(self, *exc_info):
+        self.server.close()
+        for handler in self.handlers:
+            handler.cancel()
+        await asyncio.gather(*self.handlers, return_exceptions=True)
+
+    async def serve(self, reader, writer):
+        self.connections += 1
+        self.handlers.add(asyncio.current_task())
+        try:
+            while line := await reader.readline():
+                headers = {}
+                while (line := await reader.readline()) != b"\r\n":
+                    name, _, value = line.decode().partition(":")
+                    headers[name.strip().lower()] = value.strip()
+                payload = json.loads(
+                    await reader.readexactly(int(headers["content-length"]))
+                )
+                self.requests.append((payload, headers))
+                self.active += 1
+                self.max_active = max(self.max_active, self.active)
+                try:
+                    status_code, output, delay = self.respond(
+                        payload["prompt"], len(self.requests)
+                    )
+                    await asyncio.sleep(delay)
+                finally:
+                    self.active -= 1
+                body = json.dumps({"output": output}).encode()
+                writer.write(
+                    f"HTTP/1.1 {status_code} X\r\nContent-Length: {len(body)}\r\n"
+                    "\r\n".encode()
+                    + body
+                )
+                await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError, asyncio.CancelledError):
+            pass
+        finally:
+            writer.close()
+
+
+@pytest.mark.django_db(transaction=True)
+class TestAIClient:
+    @override_settings(AI_REQUEST_LOG=REQUEST_LOG)
+    def test_pooled_calls_are_recorded(self):
+        asyncio.run(self._test_pooled_calls_are_recorded())
+
+    async def _test_pooled_calls_are_recorded(self):
+        user = await User.objects.acreate(email="client@example.com")
+
+        async with StandInModelServer(
+            lambda prompt, n: (200, prompt.upper(), 0)
+        ) as server:
+            client = AIClient(server.url, model_version="m1", timeout=5)
+            for i in range(5):
+                assert await client.generate(f"hi {i}", user_id=user.id) == f"HI {i}"
+            client.pool.close()
+
+        # 연결 하나를 계속 재사용하고, 남은 시간을 서버에 알려준다
+        assert server.connections == 1
+        assert client.stats()["connections_reused"] == 4
+        payload, headers = server.requests[0]
+        assert payload == {"prompt": "hi 0", "model": "m1"}
+        assert 0 < int(headers["x-request-timeout-ms"]) <= 5000
+
+        # 호출 기록은 RequestLogRecorder 큐에 쌓였다가 한 번에 저장된다
+        assert not await RequestLog.objects.aexists()
+        assert await database_sync_to_async(get_recorder().flush)() == 5
+
+        request_log = await RequestLog.objects.select_related("user").afirst()
+        assert (request_log.user, request_log.status_code) == (user, 200)
+        assert request_log.latency_ms is not None
+        result = await ModelResult.objects.aget(request=request_log)
+        assert (result.model_version, result.output_data) == ("m1", "HI 0")
+        assert await RequestLog.objects.acount() == 5
+
+    def test_retries_and_hedging(self):
+        asyncio.run(self._test_retries_and_hedging())
+
+    async def _test_retries_and_hedging(self):
+        def respond(prompt, n):
+            if prompt == "flaky" and n == 1:
+                return 503, None, 0
+            if prompt == "slow" and n == 3:
+                return 200, "late", 2
+            if prompt == "bad":
+                return 400, None, 0
+            return 200, prompt, 0
+
+        async with StandInModelServer(respond) as server:
+            client = AIClient(server.url, hedge_after=0.05, record=False)
+            # 5xx는 재시도한다
+            assert await client.generate("flaky") == "flaky"
+            # 느린 요청은 다른 연결로 한 번 더 보내 먼저 온 응답을 쓴다
+            started = time.monotonic()
+            assert await client.generate("slow") == "slow"
+            assert time.monotonic() - started < 1
+            # 4xx는 재시도하지 않는다
+            with pytest.raises(AIBackendError) as excinfo:
+                await client.generate("bad")
+            assert excinfo.value.status == 400
+            client.pool.close()
+
+        assert len(server.requests) == 5
+        assert client.stats()["retries"] == 1
+        assert client.stats()["hedges"] == 1
+
+    def test_deadline_and_per_user_limit(self):
+        asyncio.run(self._test_deadline_and_per_user_limit())
+
+    async def _test_deadline_and_per_user_limit(self):
+        user = await User.objects.acreate(email="client@example.com")
+
+        async with StandInModelServer(lambda prompt, n: (200, prompt, 0.05)) as server:
+            client = AIClient(server.url, per_user_concurrency=1)
+            await asyncio.gather(
+                *(client.generate(str(i), user_id=user.id) for i in range(3))
+            )
+            assert server.max_active == 1
+
+            with pytest.raises(asyncio.TimeoutError):
+                await client.generate("late", deadline=time.monotonic() + 0.01)
+            # 시간 초과는 재시도할 수 있는 AIBackendError로 바꾸지 않는다
+            with pytest.raises(asyncio.TimeoutError):
+                await client._attempt("late", time.monotonic() + 0.01)
+            assert client.stats()["retries"] == 0
+            client.pool.close()
+
+        # 실패한 호출도 지연 시간과 함께 남는다
+        failed = await RequestLog.objects.order_by("-id").afirst()
+        assert failed.status_code is None
+        assert failed.latency_ms is not None
+        assert not await ModelResult.objects.filter(request=failed).aexists()
+
+    def test_client_generator(self):
+        asyncio.run(self._test_client_generator())
+
+    async def _test_client_generator(self):
+        user = await User.objects.acreate(email="client@example.com")
+        with override_settings(AI_CLIENT={"MODEL_VERSION": "m1"}):
+            # BASE_URL이 없어도 캐시 키용 모델 버전은 설정에서 가져온다
+            assert client_generator.model_version == "m1"
+            with pytest.raises(ImproperlyConfigured):
+                await anext(client_generator("hi"))
+
+        async with StandInModelServer(lambda prompt, n: (200, prompt, 0.05)) as server:
+            with override_settings(
+                AI_CLIENT={
+                    "BASE_URL": server.url,
+                    "PER_USER_CONCURRENCY": 1,
+                    "RECORD": False,
+                }
+            ):
+                # 사용자별 동시 호출 제한이 생성기 호출에도 걸린다
+                outputs = await asyncio.gather(
+                    *(
+                        anext(client_generator(str(i), user_id=user.id))
+                        for i in range(3)
+                    )
+                )
+                assert outputs == ["0", "1", "2"]
+                assert server.max_active == 1
+                get_client().pool.close()
+
+    def test_response_framing(self):
+        asyncio.run(self._test_response_framing())
+
+    async def _test_response_framing(self):
+        responses = [
+            # 1xx 중간 응답, chunk 확장과 trailer
+            b"HTTP/1.1 100 Continue\r\n\r\n"
+            b"HTTP/1.1 200 OK\r\nTransfer-Encoding: chunked\r\n\r\n"
+            b"3;ext=1\r\nabc\r\n2\r\nde\r\n0\r\nX-Trailer: 1\r\n\r\n",
+            b"HTTP/1.1 204 No Content\r\n\r\n",
+            # 길이 정보 없이 연결을 닫아 본문 끝을 알린다
+            b"HTTP/1.1 200 OK\r\nConnection: close\r\n\r\nuntil eof",
+        ]
+
+        async def serve(reader, writer):
+            for response in responses:
+                await reader.readuntil(b"\r\n\r\n")
+                await reader.readexactly(2)  # 요청 본문 "{}"
+                writer.write(response)
+                await writer.drain()
+            writer.close()
+
+        server = await asyncio.start_server(serve, "127.0.0.1", 0)
+        port = server.sockets[0].getsockname()[1]
+        connection = await asyncio.open_connection("127.0.0.1", port)
+        try:
+            results = [
+                await post_json(connection, "127.0.0.1", "/", {}) for _ in responses
+            ]
+        finally:
+            connection[1].close()
+            server.close()
+
+        assert results == [
+            (200, b"abcde", True),
+            (204, b"", True),
+            (200, b"until eof", False),
+        ]
+
+
+@pytest.mark.django_db
+class TestRetention:
+    def create_log(self, created_at, **fields):
+        request_log = RequestLog.objects.create(
+            endpoint="/api/x", method="POST", **fields
+        )
+        RequestLog.objects.filter(id=request_log.id).update(created_at=created_at)
+        return request_log
+
+    def test_rolls_up_then_purges_in_batches(self):
+        now = datetime(2026, 3, 10, 12, tzinfo=dt_timezone.utc)
+        old = datetime(2026, 2, 1, 9, tzinfo=dt_timezone.utc)
+        logs = [
+            self.create_log(old, status_code=200, latency_ms=latency)
+            for latency in (30, 10, 20)
+        ]
+        self.create_log(old, status_code=500)
+        self.create_log(datetime(2026, 2, 7, 23, 59, tzinfo=dt_timezone.utc))
+        kept = self.create_log(datetime(2026, 2, 8, tzinfo=dt_timezone.utc))
+        for request in (logs[0], None):
+            ModelResult.objects.create(request=request, model_version="v1")
+        PreprocessedData.objects.create(request=logs[0], cleaned_input="x")
+        for model in (ModelResult, PreprocessedData):
+            model.objects.update(created_at=old)
+
+        job = RetentionJob(
+            {"request_log": 30, "model_result": 30, "preprocessed_data": 30},
+            batch_size=2,
+        )
+        assert job.run(now) == {
+            "preprocessed_data": {"rolled_up_days": 1, "deleted": 1},
+            "model_result": {"rolled_up_days": 1, "deleted": 2},
+            "request_log": {"rolled_up_days": 2, "deleted": 5},
+        }
+        assert list(RequestLog.objects.values_list("id", flat=True)) == [kept.id]
+
+        ok = AIDailyStats.objects.get(source="request_log", status_code=200)
+        assert (ok.date, ok.endpoint, ok.method, ok.count) == (
+            old.date(),
+            "/api/x",
+            "POST",
+            3,
+        )
+        assert (ok.latency_p50_ms, ok.latency_p95_ms, ok.latency_p99_ms) == (
+            20,
+            30,
+            30,
+        )
+        failed = AIDailyStats.objects.get(source="request_log", status_code=500)
+        assert (failed.count, failed.latency_p50_ms) == (1, None)
+        results = AIDailyStats.objects.get(source="model_result")
+        assert (results.model_version, results.count) == ("v1", 2)
+        assert AIDailyStats.objects.count() == 5
+
+        # 다시 실행해도 집계가 중복되지 않는다
+        assert job.run(now)["request_log"] == {"rolled_up_days": 0, "deleted": 0}
+        assert AIDailyStats.objects.count() == 5
+
+    def test_keeps_request_log_with_retained_children(self):
+        now = datetime(2026, 3, 10, 12, tzinfo=dt_timezone.utc)
+        request_log = self.create_log(datetime(2026, 2, 1, tzinfo=dt_timezone.utc))
+        result = ModelResult.objects.create(request=request_log, model_version="v1")
+        ModelResult.objects.filter(id=result.id).update(
+            created_at=datetime(2026, 3, 5, tzinfo=dt_timezone.utc)
+        )
+
+        job = RetentionJob(
+            {"request_log": 30, "model_result": 90, "preprocessed_data": 30}
+        )
+        assert job.run(now)["request_log"] == {"rolled_up_days": 1, "deleted": 0}
+        assert RequestLog.objects.filter(id=request_log.id).exists()
+        assert ModelResult.objects.filter(id=result.id).exists()
+
+        # 자식 행이 만료되면 RequestLog도 지워지고 집계는 중복되지 않는다
+        later = datetime(2026, 6, 10, tzinfo=dt_timezone.utc)
+        assert job.run(later)["request_log"] == {"rolled_up_days": 0, "deleted": 1}
+        assert not ModelResult.objects.exists()
+        assert AIDailyStats.objects.get(source="request_log").count == 1
+
+    @override_settings(AI_RETENTION={"REQUEST_LOG_DAYS": 0})
+    def test_command(self):
+        self.create_log(timezone.now() - timedelta(days=1))
+        out = StringIO()
+        call_command("purge_ai_logs", once=True, stdout=out)
+        assert "request_log: rolled_up_days=1 deleted=1" in out.getvalue()
+
+
+@pytest.mark.django_db
+class TestCompressedTextField:
+    def stored(self, table, column, row_id):
+        with connection.cursor() as cursor:
+            cursor.execute(f"SELECT {column} FROM {table} WHERE id = %s", [row_id])
+            return bytes(cursor.fetchone()[0])
+
+    def test_round_trip_and_threshold(self):
+        prompt = "안녕하세요, 오늘 일정 알려줘. " * 50
+        request_log = RequestLog.objects.create(
+            endpoint="/api/x", method="POST", request_body="short"
+        )
+        result = ModelResult.objects.create(
+            request=request_log, input_data=prompt, output_data=None
+        )
+
+        result.refresh_from_db()
+        assert (result.input_data, result.output_data) == (prompt, None)
+        assert ModelResult.objects.values_list("input_data", flat=True).get() == prompt
+
+        # 짧은 값은 그대로, 긴 값은 압축해 저장한다
+        assert self.stored("ai_requestlog", "request_body", request_log.id) == (
+            bytes([RAW]) + b"short"
+        )
+        stored = self.stored("ai_modelresult", "input_data", result.id)
+        assert stored[0] != RAW
+        assert len(stored) * 5 < len(prompt.encode())
+
+    def test_codec_overhead(self):
+        for size in (256, 4096, 65536):
+            text = ("사용자: 오늘 날씨 어때?\nAI: 맑고 따뜻해요. " * size)[:size]
+            encoded = compress_text(text)
+            started = time.perf_counter()
+            for _ in range(200):
+                compress_text(text)
+            encode = (time.perf_counter() - started) / 200
+            started = time.perf_counter()
+            for _ in range(200):
+                decompress_text(encoded)
+            decode = (time.perf_counter() - started) / 200
+            logger.info(
+                "CompressedTextField %d chars: ratio %.1fx, encode %.1f us, "
+                "decode %.1f us",
+                size,
+                len(text.encode()) / len(encoded),
+                encode * 1e6,
+                decode * 1e6,
+            )
+            assert decompress_text(encoded) == text
@@ -0,0 +1,19 @@
+import re
+
+# 토큰 수 추정: 단어(한글 어절 포함) 하나와 문장 부호 하나를 각각 한 토큰으로 센다.
+# 모델 토크나이저와 정확히 같지는 않지만 예산 계산에는 충분하다
+_TOKEN = re.compile(r"\w+|[^\w\s]")
+
+
+def count_tokens(text):
+    return len(_TOKEN.findall(text)) if text else 0
+
+
+def truncate_tokens(text, max_tokens):
+    """앞에서부터 max_tokens 토큰까지만 남긴다."""
+    if max_tokens <= 0:
+        return ""
+    for index, match in enumerate(_TOKEN.finditer(text), start=1):
+        if index == max_tokens:
+            return text[: match.end()]
+    return text
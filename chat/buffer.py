@@ -0,0 +1,200 @@
+import asyncio
+import atexit
+import logging
+import time
+from collections import defaultdict
+
+from channels.db import database_sync_to_async
+from channels.layers import get_channel_layer
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+
+from .history import get_history, serialize_chat_log
+from .models import ChatLog
+
+logger = logging.getLogger(__name__)
+
+DEFAULTS = {
+    "ENABLED": False,
+    "MAX_SIZE": 100,
+    "FLUSH_INTERVAL": 0.05,  # seconds
+}
+
+
+class MessageWriteBuffer:
+    """
+    워커 프로세스 단위 write-behind 버퍼.
+
+    여러 연결에서 들어온 ChatLog를 도착 순서대로 모아 두었다가
+    개수(MAX_SIZE) 또는 시간(FLUSH_INTERVAL) 임계값에 도달하면
+    bulk_create 한 번으로 저장한다. flush는 하나씩 순서대로 실행되므로
+    같은 세션의 메시지는 수신 순서대로 저장된다.
+
+    한 세션 때문에 배치 저장이 실패하면 세션별로 나눠 다시 저장하므로 다른
+    세션의 메시지는 잃지 않는다. 저장(커밋)된 메시지만 링 버퍼에 넣고
+    on_saved 콜백(방송)을 호출하므로, 방송되는 메시지에는 항상 id와 seq가 있다.
+    """
+
+    def __init__(self, max_size=100, flush_interval=0.05):
+        self.max_size = max_size
+        self.flush_interval = flush_interval
+        self._pending = []
+        self._lock = None
+        self._lock_loop = None
+        self._timer = None
+        self.flush_count = 0
+        self.flushed_messages = 0
+        self.failed_messages = 0
+        self.last_flush_latency = 0.0
+        self.max_flush_latency = 0.0
+
+    @property
+    def depth(self):
+        return len(self._pending)
+
+    def stats(self):
+        return {
+            "depth": self.depth,
+            "flush_count": self.flush_count,
+            "flushed_messages": self.flushed_messages,
+            "failed_messages": self.failed_messages,
+            "last_flush_latency_ms": self.last_flush_latency * 1000,
+            "max_flush_latency_ms": self.max_flush_latency * 1000,
+        }
+
+    def _get_lock(self):
+        # asyncio.Lock은 이벤트 루프에 묶이므로 루프가 바뀌면 새로 만든다
+        loop = asyncio.get_running_loop()
+        if self._lock is None or self._lock_loop is not loop:
+            self._lock = asyncio.Lock()
+            self._lock_loop = loop
+        return self._lock
+
+    async def add(self, chat_log, on_saved=None):
+        """on_saved: 저장된 뒤 호출할 async 콜백 (chat_log를 인자로 받는다)."""
+        self._pending.append((chat_log, on_saved))
+        if len(self._pending) >= self.max_size:
+            await self.flush()
+        elif self._timer is None or self._timer.done():
+            self._timer = asyncio.create_task(self._flush_later())
+
+    async def _flush_later(self):
+        await asyncio.sleep(self.flush_interval)
+        await self.flush()
+
+    async def flush(self):
+        async with self._get_lock():
+            batch, self._pending = self._pending, []
+            if not batch:
+                return
+            await database_sync_to_async(self._write)(
+                [chat_log for chat_log, _ in batch]
+            )
+            # 저장에 실패한 메시지는 pk가 없다
+            saved = [
+                (chat_log, on_saved) for chat_log, on_saved in batch if chat_log.pk
+            ]
+            await self._extend_history([chat_log for chat_log, _ in saved])
+            for chat_log, on_saved in saved:
+                if on_saved is None:
+                    continue
+                try:
+                    await on_saved(chat_log)
+                except Exception:
+                    logger.exception("on_saved callback failed for %s", chat_log.pk)
+
+    async def _extend_history(self, chat_logs):
+        history = get_history(get_channel_layer())
+        by_session = defaultdict(list)
+        for chat_log in chat_logs:
+            by_session[chat_log.session_id].append(serialize_chat_log(chat_log))
+        for session_id, entries in by_session.items():
+            await history.extend(session_id, entries)
+
+    def flush_sync(self):
+        """
+        이벤트 루프 밖(프로세스 종료, 설정 변경)에서 남은 메시지를 저장만 한다.
+
+        링 버퍼 적재와 on_saved(방송)는 하지 않는다. 방송을 받을 이 프로세스의
+        연결은 이미 닫혔고, 링 버퍼에 빠진 seq가 있으면 재접속 재전송은
+        entries_since가 구간이 끊긴 것을 보고 DB에서 읽는다.
+        """
+        batch, self._pending = self._pending, []
+        if batch:
+            self._write([chat_log for chat_log, _ in batch])
+
+    def _write(self, batch):
+        """batch를 저장한다. 저장하지 못한 ChatLog는 pk가 None으로 남는다."""
+        started = time.perf_counter()
+        try:
+            # seq 할당, 활동 요약 갱신, INSERT를 한 트랜잭션에서 처리
+            ChatLog.objects.create_in_sequence(batch)
+        except Exception:
+            logger.warning(
+                "Failed to flush %d buffered chat messages, retrying per session",
+                len(batch),
+                exc_info=True,
+            )
+            self._write_per_session(batch)
+        latency = time.perf_counter() - started
+        flushed = sum(1 for chat_log in batch if chat_log.pk)
+        self.flush_count += 1
+        self.flushed_messages += flushed
+        self.failed_messages += len(batch) - flushed
+        self.last_flush_latency = latency
+        self.max_flush_latency = max(self.max_flush_latency, latency)
+
+    def _write_per_session(self, batch):
+        by_session = defaultdict(list)
+        for chat_log in batch:
+            by_session[chat_log.session_id].append(chat_log)
+        for session_id, chat_logs in by_session.items():
+            _reset(chat_logs)
+            try:
+                ChatLog.objects.create_in_sequence(chat_logs)
+            except Exception:
+                _reset(chat_logs)
+                logger.exception(
+                    "Dropped %d buffered chat messages for session %s",
+                    len(chat_logs),
+                    session_id,
+                )
+
+
+def _reset(chat_logs):
+    # 롤백된 트랜잭션에서 받은 pk는 버린다
+    for chat_log in chat_logs:
+        chat_log.pk = None
+        chat_log._state.adding = True
+
+
+_write_buffer = None
+
+
+def get_write_buffer():
+    """CHAT_WRITE_BUFFER["ENABLED"]일 때만 프로세스 공용 버퍼를 반환한다."""
+    global _write_buffer
+    config = {**DEFAULTS, **getattr(settings, "CHAT_WRITE_BUFFER", {})}
+    if not config["ENABLED"]:
+        return None
+    if _write_buffer is None:
+        _write_buffer = MessageWriteBuffer(
+            max_size=config["MAX_SIZE"], flush_interval=config["FLUSH_INTERVAL"]
+        )
+    return _write_buffer
+
+
+@receiver(setting_changed)
+def reset_write_buffer(*, setting, **kwargs):
+    global _write_buffer
+    if setting == "CHAT_WRITE_BUFFER":
+        if _write_buffer is not None:
+            _write_buffer.flush_sync()
+        _write_buffer = None
+
+
+@atexit.register
+def _flush_on_shutdown():
+    if _write_buffer is not None:
+        _write_buffer.flush_sync()
@@ -1,64 +1,595 @@
+import asyncio
+import functools
 import json
+import logging
+import os
+import uuid
+from dataclasses import dataclass
+from urllib.parse import parse_qs
 
-from channels.db import database_sync_to_async
 from channels.generic.websocket import AsyncWebsocketConsumer
+from django.core.exceptions import ImproperlyConfigured
 from django.utils import timezone
+from django.utils.module_loading import import_string
 
-from .models import ChatLog, ChatSession, Sender
+from ai.cache import get_result_cache
+from ai.generation import generator_version, get_reply_generator
 
+from .buffer import get_write_buffer
+from .history import entries_since, get_history, serialize_chat_log
+from .history import get_config as get_history_config
+from .models import ChatLog, ChatSession, Sender, VoiceLog
+from .outbound import OutboundQueue
+from .outbound import get_config as get_outbound_config
+from .spool import AudioSpool, SpoolFull
+from .throttling import TokenBucket, get_user_buckets
+from .throttling import get_config as get_rate_limit_config
+from .throttling import stats as throttle_stats
+from .voice import get_upload_config as get_voice_upload_config
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class SessionContext:
+    """연결 동안 유지되는 세션 정보. 메시지마다 세션을 다시 조회하지 않는다."""
+
+    session_id: int
+    owner_id: int
+    # 이 연결로 보낸 이 세션의 chat_message 프레임 순번. 송신 큐가 합치거나
+    # 버린 프레임이 있으면 클라이언트가 빈 번호로 알아챈다
+    sequence: int = 0
+
+    def next_sequence(self):
+        self.sequence += 1
+        return self.sequence
+
+
+class SessionOwnerMixin:
+    context = None
+
+    async def authorize_session(self, session_id):
+        """
+        인증된 사용자인지, 세션이 존재하는지, 사용자가 세션의 소유주인지 확인.
+        통과하면 self.context를 채우고 True, 아니면 연결을 닫고 False를 반환한다.
+        """
+        user = self.scope["user"]
+        if not user.is_authenticated:
+            await self.close(code=401)  # 인증되지 않음
+            return False
+
+        try:
+            owner_id = await self.get_session_owner_id(session_id)
+        except (ChatSession.DoesNotExist, ValueError):
+            await self.close(code=404)  # 찾을 수 없음
+            return False
+
+        if owner_id != user.pk:
+            await self.close(code=403)  # 권한 없음
+            return False
+
+        self.context = SessionContext(session_id=int(session_id), owner_id=owner_id)
+        return True
+
+    async def get_session_owner_id(self, session_id):
+        return await (
+            ChatSession.objects.filter(id=session_id)
+            .values_list("user_id", flat=True)
+            .aget()
+        )
+
+
+def group_name(session_id):
+    return f"chat_{session_id}"
+
+
+class ChatConsumer(SessionOwnerMixin, AsyncWebsocketConsumer):
+    outbound = None
 
-class ChatConsumer(AsyncWebsocketConsumer):
     async def connect(self):
         self.session_id = self.scope["url_route"]["kwargs"]["session_id"]
-        self.room_group_name = f"chat_{self.session_id}"
+        self.room_group_name = group_name(self.session_id)
         self.user = self.scope["user"]
 
-        # 인증된 사용자인지, 세션이 존재하는지, 사용자가 세션의 소유주인지 확인
-        if self.user.is_authenticated:
-            try:
-                session = await self.get_session(self.session_id)
-                if session.user == self.user:
-                    await self.channel_layer.group_add(
-                        self.room_group_name, self.channel_name
-                    )
-                    await self.accept()
-                else:
-                    await self.close(code=403)  # 권한 없음
-            except ChatSession.DoesNotExist:
-                await self.close(code=404)  # 찾을 수 없음
-        else:
-            await self.close(code=401)  # 인증되지 않음
+        if not await self.authorize_session(self.session_id):
+            return
+
+        self.setup_connection()
+        await self.channel_layer.group_add(self.room_group_name, self.channel_name)
+        await self.accept()
+
+        # 재접속한 클라이언트가 놓친 메시지 재전송 (?since=<마지막으로 받은 메시지 seq>)
+        since = self.get_since()
+        if since is not None:
+            await self.replay(self.context, since)
+
+    def setup_connection(self):
+        self.outbound = OutboundQueue.from_settings(
+            self.send, on_overflow=self.outbound_overflow, name=self.channel_name
+        )
+        self.reply_tasks = set()
+        self.rate_limit = get_rate_limit_config()
+        self.bucket = TokenBucket(self.rate_limit["RATE"], self.rate_limit["BURST"])
+        self.user_buckets = get_user_buckets(self.channel_layer)
 
     async def disconnect(self, close_code):
         await self.channel_layer.group_discard(self.room_group_name, self.channel_name)
+        await self.teardown_connection()
+
+    async def outbound_overflow(self, resume_hint):
+        # 송신 큐를 따라오지 못하는 클라이언트: 세션별로 마지막으로 보낸 seq를
+        # 알려주고 연결을 끊는다. 클라이언트는 이 값을 since로 재접속한다
+        close_code = get_outbound_config()["CLOSE_CODE"]
+        # 송신 큐는 이미 멈췄으므로 직접 보낸다. 정리는 close 뒤에 서버가
+        # 보내는 websocket.disconnect로 disconnect()에서 한 번만 한다
+        await self.send(text_data=json.dumps({"type": "resume", "since": resume_hint}))
+        await self.close(code=close_code)
+
+    async def teardown_connection(self):
+        if self.outbound is not None:
+            for task in self.reply_tasks:
+                task.cancel()
+            await self.outbound.close()
+
+        # write-behind 모드라면 연결 종료 전에 남은 메시지를 저장
+        write_buffer = get_write_buffer()
+        if write_buffer is not None:
+            await write_buffer.flush()
 
     async def receive(self, text_data):
+        if not await self.throttle():
+            return
+
         text_data_json = json.loads(text_data)
-        message = text_data_json["message"]
+        await self.post_message(self.context, text_data_json["message"])
 
-        # 데이터베이스에 메시지 저장
-        await self.save_message(message)
+    async def post_message(self, context, message):
+        # 데이터베이스에 저장한 뒤 그룹에 방송 (write-behind 모드면 버퍼에 적재)
+        await self.save_message(context, message)
 
-        # 그룹에 메시지 방송
-        await self.channel_layer.group_send(
-            self.room_group_name, {"type": "chat_message", "message": message}
-        )
+        # AI 응답은 수신 루프를 막지 않도록 별도 태스크에서 스트리밍
+        generator = get_reply_generator()
+        if generator is not None:
+            task = asyncio.create_task(
+                self.stream_ai_reply(context, generator, message)
+            )
+            self.reply_tasks.add(task)
+            task.add_done_callback(self.reply_tasks.discard)
+
+    async def throttle(self):
+        """프레임을 처리해도 되면 True. 정책에 따라 대기, 거부 또는 연결 종료."""
+        policy = self.rate_limit["POLICY"]
+        # delay 정책은 MAX_DELAY 안에 처리할 수 있는 프레임만 토큰을 미리 차감
+        max_wait = self.rate_limit["MAX_DELAY"] if policy == "delay" else 0.0
+        wait = self.bucket.consume(max_wait=max_wait)
+        if wait <= max_wait and self.user_buckets is not None:
+            user_wait = await self.user_buckets.consume(
+                self.scope["user"].pk, max_wait=max_wait
+            )
+            if user_wait > max_wait:
+                # 사용자 버킷에서 거부되면 연결 버킷에서 뺀 토큰을 돌려준다
+                self.bucket.refund()
+            wait = max(wait, user_wait)
+        if not wait:
+            return True
+
+        if wait <= max_wait:
+            throttle_stats["delayed"] += 1
+            await asyncio.sleep(wait)
+            return True
+
+        throttle_stats["rejected"] += 1
+        if policy == "close":
+            throttle_stats["closed"] += 1
+            await self.close(code=self.rate_limit["CLOSE_CODE"])
+        else:
+            self.outbound.put({"type": "rate_limited", "retry_after": round(wait, 3)})
+        return False
+
+    def get_context(self, session_id):
+        return self.context
 
     async def chat_message(self, event):
-        message = event["message"]
-        await self.send(text_data=json.dumps({"message": message}))
-
-    @database_sync_to_async
-    def get_session(self, session_id):
-        return ChatSession.objects.select_related("user").get(id=session_id)
-
-    @database_sync_to_async
-    def save_message(self, message):
-        session = ChatSession.objects.get(id=self.session_id)
-        ChatLog.objects.create(
-            session=session,
-            user=self.user,
-            sender=Sender.USER,
+        frame = {key: value for key, value in event.items() if key != "type"}
+        context = self.get_context(frame["session_id"])
+        if context is not None:
+            frame["sequence"] = context.next_sequence()
+        self.outbound.put(frame)
+
+    async def stream_ai_reply(self, context, generator, prompt):
+        stream_id = uuid.uuid4().hex
+        streamed = False
+
+        def emit(delta):
+            self.outbound.put(
+                {
+                    "type": "ai_delta",
+                    "session_id": context.session_id,
+                    "stream_id": stream_id,
+                    "delta": delta,
+                }
+            )
+
+        async def generate():
+            nonlocal streamed
+            parts = []
+            async for delta in generator(prompt, user_id=self.scope["user"].pk):
+                streamed = True
+                parts.append(delta)
+                emit(delta)
+            return "".join(parts)
+
+        try:
+            cache = get_result_cache()
+            if cache is None:
+                reply = await generate()
+            else:
+                reply = await cache.get_or_compute(
+                    generator_version(generator), prompt, generate
+                )
+                if not streamed:
+                    # 캐시에서 찾았거나 같은 요청의 결과를 기다린 경우 한 번에 보낸다
+                    emit(reply)
+        except Exception:
+            logger.exception("AI reply generation failed (stream %s)", stream_id)
+            self.outbound.put(
+                {
+                    "type": "ai_error",
+                    "session_id": context.session_id,
+                    "stream_id": stream_id,
+                }
+            )
+            return
+
+        # 청크마다가 아니라 완성된 응답을 한 번만 저장하고 그룹에 방송
+        await self.save_message(context, reply, sender=Sender.AI, stream_id=stream_id)
+
+    def get_since(self):
+        query = parse_qs(self.scope.get("query_string", b"").decode())
+        try:
+            return int(query["since"][0])
+        except (KeyError, ValueError):
+            return None
+
+    async def replay(self, context, since):
+        history = get_history(self.channel_layer)
+        entries = entries_since(await history.read(context.session_id), since)
+        truncated = False
+        if entries is None:
+            # 링 버퍼에서 밀려난 구간은 DB에서 제한된 개수만 읽는다
+            limit = get_history_config()["DB_REPLAY_LIMIT"]
+            queryset = ChatLog.objects.filter(
+                session_id=context.session_id, seq__gt=since
+            ).order_by("seq")
+            entries = [
+                serialize_chat_log(chat_log) async for chat_log in queryset[: limit + 1]
+            ]
+            truncated = len(entries) > limit
+            entries = entries[:limit]
+
+        # 실시간 메시지와 같은 송신 큐와 순번을 거친다
+        for entry in entries:
+            await self.chat_message({"type": "chat_message", **entry})
+        self.outbound.put(
+            {
+                "type": "replay_complete",
+                "session_id": context.session_id,
+                "truncated": truncated,
+            }
+        )
+
+    async def save_message(self, context, message, sender=Sender.USER, **extra):
+        """
+        메시지를 저장하고, 커밋된 뒤 링 버퍼에 넣고 그룹에 방송한다(extra는
+        방송 프레임에 추가). 방송되는 메시지에는 항상 id와 seq가 있다.
+        """
+        chat_log = ChatLog(
+            session_id=context.session_id,
+            user_id=context.owner_id,
+            sender=sender,
             message=message,
             timestamp=timezone.now(),
         )
+        broadcast = functools.partial(self.broadcast, **extra)
+        write_buffer = get_write_buffer()
+        if write_buffer is not None:
+            # id와 seq는 flush 이후에 정해지므로 링 버퍼 적재와 방송도 flush 시점에 한다
+            await write_buffer.add(chat_log, on_saved=broadcast)
+            return
+        # seq 할당(UPDATE ... RETURNING)과 INSERT를 한 트랜잭션에서 처리
+        await ChatLog.objects.acreate_in_sequence([chat_log])
+        if chat_log.pk is None:
+            await self.session_deleted(context)
+            return
+        await get_history(self.channel_layer).extend(
+            chat_log.session_id, [serialize_chat_log(chat_log)]
+        )
+        await broadcast(chat_log)
+
+    async def session_deleted(self, context):
+        # 연결 중에 세션이 삭제되었다. 알리고 남은 프레임을 보낸 뒤 닫는다
+        self.outbound.put(
+            {
+                "type": "error",
+                "session_id": context.session_id,
+                "detail": "Chat session no longer exists.",
+            }
+        )
+        await self.outbound.join()
+        await self.close(code=404)
+
+    async def broadcast(self, chat_log, **extra):
+        await self.channel_layer.group_send(
+            group_name(chat_log.session_id),
+            {"type": "chat_message", **serialize_chat_log(chat_log), **extra},
+        )
+
+
+class MultiplexChatConsumer(ChatConsumer):
+    """
+    한 연결로 여러 세션을 구독한다 (ws/chat/). 클라이언트 프레임:
+
+    - {"type": "subscribe", "session_ids": [...], "since": {"<id>": <seq>}}
+    - {"type": "unsubscribe", "session_ids": [...]}
+    - {"type": "message", "session_id": <id>, "message": "..."}
+
+    서버가 보내는 프레임에는 모두 session_id가 붙는다. 구독 요청의 소유권은
+    세션 수와 관계없이 쿼리 한 번으로 확인한다.
+    """
+
+    max_subscriptions = 100  # 연결당 동시에 구독할 수 있는 세션 수
+
+    async def connect(self):
+        self.user = self.scope["user"]
+        if not self.user.is_authenticated:
+            await self.close(code=401)
+            return
+
+        self.sessions = {}  # session_id -> SessionContext
+        self.setup_connection()
+        await self.accept()
+
+    def get_context(self, session_id):
+        return self.sessions.get(session_id)
+
+    async def disconnect(self, close_code):
+        for session_id in getattr(self, "sessions", ()):
+            await self.channel_layer.group_discard(
+                group_name(session_id), self.channel_name
+            )
+        await self.teardown_connection()
+
+    async def receive(self, text_data):
+        if not await self.throttle():
+            return
+
+        try:
+            frame = json.loads(text_data)
+            frame_type = frame["type"]
+        except (ValueError, TypeError, KeyError):
+            self.outbound.put({"type": "error", "detail": "Malformed frame."})
+            return
+
+        if frame_type == "subscribe":
+            await self.subscribe(frame)
+        elif frame_type == "unsubscribe":
+            await self.unsubscribe(frame)
+        elif frame_type == "message":
+            session_id = frame.get("session_id")
+            context = (
+                self.sessions.get(session_id) if isinstance(session_id, int) else None
+            )
+            if context is None or not isinstance(frame.get("message"), str):
+                self.outbound.put(
+                    {
+                        "type": "error",
+                        "session_id": session_id,
+                        "detail": "Not subscribed to this session.",
+                    }
+                )
+                return
+            await self.post_message(context, frame["message"])
+        else:
+            self.outbound.put({"type": "error", "detail": "Unknown frame type."})
+
+    def get_session_ids(self, frame):
+        session_ids = frame.get("session_ids")
+        if not isinstance(session_ids, list) or not all(
+            isinstance(session_id, int) for session_id in session_ids
+        ):
+            self.outbound.put(
+                {"type": "error", "detail": "session_ids must be a list of integers."}
+            )
+            return None
+        return list(dict.fromkeys(session_ids))
+
+    async def subscribe(self, frame):
+        session_ids = self.get_session_ids(frame)
+        if session_ids is None:
+            return
+        requested = [
+            session_id for session_id in session_ids if session_id not in self.sessions
+        ]
+        available = self.max_subscriptions - len(self.sessions)
+
+        # 요청한 세션 전체의 소유권을 한 번에 확인
+        owned = set()
+        if requested[:available]:
+            owned = {
+                session_id
+                async for session_id in ChatSession.objects.filter(
+                    id__in=requested[:available], user_id=self.user.pk
+                ).values_list("id", flat=True)
+            }
+        for session_id in owned:
+            self.sessions[session_id] = SessionContext(
+                session_id=session_id, owner_id=self.user.pk
+            )
+            await self.channel_layer.group_add(
+                group_name(session_id), self.channel_name
+            )
+
+        self.outbound.put(
+            {
+                "type": "subscribed",
+                "session_ids": [s for s in session_ids if s in self.sessions],
+                # 없거나 남의 세션, 구독 한도 초과는 구분하지 않고 거부
+                "rejected": [s for s in session_ids if s not in self.sessions],
+            }
+        )
+
+        since = frame.get("since") or {}
+        for session_id in sorted(owned):
+            try:
+                session_since = int(since[str(session_id)])
+            except (KeyError, TypeError, ValueError):
+                continue
+            await self.replay(self.sessions[session_id], session_since)
+
+    async def session_deleted(self, context):
+        # 다른 구독은 유지하고 삭제된 세션의 구독만 끊는다
+        if self.sessions.pop(context.session_id, None) is not None:
+            await self.channel_layer.group_discard(
+                group_name(context.session_id), self.channel_name
+            )
+        self.outbound.put(
+            {
+                "type": "error",
+                "session_id": context.session_id,
+                "detail": "Chat session no longer exists.",
+            }
+        )
+
+    async def unsubscribe(self, frame):
+        session_ids = self.get_session_ids(frame)
+        if session_ids is None:
+            return
+        for session_id in session_ids:
+            if self.sessions.pop(session_id, None) is not None:
+                await self.channel_layer.group_discard(
+                    group_name(session_id), self.channel_name
+                )
+        self.outbound.put({"type": "unsubscribed", "session_ids": session_ids})
+
+
+class VoiceUploadConsumer(SessionOwnerMixin, AsyncWebsocketConsumer):
+    """
+    바이너리 프레임으로 오디오를 받아 memory-mapped 임시 파일에 쌓고,
+    {"type": "end"} 텍스트 프레임을 받으면 VoiceLog를 만든다.
+    PARTIAL_TRANSCRIBER가 설정되어 있으면 업로드 도중에도 부분 인식을 돌린다.
+    """
+
+    spool = None
+
+    async def connect(self):
+        session_id = self.scope["url_route"]["kwargs"]["session_id"]
+        if not await self.authorize_session(session_id):
+            return
+
+        try:
+            self.config = get_voice_upload_config()
+        except ImproperlyConfigured:
+            logger.exception("Voice upload is not configured")
+            await self.close(code=1011)  # Internal Error
+            return
+        query = parse_qs(self.scope.get("query_string", b"").decode())
+        audio_format = query.get("format", ["wav"])[0]
+        self.audio_format = audio_format if audio_format.isalnum() else "wav"
+        # 디렉터리 생성과 파일 할당은 이벤트 루프 밖 스레드에서
+        self.spool = await asyncio.to_thread(
+            AudioSpool,
+            self.config["DIR"],
+            initial_size=self.config["INITIAL_SIZE"],
+            max_size=self.config["MAX_SIZE"],
+        )
+        self.partial_transcriber = (
+            import_string(self.config["PARTIAL_TRANSCRIBER"])
+            if self.config["PARTIAL_TRANSCRIBER"]
+            else None
+        )
+        self.partial_task = None
+        self.next_partial_at = self.config["PARTIAL_INTERVAL"]
+        await self.accept()
+
+    async def disconnect(self, close_code):
+        if self.spool is not None:
+            await self.wait_partial()
+            spool, self.spool = self.spool, None
+            await asyncio.to_thread(spool.discard)
+
+    async def receive(self, text_data=None, bytes_data=None):
+        if self.spool is None:  # 이미 종료 처리된 업로드
+            return
+        if bytes_data is not None:
+            try:
+                self.spool.write(bytes_data)
+            except SpoolFull:
+                await self.disconnect(1009)
+                await self.close(code=1009)  # Message Too Big
+                return
+            self.maybe_start_partial()
+            return
+
+        try:
+            frame_type = json.loads(text_data).get("type")
+        except (TypeError, ValueError, AttributeError):
+            await self.send(
+                text_data=json.dumps({"type": "error", "detail": "Malformed frame."})
+            )
+            await self.disconnect(1007)
+            await self.close(code=1007)  # Invalid frame payload data
+            return
+        if frame_type == "end":
+            await self.finalize()
+
+    def maybe_start_partial(self):
+        if self.partial_transcriber is None or self.spool.size < self.next_partial_at:
+            return
+        if self.partial_task is not None and not self.partial_task.done():
+            return
+        self.next_partial_at = self.spool.size + self.config["PARTIAL_INTERVAL"]
+        self.spool.flush()
+        self.partial_task = asyncio.create_task(
+            self.send_partial(self.spool.path, self.spool.size)
+        )
+        # 다음 부분 인식이 이 태스크를 덮어쓰므로 실패는 여기서 남긴다
+        self.partial_task.add_done_callback(self.partial_done)
+
+    @staticmethod
+    def partial_done(task):
+        if not task.cancelled() and task.exception() is not None:
+            logger.error("Partial transcription failed", exc_info=task.exception())
+
+    async def send_partial(self, path, size):
+        # 오디오 처리는 이벤트 루프 밖 스레드에서 실행
+        text = await asyncio.to_thread(self.partial_transcriber, path, size)
+        await self.send(
+            text_data=json.dumps(
+                {"type": "partial_transcript", "text": text, "bytes": size}
+            )
+        )
+
+    async def wait_partial(self):
+        if self.partial_task is not None:
+            await asyncio.gather(self.partial_task, return_exceptions=True)
+
+    async def finalize(self):
+        await self.wait_partial()
+        filename = f"{uuid.uuid4().hex}.{self.audio_format}"
+        spool, self.spool = self.spool, None
+        size = await asyncio.to_thread(
+            spool.finalize, os.path.join(self.config["DIR"], filename)
+        )
+
+        voice_log = await VoiceLog.objects.acreate(
+            session_id=self.context.session_id,
+            user_id=self.context.owner_id,
+            input_audio_url=f"{self.config['URL']}{filename}",
+            timestamp=timezone.now(),
+        )
+        await self.send(
+            text_data=json.dumps(
+                {"type": "upload_complete", "voice_log_id": voice_log.id, "bytes": size}
+            )
+        )
+        await self.close()
@@ -0,0 +1,112 @@
+import heapq
+import zlib
+
+from django.core.serializers.json import DjangoJSONEncoder
+
+from .models import ChatLog, VoiceLog
+
+CHUNK_SIZE = 2000  # 서버 사이드 커서에서 한 번에 가져오는 행 수
+FLUSH_BYTES = 64 * 1024  # 이 크기만큼 모이면 클라이언트로 내보낸다
+
+
+async def _chat_events(session_id):
+    rows = (
+        ChatLog.objects.filter(session_id=session_id)
+        .order_by("timestamp", "id")
+        .values("id", "sender", "message", "timestamp")
+        .aiterator(chunk_size=CHUNK_SIZE)
+    )
+    async for row in rows:
+        yield {"type": "chat", **row}
+
+
+async def _voice_events(session_id):
+    rows = (
+        VoiceLog.objects.filter(session_id=session_id)
+        .order_by("timestamp", "id")
+        .values(
+            "id", "input_audio_url", "output_audio_url", "transcribed_text", "timestamp"
+        )
+        .aiterator(chunk_size=CHUNK_SIZE)
+    )
+    async for row in rows:
+        yield {"type": "voice", **row}
+
+
+async def _merge(*iterators, key):
+    """heapq.merge의 async 버전. key가 같으면 앞 iterator의 항목이 먼저 나온다."""
+    heap = []
+    for index, iterator in enumerate(iterators):
+        item = await anext(iterator, None)
+        if item is not None:
+            heap.append((key(item), index, item))
+    heapq.heapify(heap)
+    while heap:
+        _, index, item = heap[0]
+        yield item
+        following = await anext(iterators[index], None)
+        if following is None:
+            heapq.heappop(heap)
+        else:
+            heapq.heapreplace(heap, (key(following), index, following))
+
+
+async def iter_transcript_lines(session_id):
+    """ChatLog와 VoiceLog를 timestamp 순으로 병합해 NDJSON 줄 단위로 만든다."""
+    encoder = DjangoJSONEncoder(ensure_ascii=False)
+    events = _merge(
+        _chat_events(session_id),
+        _voice_events(session_id),
+        key=lambda event: event["timestamp"],
+    )
+    async for event in events:
+        yield (encoder.encode(event) + "\n").encode()
+
+
+async def _buffered(lines):
+    buffer, size = [], 0
+    async for line in lines:
+        buffer.append(line)
+        size += len(line)
+        if size >= FLUSH_BYTES:
+            yield b"".join(buffer)
+            buffer, size = [], 0
+    if buffer:
+        yield b"".join(buffer)
+
+
+async def _gzipped(chunks):
+    compressor = zlib.compressobj(wbits=16 + zlib.MAX_WBITS)
+    async for chunk in chunks:
+        compressed = compressor.compress(chunk)
+        if compressed:
+            yield compressed
+    yield compressor.flush()
+
+
+def accepts_gzip(accept_encoding):
+    """Accept-Encoding 헤더가 gzip을 허용하는지 (q=0은 거부로 본다)."""
+    qualities = {}
+    for part in accept_encoding.split(","):
+        coding, *params = [item.strip() for item in part.split(";")]
+        quality = 1.0
+        for param in params:
+            name, _, value = param.partition("=")
+            if name.strip().lower() == "q":
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        if coding:
+            qualities[coding.lower()] = quality
+    return qualities.get("gzip", qualities.get("*", 0.0)) > 0
+
+
+def stream_transcript(session_id, gzip=False):
+    """
+    async iterator를 돌려준다. ASGI에서 StreamingHttpResponse는 sync
+    iterator를 list()로 모두 읽은 뒤 보내므로, 메모리 사용량이 일정하려면
+    async여야 한다.
+    """
+    chunks = _buffered(iter_transcript_lines(session_id))
+    return _gzipped(chunks) if gzip else chunks
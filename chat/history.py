@@ -0,0 +1,122 @@
+import json
+from collections import defaultdict, deque
+from weakref import WeakKeyDictionary
+
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+
+try:
+    from channels_redis.core import RedisChannelLayer
+except ImportError:  # pragma: no cover - channels_redis는 운영 환경에만 필요
+    RedisChannelLayer = None
+
+DEFAULTS = {
+    "RING_SIZE": 200,  # 세션별로 보관하는 최근 메시지 수
+    "DB_REPLAY_LIMIT": 500,  # 링 버퍼에 없을 때 DB에서 재전송하는 최대 메시지 수
+    "TTL": 60 * 60 * 24,  # seconds (Redis)
+}
+
+
+def get_config():
+    return {**DEFAULTS, **getattr(settings, "CHAT_HISTORY", {})}
+
+
+def serialize_chat_log(chat_log):
+    return {
+        "id": chat_log.id,
+        "session_id": chat_log.session_id,
+        "seq": chat_log.seq,
+        "message": chat_log.message,
+        "sender": chat_log.sender,
+        "timestamp": chat_log.timestamp.isoformat(),
+    }
+
+
+class InMemoryHistory:
+    """InMemoryChannelLayer용: 프로세스 메모리의 세션별 deque."""
+
+    def __init__(self, size):
+        self._rings = defaultdict(lambda: deque(maxlen=size))
+
+    async def extend(self, session_id, entries):
+        self._rings[int(session_id)].extend(entries)
+
+    async def read(self, session_id):
+        return list(self._rings.get(int(session_id), ()))
+
+
+class RedisHistory:
+    """RedisChannelLayer용: 채널 레이어와 같은 Redis에 세션별 리스트로 보관."""
+
+    def __init__(self, channel_layer, size, ttl):
+        self.channel_layer = channel_layer
+        self.size = size
+        self.ttl = ttl
+
+    def _key(self, session_id):
+        return f"{self.channel_layer.prefix}:history:{session_id}"
+
+    def _connection(self, key):
+        return self.channel_layer.connection(self.channel_layer.consistent_hash(key))
+
+    async def extend(self, session_id, entries):
+        if not entries:
+            return
+        key = self._key(session_id)
+        async with self._connection(key).pipeline(transaction=True) as pipe:
+            pipe.rpush(key, *(json.dumps(entry) for entry in entries))
+            pipe.ltrim(key, -self.size, -1)
+            pipe.expire(key, self.ttl)
+            await pipe.execute()
+
+    async def read(self, session_id):
+        key = self._key(session_id)
+        return [
+            json.loads(raw) for raw in await self._connection(key).lrange(key, 0, -1)
+        ]
+
+
+_histories = WeakKeyDictionary()
+
+
+def get_history(channel_layer):
+    """채널 레이어 백엔드에 맞는 최근 메시지 링 버퍼를 반환한다."""
+    history = _histories.get(channel_layer)
+    if history is None:
+        config = get_config()
+        if RedisChannelLayer is not None and isinstance(
+            channel_layer, RedisChannelLayer
+        ):
+            history = RedisHistory(channel_layer, config["RING_SIZE"], config["TTL"])
+        else:
+            history = InMemoryHistory(config["RING_SIZE"])
+        _histories[channel_layer] = history
+    return history
+
+
+@receiver(setting_changed)
+def reset_histories(*, setting, **kwargs):
+    if setting == "CHAT_HISTORY":
+        _histories.clear()
+
+
+def entries_since(entries, since):
+    """
+    링 버퍼가 클라이언트가 마지막으로 받은 seq(since) 다음부터 빠짐없이 갖고 있으면
+    그 이후 항목을 seq 순으로 반환하고, 아니면 None을 반환한다(DB 조회 필요).
+
+    링 버퍼 적재는 커밋 이후 여러 경로(REST, 웹소켓, write-behind flush)에서
+    프로세스 간 순서 보장 없이 일어나므로, 밀려난 구간뿐 아니라 중간에 빠지거나
+    순서가 뒤바뀐 항목이 있을 수 있다. seq가 since + 1부터 연속인지 확인한다.
+    """
+    if not entries:
+        return None
+    newer = sorted(
+        {entry["seq"]: entry for entry in entries if entry["seq"] > since}.values(),
+        key=lambda entry: entry["seq"],
+    )
+    for expected, entry in enumerate(newer, start=since + 1):
+        if entry["seq"] != expected:
+            return None
+    return newer
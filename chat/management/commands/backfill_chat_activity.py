@@ -0,0 +1,59 @@
+from django.core.management.base import BaseCommand
+from django.db.models import Count, IntegerField, Max, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce, Substr
+
+from chat.models import PREVIEW_LENGTH, ChatLog, ChatSession
+
+
+class Command(BaseCommand):
+    help = "ChatLog를 기준으로 ChatSession 활동 요약(message_count 등)을 재계산합니다."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=1000)
+
+    def handle(self, *args, batch_size, **options):
+        logs = ChatLog.objects.filter(session=OuterRef("pk"))
+        counts = (
+            logs.order_by()
+            .values("session")
+            .annotate(count=Count("id"))
+            .values("count")
+        )
+        latest = logs.order_by("-timestamp", "-id")
+        max_seq = (
+            logs.order_by().values("session").annotate(seq=Max("seq")).values("seq")
+        )
+
+        updated = 0
+        last_id = 0
+        while True:
+            # pk 범위 단위로 나눠서 갱신해 긴 잠금을 피한다
+            ids = list(
+                ChatSession.objects.filter(id__gt=last_id)
+                .order_by("id")
+                .values_list("id", flat=True)[:batch_size]
+            )
+            if not ids:
+                break
+            updated += ChatSession.objects.filter(id__in=ids).update(
+                message_count=Coalesce(
+                    Subquery(counts, output_field=IntegerField()), Value(0)
+                ),
+                last_message_at=Subquery(latest.values("timestamp")[:1]),
+                last_message_preview=Coalesce(
+                    Subquery(
+                        latest.annotate(
+                            preview=Substr("message", 1, PREVIEW_LENGTH)
+                        ).values("preview")[:1]
+                    ),
+                    Value(""),
+                ),
+                last_seq=Coalesce(
+                    Subquery(max_seq, output_field=IntegerField()), Value(0)
+                ),
+            )
+            last_id = ids[-1]
+
+        self.stdout.write(
+            self.style.SUCCESS(f"Backfilled activity for {updated} chat sessions.")
+        )
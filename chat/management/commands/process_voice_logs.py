@@ -0,0 +1,40 @@
+from django.core.exceptions import ImproperlyConfigured
+from django.core.management.base import BaseCommand, CommandError
+
+from chat.voice import VoicePipeline
+
+
+class Command(BaseCommand):
+    help = "대기 중인 VoiceLog에 대해 STT/TTS 처리를 실행합니다."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--once",
+            action="store_true",
+            help="대기 중인 작업을 한 번만 처리하고 종료합니다.",
+        )
+
+    def handle(self, *args, once, **options):
+        try:
+            pipeline = VoicePipeline.from_settings()
+        except ImproperlyConfigured as exc:
+            raise CommandError(exc) from exc
+        try:
+            if once:
+                processed = 0
+                while count := pipeline.run_once():
+                    processed += count
+                self.stdout.write(
+                    self.style.SUCCESS(f"Processed {processed} voice logs.")
+                )
+            else:
+                pipeline.run_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            pipeline.shutdown()
+            stats = pipeline.stats()
+            self.stdout.write(
+                "queue_depth={queue_depth} processed={processed} failed={failed} "
+                "avg_latency_ms={avg_latency_ms:.1f}".format(**stats)
+            )
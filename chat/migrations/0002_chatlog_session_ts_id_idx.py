@@ -0,0 +1,19 @@
+# Generated by Django 5.2.18 on 2026-10-18 04:13
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chat', '0001_initial'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='chatlog',
+            index=models.Index(fields=['session', 'timestamp', 'id'], name='chatlog_session_ts_id_idx'),
+        ),
+    ]
@@ -0,0 +1,55 @@
+from django.conf import settings
+from django.db import migrations, models
+
+from chat.search import install_search_index
+
+BATCH_SIZE = 1000
+
+
+def backfill_seq(apps, schema_editor):
+    ChatSession = apps.get_model("chat", "ChatSession")
+    ChatLog = apps.get_model("chat", "ChatLog")
+    for session_id in ChatSession.objects.values_list("id", flat=True).iterator():
+        ids = ChatLog.objects.filter(session_id=session_id).order_by(
+            "timestamp", "id"
+        ).values_list("id", flat=True)
+        updates = [ChatLog(id=log_id, seq=seq) for seq, log_id in enumerate(ids, 1)]
+        ChatLog.objects.bulk_update(updates, ["seq"], batch_size=BATCH_SIZE)
+        ChatSession.objects.filter(id=session_id).update(last_seq=len(updates))
+
+
+def reinstall_search_index(apps, schema_editor):
+    # SQLite는 컬럼 변경 시 테이블을 다시 만들면서 FTS 트리거가 사라진다
+    install_search_index(schema_editor)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chat', '0005_voicelog_status'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='chatlog',
+            name='seq',
+            field=models.PositiveBigIntegerField(null=True),
+        ),
+        migrations.AddField(
+            model_name='chatsession',
+            name='last_seq',
+            field=models.PositiveBigIntegerField(default=0),
+        ),
+        migrations.RunPython(backfill_seq, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='chatlog',
+            name='seq',
+            field=models.PositiveBigIntegerField(),
+        ),
+        migrations.AddConstraint(
+            model_name='chatlog',
+            constraint=models.UniqueConstraint(fields=('session', 'seq'), name='chatlog_session_seq_uniq'),
+        ),
+        migrations.RunPython(reinstall_search_index, migrations.RunPython.noop),
+    ]
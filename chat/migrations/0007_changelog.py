@@ -0,0 +1,78 @@
+# Generated by Django 5.2.18 on 2026-10-18 04:34
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+BATCH_SIZE = 1000
+
+
+def backfill_changes(apps, schema_editor):
+    # 기존 데이터도 since=0 동기화에 포함되도록 upsert 이력을 만든다
+    ChatSession = apps.get_model("chat", "ChatSession")
+    ChatLog = apps.get_model("chat", "ChatLog")
+    VoiceLog = apps.get_model("chat", "VoiceLog")
+    ChangeLog = apps.get_model("chat", "ChangeLog")
+    SyncState = apps.get_model("chat", "SyncState")
+
+    versions = {}
+    entries = []
+    for kind, model, ordering in [
+        ("session", ChatSession, ("user_id", "id")),
+        ("message", ChatLog, ("user_id", "session_id", "seq")),
+        ("voice_log", VoiceLog, ("user_id", "id")),
+    ]:
+        rows = model.objects.order_by(*ordering).values_list("user_id", "id")
+        for user_id, object_id in rows.iterator(chunk_size=BATCH_SIZE):
+            versions[user_id] = versions.get(user_id, 0) + 1
+            entries.append(
+                ChangeLog(
+                    user_id=user_id,
+                    version=versions[user_id],
+                    kind=kind,
+                    object_id=object_id,
+                )
+            )
+            if len(entries) >= BATCH_SIZE:
+                ChangeLog.objects.bulk_create(entries)
+                entries = []
+    ChangeLog.objects.bulk_create(entries)
+    SyncState.objects.bulk_create(
+        [SyncState(user_id=user_id, version=v) for user_id, v in versions.items()],
+        batch_size=BATCH_SIZE,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chat', '0006_chatlog_seq'),
+        ('users', '0001_initial'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SyncState',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('version', models.PositiveBigIntegerField(default=0)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='ChangeLog',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('version', models.PositiveBigIntegerField()),
+                ('kind', models.CharField(choices=[('session', 'Chat session'), ('message', 'Chat message'), ('voice_log', 'Voice log')], max_length=10)),
+                ('object_id', models.PositiveBigIntegerField()),
+                ('deleted', models.BooleanField(default=False)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('user', 'version'), name='changelog_user_version_uniq')],
+            },
+        ),
+        migrations.RunPython(backfill_changes, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,47 @@
+from django.db import migrations, models
+
+from ai.tokens import count_tokens
+from chat.search import install_search_index
+
+BATCH_SIZE = 1000
+
+
+def backfill_token_count(apps, schema_editor):
+    ChatLog = apps.get_model("chat", "ChatLog")
+    last_id = 0
+    while True:
+        batch = list(
+            ChatLog.objects.filter(id__gt=last_id)
+            .order_by("id")
+            .only("id", "message")[:BATCH_SIZE]
+        )
+        if not batch:
+            break
+        for chat_log in batch:
+            chat_log.token_count = count_tokens(chat_log.message)
+        ChatLog.objects.bulk_update(batch, ["token_count"])
+        last_id = batch[-1].id
+
+
+def reinstall_search_index(apps, schema_editor):
+    # SQLite는 컬럼 추가/삭제 시 테이블을 다시 만들면서 FTS 트리거가 사라진다
+    install_search_index(schema_editor)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chat', '0007_changelog'),
+    ]
+
+    operations = [
+        # 되돌릴 때(RemoveField) 사라지는 트리거를 다시 만든다
+        migrations.RunPython(migrations.RunPython.noop, reinstall_search_index),
+        migrations.AddField(
+            model_name='chatlog',
+            name='token_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(reinstall_search_index, migrations.RunPython.noop),
+        migrations.RunPython(backfill_token_count, migrations.RunPython.noop),
+    ]
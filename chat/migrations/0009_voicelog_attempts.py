@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 05:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chat', '0008_chatlog_token_count'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='voicelog',
+            name='attempts',
+            field=models.PositiveSmallIntegerField(default=0),
+        ),
+    ]
@@ -1,26 +1,213 @@
+from asgiref.sync import sync_to_async
 from django.conf import settings
-from django.db import models
+from django.db import connections, models, transaction
+from django.db.models import Case, F, Q, Value, When, sql
+from django.db.models.functions import Coalesce
 from django.utils.translation import gettext_lazy as _
 
+from ai.tokens import count_tokens
+
+PREVIEW_LENGTH = 100
+
 
 class Sender(models.TextChoices):
     USER = "user", _("User")
     AI = "ai", _("AI")
 
 
+class ChangeKind(models.TextChoices):
+    SESSION = "session", _("Chat session")
+    MESSAGE = "message", _("Chat message")
+    VOICE_LOG = "voice_log", _("Voice log")
+
+
+def update_returning(queryset, field, **updates):
+    """
+    queryset.update(**updates)를 실행하고 갱신된 행의 field 값을 반환한다(없으면
+    None). RETURNING을 지원하는 DB(PostgreSQL, SQLite 3.35+)에서는 한 문장이고,
+    아니면 UPDATE 뒤에 SELECT 한 번을 더 한다.
+    """
+    connection = connections[queryset.db]
+    if not connection.features.can_return_columns_from_insert:
+        if not queryset.update(**updates):
+            return None
+        return queryset.values_list(field, flat=True).first()
+    query = queryset.query.chain(sql.UpdateQuery)
+    query.add_update_values(updates)
+    update_sql, params = query.get_compiler(queryset.db).as_sql()
+    column = connection.ops.quote_name(queryset.model._meta.get_field(field).column)
+    with connection.cursor() as cursor:
+        cursor.execute(f"{update_sql} RETURNING {column}", params)
+        row = cursor.fetchone()
+    return row[0] if row else None
+
+
+class TombstoneQuerySet(models.QuerySet):
+    """
+    명시적으로 삭제(QuerySet.delete)할 때 삭제 tombstone을 한 번에 기록한다.
+
+    post_delete 수신자를 두면 세션/사용자 삭제의 연쇄 삭제가 fast-delete 대신
+    모든 행을 읽어 id 목록으로 지우게 되므로, 신호 대신 이 경로에서 기록한다.
+    """
+
+    def delete(self):
+        with transaction.atomic(using=self.db, savepoint=False):
+            rows = list(self.values_list("user_id", "pk"))
+            # 읽은 행만 지워야 tombstone과 실제 삭제가 어긋나지 않는다
+            deleted = models.QuerySet.delete(
+                self.model._base_manager.using(self.db).filter(
+                    pk__in=[pk for _, pk in rows]
+                )
+            )
+            record_tombstones(self.model.change_kind, rows, using=self.db)
+        return deleted
+
+    delete.alters_data = True
+    delete.queryset_only = True
+
+
+class TombstoneModel(models.Model):
+    """Model.delete()도 TombstoneQuerySet.delete()와 같이 tombstone을 남긴다."""
+
+    change_kind = None  # ChangeKind
+
+    class Meta:
+        abstract = True
+
+    def delete(self, using=None, keep_parents=False):
+        using = using or self._state.db
+        rows = [(self.user_id, self.pk)]
+        with transaction.atomic(using=using, savepoint=False):
+            deleted = super().delete(using=using, keep_parents=keep_parents)
+            record_tombstones(self.change_kind, rows, using=using)
+        return deleted
+
+
+def record_tombstones(kind, rows, using=None):
+    """(user_id, object_id) 목록의 삭제 이력을 ChangeLog bulk insert 한 번으로 기록."""
+    ChangeLog.objects.db_manager(using).record(
+        (user_id, kind, object_id, True) for user_id, object_id in rows
+    )
+
+
+class ChatSessionQuerySet(models.QuerySet):
+    def _activity_updates(self, count, last_message_at, last_message):
+        # 늦게 도착한 과거 메시지가 최신 미리보기를 덮어쓰지 않도록 조건부 갱신
+        is_newer = Q(last_message_at__isnull=True) | Q(
+            last_message_at__lte=last_message_at
+        )
+        return {
+            "message_count": F("message_count") + count,
+            "last_message_at": Case(
+                When(is_newer, then=Value(last_message_at)),
+                default=F("last_message_at"),
+            ),
+            "last_message_preview": Case(
+                When(is_newer, then=Value(last_message[:PREVIEW_LENGTH])),
+                default=F("last_message_preview"),
+            ),
+        }
+
+    def record_activity(self, session_id, count, last_message_at, last_message):
+        """
+        활동 요약을 갱신하면서 seq를 count개 할당하고, 새 last_seq를 반환한다.
+
+        UPDATE가 세션 행을 잠그고 갱신된 값을 바로 돌려주므로(RETURNING)
+        동시에 저장해도 seq가 겹치지 않는다. 반드시 transaction.atomic 안에서
+        ChatLog INSERT와 함께 호출해야 실패 시 seq에 빈 번호가 생기지 않는다.
+        세션이 (삭제되어) 없으면 None.
+        """
+        return update_returning(
+            self.filter(id=session_id),
+            "last_seq",
+            last_seq=F("last_seq") + count,
+            **self._activity_updates(count, last_message_at, last_message),
+        )
+
+    def order_by_activity(self):
+        return self.order_by(Coalesce("last_message_at", "created_at").desc(), "-id")
+
+
 class ChatSession(models.Model):
     user = models.ForeignKey(
         settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name="chat_sessions"
     )
     title = models.CharField(max_length=255)
+    # ChatLog 저장 시 함께 갱신되는 요약 정보 (backfill_chat_activity로 재계산 가능)
+    message_count = models.PositiveIntegerField(default=0)
+    last_message_at = models.DateTimeField(null=True, blank=True)
+    last_message_preview = models.CharField(max_length=255, blank=True, default="")
+    # 이 세션에서 마지막으로 할당한 ChatLog.seq
+    last_seq = models.PositiveBigIntegerField(default=0)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    objects = ChatSessionQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            models.Index(
+                F("user"),
+                Coalesce("last_message_at", "created_at").desc(),
+                F("id").desc(),
+                name="chatsession_user_activity_idx",
+            ),
+        ]
+
     def __str__(self):
         return f"{self.title} by {self.user.email}"
 
 
-class ChatLog(models.Model):
+class ChatLogQuerySet(TombstoneQuerySet):
+    def create_in_sequence(self, chat_logs):
+        """
+        세션별로 연속된 seq를 붙여 한 트랜잭션에서 bulk_create 한다.
+        세션 id 순서대로 잠가 여러 세션을 동시에 기록해도 교착되지 않는다.
+        그 사이 삭제된 세션의 메시지는 저장하지 않으며 pk가 None으로 남는다.
+        """
+        by_session = {}
+        for chat_log in chat_logs:
+            by_session.setdefault(chat_log.session_id, []).append(chat_log)
+
+        with transaction.atomic(using=self.db, savepoint=False):
+            for session_id in sorted(by_session):
+                logs = by_session[session_id]
+                latest = max(logs, key=lambda chat_log: chat_log.timestamp)
+                last_seq = ChatSession.objects.record_activity(
+                    session_id, len(logs), latest.timestamp, latest.message
+                )
+                if last_seq is None:
+                    del by_session[session_id]
+                    continue
+                for seq, chat_log in enumerate(logs, start=last_seq - len(logs) + 1):
+                    chat_log.seq = seq
+                    chat_log.token_count = count_tokens(chat_log.message)
+            created = self.bulk_create(
+                [
+                    chat_log
+                    for chat_log in chat_logs
+                    if chat_log.session_id in by_session
+                ]
+            )
+            # bulk_create는 post_save를 보내지 않으므로 변경 이력을 직접 남긴다
+            changes = [
+                (logs[0].user_id, ChangeKind.SESSION, session_id, False)
+                for session_id, logs in by_session.items()
+            ]
+            changes += [
+                (chat_log.user_id, ChangeKind.MESSAGE, chat_log.id, False)
+                for chat_log in created
+            ]
+            ChangeLog.objects.record(changes)
+            return created
+
+    async def acreate_in_sequence(self, chat_logs):
+        return await sync_to_async(self.create_in_sequence)(chat_logs)
+
+
+class ChatLog(TombstoneModel):
+    change_kind = ChangeKind.MESSAGE
+
     user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
     session = models.ForeignKey(
         ChatSession, on_delete=models.CASCADE, related_name="chat_logs"
@@ -28,15 +215,43 @@ class ChatLog(models.Model):
     message = models.TextField()
     sender = models.CharField(max_length=10, choices=Sender.choices)
     is_important = models.BooleanField(default=False)
+    # 세션 안에서 빈 번호 없이 1씩 증가하는 순번 (ChatSession.last_seq로 할당)
+    seq = models.PositiveBigIntegerField()
+    # 저장 시 계산해 두는 추정 토큰 수 (ai/context.py가 프롬프트 예산 계산에 사용)
+    token_count = models.PositiveIntegerField(default=0)
     timestamp = models.DateTimeField()
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    objects = ChatLogQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=["session", "timestamp", "id"],
+                name="chatlog_session_ts_id_idx",
+            ),
+        ]
+        constraints = [
+            models.UniqueConstraint(
+                fields=["session", "seq"], name="chatlog_session_seq_uniq"
+            ),
+        ]
+
     def __str__(self):
         return f"Message by {self.sender} in session {self.session.id}"
 
 
-class VoiceLog(models.Model):
+class VoiceStatus(models.TextChoices):
+    PENDING = "pending", _("Pending")
+    PROCESSING = "processing", _("Processing")
+    DONE = "done", _("Done")
+    FAILED = "failed", _("Failed")
+
+
+class VoiceLog(TombstoneModel):
+    change_kind = ChangeKind.VOICE_LOG
+
     user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
     session = models.ForeignKey(
         ChatSession, on_delete=models.CASCADE, related_name="voice_logs"
@@ -44,9 +259,105 @@ class VoiceLog(models.Model):
     input_audio_url = models.URLField(max_length=1024)
     output_audio_url = models.URLField(max_length=1024, null=True, blank=True)
     transcribed_text = models.TextField(null=True, blank=True)
+    status = models.CharField(
+        max_length=10, choices=VoiceStatus.choices, default=VoiceStatus.PENDING
+    )
+    # 파이프라인이 이 작업을 가져간 횟수 (VOICE_PIPELINE MAX_ATTEMPTS)
+    attempts = models.PositiveSmallIntegerField(default=0)
     timestamp = models.DateTimeField()
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    objects = TombstoneQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            # 음성 처리 파이프라인이 대기 중인 작업을 순서대로 가져갈 때 사용
+            models.Index(fields=["status", "id"], name="voicelog_status_id_idx"),
+        ]
+
     def __str__(self):
         return f"Voice log for session {self.session.id}"
+
+
+class SyncStateQuerySet(models.QuerySet):
+    def allocate(self, user_id, count):
+        """
+        사용자의 변경 버전을 count개 할당하고 새 마지막 버전을 반환한다.
+
+        ChatSession.last_seq와 같은 방식으로 사용자 행을 잠그므로 버전 순서와
+        커밋 순서가 일치해, since 이후를 읽는 클라이언트가 변경을 놓치지 않는다.
+        """
+        states = self.filter(user_id=user_id)
+        version = update_returning(states, "version", version=F("version") + count)
+        if version is None:
+            self.get_or_create(user_id=user_id)
+            version = update_returning(states, "version", version=F("version") + count)
+        return version
+
+
+class SyncState(models.Model):
+    """사용자별 변경 버전 카운터 (마지막으로 할당한 ChangeLog.version)."""
+
+    user = models.OneToOneField(
+        settings.AUTH_USER_MODEL, on_delete=models.CASCADE, primary_key=True
+    )
+    version = models.PositiveBigIntegerField(default=0)
+
+    objects = SyncStateQuerySet.as_manager()
+
+
+class ChangeLogQuerySet(models.QuerySet):
+    def record(self, changes):
+        """
+        (user_id, kind, object_id, deleted) 목록을 사용자별 연속 버전으로 기록한다.
+        사용자 순서대로 카운터를 잠가 동시에 여러 사용자를 기록해도 교착되지 않는다.
+        """
+        by_user = {}
+        for user_id, kind, object_id, deleted in changes:
+            by_user.setdefault(user_id, []).append((kind, object_id, deleted))
+
+        entries = []
+        with transaction.atomic(using=self.db, savepoint=False):
+            for user_id in sorted(by_user):
+                pending = by_user[user_id]
+                version = SyncState.objects.allocate(user_id, len(pending))
+                start = version - len(pending) + 1
+                for version, (kind, object_id, deleted) in enumerate(pending, start):
+                    entries.append(
+                        ChangeLog(
+                            user_id=user_id,
+                            version=version,
+                            kind=kind,
+                            object_id=object_id,
+                            deleted=deleted,
+                        )
+                    )
+            return self.bulk_create(entries)
+
+
+class ChangeLog(models.Model):
+    """
+    세션/메시지/음성 기록의 생성·수정·삭제 이력. 모바일 클라이언트는
+    마지막으로 받은 version 이후만 받아간다(sync API). deleted=True는 tombstone.
+    """
+
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
+    version = models.PositiveBigIntegerField()
+    kind = models.CharField(max_length=10, choices=ChangeKind.choices)
+    object_id = models.PositiveBigIntegerField()
+    deleted = models.BooleanField(default=False)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    objects = ChangeLogQuerySet.as_manager()
+
+    class Meta:
+        constraints = [
+            # sync API의 (user, version > since) 조회가 이 인덱스를 탄다
+            models.UniqueConstraint(
+                fields=["user", "version"], name="changelog_user_version_uniq"
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.kind} {self.object_id} v{self.version}"
@@ -0,0 +1,218 @@
+import asyncio
+import json
+import time
+from collections import deque
+from weakref import WeakSet
+
+from django.conf import settings
+
+DEFAULTS = {
+    "MAX_SIZE": 64,  # 연결별 송신 큐에 쌓아 둘 수 있는 최대 프레임 수
+    "POLICY": "coalesce",  # coalesce | drop_oldest | disconnect
+    "CLOSE_CODE": 4408,  # disconnect 정책으로 연결을 끊을 때의 close code
+}
+
+POLICIES = ("coalesce", "drop_oldest", "disconnect")
+
+# 살아 있는 연결의 송신 큐 (lag 지표 조회용)
+_queues = WeakSet()
+
+
+def get_config():
+    config = {**DEFAULTS, **getattr(settings, "CHAT_OUTBOUND", {})}
+    if config["POLICY"] not in POLICIES:
+        raise ValueError(f"CHAT_OUTBOUND POLICY must be one of {POLICIES}.")
+    return config
+
+
+class OutboundQueue:
+    """
+    연결별 송신 큐. 프레임을 순서대로 하나의 태스크가 소켓으로 보낸다.
+
+    큐가 가득 차면 같은 스트림의 AI delta는 마지막 delta에 이어 붙이고
+    (coalesce), 그래도 자리가 없으면 policy에 따라 처리한다.
+
+    - coalesce: 쌓인 chat_message를 세션별 gap 프레임({from_seq, to_seq})
+      하나로 합친다. 클라이언트는 그 구간을 REST API로 다시 읽는다.
+      합칠 수 없는 프레임만 남으면 가장 오래된 프레임을 버린다.
+    - drop_oldest: 가장 오래된 프레임을 버린다.
+    - disconnect: 큐를 비우고 on_overflow(resume_hint)를 호출한다. 소비자는
+      마지막으로 보낸 세션별 seq를 알려주고 연결을 끊는다.
+
+    느린 클라이언트 하나 때문에 그룹 전체의 fan-out이나 메모리가 늘지 않는다.
+    """
+
+    def __init__(
+        self, send, maxsize=64, policy="coalesce", on_overflow=None, name=None
+    ):
+        self._send = send
+        self.name = name
+        self.maxsize = maxsize
+        self.policy = policy
+        self.on_overflow = on_overflow
+        self._frames = deque()  # (frame, enqueued_at)
+        self._ready = asyncio.Event()
+        self._idle = asyncio.Event()  # 보낼 프레임이 없으면 set
+        self._idle.set()
+        self._task = None
+        self._overflow_task = None
+        self.overflowed = False
+        self.last_sent_seq = {}  # session_id -> 마지막으로 보낸 seq
+        self.sent_frames = 0
+        self.coalesced_frames = 0
+        self.dropped_frames = 0
+        self.max_depth = 0
+        self.last_send_latency = 0.0
+        _queues.add(self)
+
+    @classmethod
+    def from_settings(cls, send, on_overflow=None, name=None):
+        config = get_config()
+        return cls(
+            send,
+            maxsize=config["MAX_SIZE"],
+            policy=config["POLICY"],
+            on_overflow=on_overflow,
+            name=name,
+        )
+
+    @property
+    def depth(self):
+        return len(self._frames)
+
+    @property
+    def lag(self):
+        """가장 오래 기다린 프레임의 대기 시간(초)."""
+        if not self._frames:
+            return 0.0
+        return time.monotonic() - self._frames[0][1]
+
+    def stats(self):
+        return {
+            "name": self.name,
+            "depth": self.depth,
+            "max_depth": self.max_depth,
+            "lag_ms": self.lag * 1000,
+            "last_send_latency_ms": self.last_send_latency * 1000,
+            "sent_frames": self.sent_frames,
+            "coalesced_frames": self.coalesced_frames,
+            "dropped_frames": self.dropped_frames,
+        }
+
+    def resume_hint(self):
+        return dict(self.last_sent_seq)
+
+    def put(self, frame):
+        if self.overflowed:
+            return
+        if len(self._frames) >= self.maxsize:
+            if self._coalesce(frame):
+                return
+            if self.policy == "disconnect":
+                self._overflow()
+                return
+            if self.policy == "coalesce":
+                self._collapse()
+            if len(self._frames) >= self.maxsize:
+                self._frames.popleft()
+                self.dropped_frames += 1
+        self._frames.append((frame, time.monotonic()))
+        self.max_depth = max(self.max_depth, len(self._frames))
+        self._idle.clear()
+        self._ready.set()
+        if self._task is None:
+            self._task = asyncio.create_task(self._drain())
+
+    def _coalesce(self, frame):
+        if frame.get("type") != "ai_delta":
+            return False
+        for queued, _ in reversed(self._frames):
+            if queued.get("type") == "ai_delta" and (
+                queued["stream_id"] == frame["stream_id"]
+            ):
+                queued["delta"] += frame["delta"]
+                self.coalesced_frames += 1
+                return True
+        return False
+
+    def _collapse(self):
+        """쌓인 chat_message(와 gap)를 세션별 gap 프레임 하나로 합친다."""
+        gaps = {}
+        frames = deque()
+        for frame, enqueued_at in self._frames:
+            if frame.get("type") == "chat_message" and frame.get("seq") is not None:
+                first = last = frame["seq"]
+            elif frame.get("type") == "gap":
+                first, last = frame["from_seq"], frame["to_seq"]
+            else:
+                frames.append((frame, enqueued_at))
+                continue
+
+            gap = gaps.get(frame["session_id"])
+            if gap is None:
+                gap = gaps[frame["session_id"]] = {
+                    "type": "gap",
+                    "session_id": frame["session_id"],
+                    "from_seq": first,
+                    "to_seq": last,
+                }
+                frames.append((gap, enqueued_at))
+            else:
+                gap["from_seq"] = min(gap["from_seq"], first)
+                gap["to_seq"] = max(gap["to_seq"], last)
+                self.coalesced_frames += 1
+        self._frames = frames
+
+    def _overflow(self):
+        self.overflowed = True
+        self.dropped_frames += len(self._frames) + 1  # 넘친 프레임 포함
+        self._frames.clear()
+        self._idle.set()
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        if self.on_overflow is not None:
+            self._overflow_task = asyncio.create_task(
+                self.on_overflow(self.resume_hint())
+            )
+
+    async def _drain(self):
+        while True:
+            await self._ready.wait()
+            while self._frames:
+                frame, _ = self._frames.popleft()
+                started = time.monotonic()
+                await self._send(text_data=json.dumps(frame))
+                self.last_send_latency = time.monotonic() - started
+                self.sent_frames += 1
+                if frame.get("type") == "chat_message" and frame.get("seq"):
+                    self.last_sent_seq[frame["session_id"]] = frame["seq"]
+                elif frame.get("type") == "gap":
+                    self.last_sent_seq[frame["session_id"]] = frame["to_seq"]
+            self._ready.clear()
+            self._idle.set()
+
+    async def join(self):
+        """쌓인 프레임을 모두 보낼 때까지 기다린다 (연결을 닫기 전에 쓴다)."""
+        await self._idle.wait()
+
+    async def close(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        self._frames.clear()
+        self._idle.set()
+        _queues.discard(self)
+
+
+def connection_stats():
+    """이 프로세스의 연결별 송신 큐 지표. lag가 큰 순서로 정렬."""
+    return sorted(
+        (queue.stats() for queue in list(_queues)),
+        key=lambda stats: stats["lag_ms"],
+        reverse=True,
+    )
@@ -0,0 +1,160 @@
+import base64
+import json
+from collections import OrderedDict
+
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+from rest_framework.exceptions import NotFound, ValidationError
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+
+
+def encode_cursor(timestamp, pk):
+    payload = json.dumps([timestamp.isoformat(), pk], separators=(",", ":"))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor):
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        raw_timestamp, pk = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        timestamp = parse_datetime(raw_timestamp)
+        if timestamp is None or not isinstance(pk, int):
+            raise ValueError
+    except (TypeError, ValueError):
+        raise NotFound("Invalid cursor")
+    return timestamp, pk
+
+
+class ChatLogCursorPagination(BasePagination):
+    """
+    (timestamp, id) 기준 keyset 페이지네이션.
+
+    - 파라미터가 없으면 가장 최근 메시지 `limit`개를 시간순으로 반환한다.
+    - `before=<cursor>`: 커서보다 이전 메시지 (과거 기록 불러오기)
+    - `after=<cursor>`: 커서보다 이후 메시지 (새 메시지 따라잡기)
+    - `from_seq=<n>[&to_seq=<m>]`: seq n..m 구간을 seq 순으로 최대 `limit`개.
+      커서는 반환하지 않으며, 결과의 마지막 seq로 다음 구간을 요청하고
+      seq가 연속인지로 누락을 확인한다. (session, seq) 유니크 인덱스를 탄다.
+
+    (session, timestamp, id) 복합 인덱스를 타므로 페이지 비용이
+    세션 길이와 무관하게 일정하다.
+    """
+
+    before_query_param = "before"
+    after_query_param = "after"
+    limit_query_param = "limit"
+    from_seq_query_param = "from_seq"
+    to_seq_query_param = "to_seq"
+    default_limit = 50
+    max_limit = 200
+
+    def get_limit(self, request):
+        raw = request.query_params.get(self.limit_query_param)
+        if raw is None:
+            return self.default_limit
+        try:
+            limit = int(raw)
+        except ValueError:
+            raise ValidationError({self.limit_query_param: "Must be an integer."})
+        if limit < 1:
+            raise ValidationError({self.limit_query_param: "Must be positive."})
+        return min(limit, self.max_limit)
+
+    def get_seq(self, request, name):
+        raw = request.query_params.get(name)
+        if raw is None:
+            return None
+        try:
+            seq = int(raw)
+        except ValueError:
+            raise ValidationError({name: "Must be an integer."})
+        if seq < 1:
+            raise ValidationError({name: "Must be positive."})
+        return seq
+
+    def paginate_seq_range(self, queryset, from_seq, to_seq):
+        queryset = queryset.filter(seq__gte=from_seq)
+        if to_seq is not None:
+            queryset = queryset.filter(seq__lte=to_seq)
+        self.has_older = self.has_newer = False
+        self.page = list(queryset.order_by("seq")[: self.limit])
+        return self.page
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.limit = self.get_limit(request)
+        before = request.query_params.get(self.before_query_param)
+        after = request.query_params.get(self.after_query_param)
+        if before and after:
+            raise ValidationError("Use either 'before' or 'after', not both.")
+
+        from_seq = self.get_seq(request, self.from_seq_query_param)
+        to_seq = self.get_seq(request, self.to_seq_query_param)
+        if to_seq is not None and from_seq is None:
+            raise ValidationError({self.from_seq_query_param: "Required with to_seq."})
+        if from_seq is not None:
+            if before or after:
+                raise ValidationError("Seq ranges cannot be combined with cursors.")
+            if to_seq is not None and to_seq < from_seq:
+                raise ValidationError(
+                    {self.to_seq_query_param: "Must not be less than from_seq."}
+                )
+            return self.paginate_seq_range(queryset, from_seq, to_seq)
+
+        if after:
+            timestamp, pk = decode_cursor(after)
+            queryset = queryset.filter(
+                Q(timestamp__gt=timestamp) | Q(timestamp=timestamp, id__gt=pk)
+            ).order_by("timestamp", "id")
+            rows = list(queryset[: self.limit + 1])
+            self.has_older = True
+            self.has_newer = len(rows) > self.limit
+            rows = rows[: self.limit]
+        else:
+            if before:
+                timestamp, pk = decode_cursor(before)
+                queryset = queryset.filter(
+                    Q(timestamp__lt=timestamp) | Q(timestamp=timestamp, id__lt=pk)
+                )
+            queryset = queryset.order_by("-timestamp", "-id")
+            rows = list(queryset[: self.limit + 1])
+            self.has_older = len(rows) > self.limit
+            self.has_newer = bool(before)
+            rows = rows[: self.limit][::-1]
+
+        self.page = rows
+        return rows
+
+    def get_previous_cursor(self):
+        if not self.page or not self.has_older:
+            return None
+        first = self.page[0]
+        return encode_cursor(first.timestamp, first.id)
+
+    def get_next_cursor(self):
+        if not self.page or not self.has_newer:
+            return None
+        last = self.page[-1]
+        return encode_cursor(last.timestamp, last.id)
+
+    def get_paginated_response(self, data):
+        return Response(
+            OrderedDict(
+                [
+                    ("previous", self.get_previous_cursor()),
+                    ("next", self.get_next_cursor()),
+                    ("results", data),
+                ]
+            )
+        )
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            "type": "object",
+            "required": ["results"],
+            "properties": {
+                "previous": {"type": "string", "nullable": True},
+                "next": {"type": "string", "nullable": True},
+                "results": schema,
+            },
+        }
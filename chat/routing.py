@@ -3,7 +3,12 @@ from django.urls import re_path
 from . import consumers
 
 websocket_urlpatterns = [
+    re_path(r"ws/chat/$", consumers.MultiplexChatConsumer.as_asgi()),
     re_path(
         r"ws/chat-sessions/(?P<session_id>\w+)/$", consumers.ChatConsumer.as_asgi()
     ),
+    re_path(
+        r"ws/voice-sessions/(?P<session_id>\w+)/$",
+        consumers.VoiceUploadConsumer.as_asgi(),
+    ),
 ]
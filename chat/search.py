@@ -0,0 +1,109 @@
+from django.db import connection
+
+# 운영(PostgreSQL): 생성 컬럼 tsvector + GIN 인덱스
+# 테스트(SQLite): chat_chatlog를 content로 쓰는 FTS5 가상 테이블 + 동기화 트리거
+# 한국어 형태소 사전이 없으므로 두 백엔드 모두 공백/구두점 기준 토큰화를 쓴다.
+POSTGRES_INSTALL = [
+    "ALTER TABLE chat_chatlog ADD COLUMN IF NOT EXISTS search_vector tsvector "
+    "GENERATED ALWAYS AS (to_tsvector('simple', coalesce(message, ''))) STORED",
+    "CREATE INDEX IF NOT EXISTS chatlog_search_vector_idx "
+    "ON chat_chatlog USING gin (search_vector)",
+]
+POSTGRES_UNINSTALL = [
+    "DROP INDEX IF EXISTS chatlog_search_vector_idx",
+    "ALTER TABLE chat_chatlog DROP COLUMN IF EXISTS search_vector",
+]
+
+SQLITE_INSTALL = [
+    "CREATE VIRTUAL TABLE IF NOT EXISTS chat_chatlog_fts USING fts5("
+    "message, content='chat_chatlog', content_rowid='id', tokenize='unicode61')",
+    "CREATE TRIGGER IF NOT EXISTS chat_chatlog_fts_ai AFTER INSERT ON chat_chatlog "
+    "BEGIN INSERT INTO chat_chatlog_fts(rowid, message) "
+    "VALUES (new.id, new.message); END",
+    "CREATE TRIGGER IF NOT EXISTS chat_chatlog_fts_ad AFTER DELETE ON chat_chatlog "
+    "BEGIN INSERT INTO chat_chatlog_fts(chat_chatlog_fts, rowid, message) "
+    "VALUES ('delete', old.id, old.message); END",
+    "CREATE TRIGGER IF NOT EXISTS chat_chatlog_fts_au "
+    "AFTER UPDATE OF message ON chat_chatlog "
+    "BEGIN INSERT INTO chat_chatlog_fts(chat_chatlog_fts, rowid, message) "
+    "VALUES ('delete', old.id, old.message); "
+    "INSERT INTO chat_chatlog_fts(rowid, message) VALUES (new.id, new.message); END",
+    # 테이블 재생성(마이그레이션) 이후에도 인덱스를 원본과 맞춘다
+    "INSERT INTO chat_chatlog_fts(chat_chatlog_fts) VALUES ('rebuild')",
+]
+SQLITE_UNINSTALL = [
+    "DROP TRIGGER IF EXISTS chat_chatlog_fts_ai",
+    "DROP TRIGGER IF EXISTS chat_chatlog_fts_ad",
+    "DROP TRIGGER IF EXISTS chat_chatlog_fts_au",
+    "DROP TABLE IF EXISTS chat_chatlog_fts",
+]
+
+POSTGRES_SEARCH = """
+    SELECT l.id, l.session_id, l.timestamp,
+           ts_headline('simple', l.message, q,
+                       'StartSel=<mark>, StopSel=</mark>, MaxWords=20, MinWords=5')
+               AS snippet,
+           ts_rank(l.search_vector, q) AS rank
+    FROM chat_chatlog l
+    JOIN chat_chatsession s ON s.id = l.session_id,
+         plainto_tsquery('simple', %s) q
+    WHERE l.search_vector @@ q AND s.user_id = %s
+    ORDER BY rank DESC, l.id DESC
+    LIMIT %s OFFSET %s
+"""
+
+SQLITE_SEARCH = """
+    SELECT l.id, l.session_id, l.timestamp,
+           snippet(chat_chatlog_fts, 0, '<mark>', '</mark>', '…', 16) AS snippet,
+           -bm25(chat_chatlog_fts) AS rank
+    FROM chat_chatlog_fts
+    JOIN chat_chatlog l ON l.id = chat_chatlog_fts.rowid
+    JOIN chat_chatsession s ON s.id = l.session_id
+    WHERE chat_chatlog_fts MATCH %s AND s.user_id = %s
+    ORDER BY rank DESC, l.id DESC
+    LIMIT %s OFFSET %s
+"""
+
+
+def install_search_index(schema_editor):
+    vendor = schema_editor.connection.vendor
+    statements = {"postgresql": POSTGRES_INSTALL, "sqlite": SQLITE_INSTALL}
+    for sql in statements.get(vendor, []):
+        schema_editor.execute(sql)
+
+
+def uninstall_search_index(schema_editor):
+    vendor = schema_editor.connection.vendor
+    statements = {"postgresql": POSTGRES_UNINSTALL, "sqlite": SQLITE_UNINSTALL}
+    for sql in statements.get(vendor, []):
+        schema_editor.execute(sql)
+
+
+def _fts5_query(query):
+    # 사용자 입력을 FTS5 문법으로 해석하지 않도록 각 단어를 구문으로 감싼다
+    return " ".join('"{}"'.format(term.replace('"', '""')) for term in query.split())
+
+
+def search_messages(user_id, query, limit, offset=0):
+    """요청한 사용자의 세션에 속한 메시지를 관련도 순으로 검색한다."""
+    if connection.vendor == "postgresql":
+        sql, match = POSTGRES_SEARCH, query
+    elif connection.vendor == "sqlite":
+        sql, match = SQLITE_SEARCH, _fts5_query(query)
+    else:
+        raise NotImplementedError(
+            f"Full-text search is not supported on {connection.vendor}."
+        )
+
+    with connection.cursor() as cursor:
+        cursor.execute(sql, [match, user_id, limit, offset])
+        columns = [column[0] for column in cursor.description]
+        rows = [dict(zip(columns, row)) for row in cursor.fetchall()]
+
+    if connection.vendor == "sqlite":
+        # SQLite는 DATETIME 컬럼을 문자열로 돌려준다
+        for row in rows:
+            row["timestamp"] = connection.ops.convert_datetimefield_value(
+                row["timestamp"], None, connection
+            )
+    return rows
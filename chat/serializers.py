@@ -6,8 +6,21 @@ from .models import ChatLog, ChatSession, VoiceLog
 class ChatSessionSerializer(serializers.ModelSerializer):
     class Meta:
         model = ChatSession
-        fields = ["id", "user", "title", "created_at"]
-        read_only_fields = ["user"]  # user는 요청 시 자동으로 설정
+        fields = [
+            "id",
+            "user",
+            "title",
+            "message_count",
+            "last_message_at",
+            "last_message_preview",
+            "created_at",
+        ]
+        read_only_fields = [
+            "user",  # user는 요청 시 자동으로 설정
+            "message_count",
+            "last_message_at",
+            "last_message_preview",
+        ]
 
 
 class ChatLogSerializer(serializers.ModelSerializer):
@@ -15,8 +28,8 @@ class ChatLogSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = ChatLog
-        fields = ["id", "session", "message", "sender", "timestamp"]
-        read_only_fields = ["user", "sender", "timestamp"]
+        fields = ["id", "session", "seq", "message", "sender", "timestamp"]
+        read_only_fields = ["user", "seq", "sender", "timestamp"]
 
     def validate_session(self, value):
         if value.user != self.context["request"].user:
@@ -26,6 +39,20 @@ class ChatLogSerializer(serializers.ModelSerializer):
         return value
 
 
+class ChatMessageSearchQuerySerializer(serializers.Serializer):
+    q = serializers.CharField(max_length=200)
+    limit = serializers.IntegerField(required=False, min_value=1)
+    offset = serializers.IntegerField(required=False, min_value=0)
+
+
+class ChatMessageSearchResultSerializer(serializers.Serializer):
+    id = serializers.IntegerField()
+    session_id = serializers.IntegerField()
+    timestamp = serializers.DateTimeField()
+    snippet = serializers.CharField()
+    rank = serializers.FloatField()
+
+
 class VoiceLogSerializer(serializers.ModelSerializer):
     session = serializers.PrimaryKeyRelatedField(queryset=ChatSession.objects.all())
 
@@ -37,9 +64,16 @@ class VoiceLogSerializer(serializers.ModelSerializer):
             "input_audio_url",
             "output_audio_url",
             "transcribed_text",
+            "status",
+            "timestamp",
+        ]
+        read_only_fields = [
+            "user",
+            "output_audio_url",
+            "transcribed_text",
+            "status",
             "timestamp",
         ]
-        read_only_fields = ["user", "output_audio_url", "transcribed_text", "timestamp"]
 
     def validate_session(self, value):
         if value.user != self.context["request"].user:
@@ -47,3 +81,8 @@ class VoiceLogSerializer(serializers.ModelSerializer):
                 "You do not have permission to post to this chat session."
             )
         return value
+
+
+class ChatSyncQuerySerializer(serializers.Serializer):
+    since = serializers.IntegerField(required=False, min_value=0, default=0)
+    limit = serializers.IntegerField(required=False, min_value=1)
@@ -0,0 +1,43 @@
+from django.contrib.auth import get_user_model
+from django.db.models import QuerySet
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .models import (
+    ChangeKind,
+    ChangeLog,
+    ChatLog,
+    ChatSession,
+    VoiceLog,
+    record_tombstones,
+)
+
+CHANGE_KINDS = {
+    ChatSession: ChangeKind.SESSION,
+    ChatLog: ChangeKind.MESSAGE,
+    VoiceLog: ChangeKind.VOICE_LOG,
+}
+
+
+@receiver(post_save, sender=ChatSession)
+@receiver(post_save, sender=ChatLog)
+@receiver(post_save, sender=VoiceLog)
+def record_save(sender, instance, raw=False, **kwargs):
+    if raw:  # loaddata
+        return
+    ChangeLog.objects.record(
+        [(instance.user_id, CHANGE_KINDS[sender], instance.pk, False)]
+    )
+
+
+# ChatLog/VoiceLog에는 post_delete 수신자를 두지 않는다: 수신자가 있으면 세션과
+# 사용자 삭제가 fast-delete 대신 모든 행을 읽는다. 메시지/음성 기록을 직접 지울 때의
+# tombstone은 TombstoneQuerySet/TombstoneModel이 남기고, 세션 삭제로 지워지는
+# 기록은 세션 tombstone 하나로 대신한다
+@receiver(post_delete, sender=ChatSession)
+def record_session_delete(sender, instance, origin=None, **kwargs):
+    origin_model = origin.model if isinstance(origin, QuerySet) else type(origin)
+    # 사용자 삭제로 인한 연쇄 삭제는 변경 이력도 함께 지워지므로 기록하지 않는다
+    if origin_model is get_user_model():
+        return
+    record_tombstones(ChangeKind.SESSION, [(instance.user_id, instance.pk)])
@@ -0,0 +1,59 @@
+import mmap
+import os
+import tempfile
+
+
+class SpoolFull(Exception):
+    pass
+
+
+class AudioSpool:
+    """
+    업로드 중인 오디오를 미리 할당한 memory-mapped 임시 파일에 이어 붙인다.
+
+    수신한 프레임은 mmap 영역에 한 번만 복사되며, Python bytes를 이어 붙여
+    버퍼를 계속 재할당하지 않는다. 공간이 부족하면 두 배씩 늘린다.
+    """
+
+    def __init__(self, directory, initial_size=1024 * 1024, max_size=25 * 1024 * 1024):
+        os.makedirs(directory, exist_ok=True)
+        self.max_size = max_size
+        self.size = 0
+        fd, self.path = tempfile.mkstemp(dir=directory, suffix=".part")
+        self._file = os.fdopen(fd, "r+b")
+        self._file.truncate(initial_size)
+        self._mmap = mmap.mmap(self._file.fileno(), initial_size)
+
+    @property
+    def capacity(self):
+        return len(self._mmap)
+
+    def write(self, data):
+        end = self.size + len(data)
+        if end > self.max_size:
+            raise SpoolFull(f"Audio upload exceeds {self.max_size} bytes.")
+        if end > self.capacity:
+            self._mmap.resize(min(max(self.capacity * 2, end), self.max_size))
+        self._mmap[self.size : end] = data
+        self.size = end
+
+    def flush(self):
+        self._mmap.flush()
+
+    def _close(self):
+        self._mmap.close()
+        self._file.close()
+
+    def finalize(self, path):
+        """실제 크기로 잘라내고 최종 경로로 옮긴다."""
+        self._mmap.flush()
+        self._close()
+        os.truncate(self.path, self.size)
+        os.replace(self.path, path)
+        self.path = path
+        return self.size
+
+    def discard(self):
+        self._close()
+        if os.path.exists(self.path):
+            os.remove(self.path)
@@ -0,0 +1,58 @@
+from .models import ChangeKind, ChangeLog, ChatLog, ChatSession, VoiceLog
+
+MODELS = {
+    ChangeKind.SESSION: ChatSession,
+    ChangeKind.MESSAGE: ChatLog,
+    ChangeKind.VOICE_LOG: VoiceLog,
+}
+
+ORDERING = {
+    ChangeKind.SESSION: ("id",),
+    ChangeKind.MESSAGE: ("session_id", "seq"),
+    ChangeKind.VOICE_LOG: ("id",),
+}
+
+
+def changes_since(user_id, since, limit):
+    """
+    since 이후 변경을 최대 limit개 읽어 종류별 최신 객체와 삭제된 id로 묶는다.
+
+    같은 객체가 여러 번 바뀌었으면 마지막 변경만 반영한다. 이미 최신인
+    클라이언트는 (user, version) 인덱스 조회 한 번으로 빈 결과를 받는다.
+    """
+    rows = list(
+        ChangeLog.objects.filter(user_id=user_id, version__gt=since)
+        .order_by("version")
+        .values_list("version", "kind", "object_id", "deleted")[: limit + 1]
+    )
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+
+    latest = {}
+    for _, kind, object_id, deleted in rows:
+        latest[kind, object_id] = deleted
+
+    changed = {kind: [] for kind in ChangeKind}
+    deleted = {kind: [] for kind in ChangeKind}
+    for (kind, object_id), is_deleted in latest.items():
+        (deleted if is_deleted else changed)[kind].append(object_id)
+
+    # 이 구간 이후에 삭제된 객체는 조회되지 않으며, tombstone은 다음 페이지에 온다
+    objects = {
+        kind: (
+            list(
+                MODELS[kind]
+                .objects.filter(user_id=user_id, id__in=ids)
+                .order_by(*ORDERING[kind])
+            )
+            if ids
+            else []
+        )
+        for kind, ids in changed.items()
+    }
+    return {
+        "version": rows[-1][0] if rows else since,
+        "has_more": has_more,
+        "objects": objects,
+        "deleted": {kind: sorted(ids) for kind, ids in deleted.items()},
+    }
@@ -1,15 +1,52 @@
 import asyncio
+import gzip
+import json
+import logging
+import re
+import time
+from datetime import timedelta
+from io import StringIO
 
 import pytest
+from asgiref.sync import sync_to_async
+from channels.layers import get_channel_layer
 from channels.testing import WebsocketCommunicator
+from django.core.management import CommandError, call_command
+from django.db import connection
+from django.test import AsyncClient, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
+from django.utils import timezone
 from rest_framework import status
 from rest_framework.test import APIClient
 
+from ai.models import ModelResult
+from ai.speech import stub_synthesize, stub_transcribe
 from config.asgi import application
 from users.models import User
 
-from .models import ChatLog, ChatSession, Sender
+from .buffer import MessageWriteBuffer, get_write_buffer
+from .consumers import ChatConsumer
+from .history import entries_since, get_history
+from .models import (
+    ChangeKind,
+    ChangeLog,
+    ChatLog,
+    ChatSession,
+    Sender,
+    VoiceLog,
+    VoiceStatus,
+)
+from .outbound import OutboundQueue
+from .throttling import InMemoryUserBuckets, TokenBucket
+from .throttling import stats as throttle_stats
+from .voice import VoicePipeline
+
+logger = logging.getLogger(__name__)
+
+
+def failing_transcribe_partial(path, size):
+    raise RuntimeError("transcriber down")
 
 
 @pytest.fixture
@@ -69,8 +106,445 @@ class TestChatAPI:
 
         response = client.get(f"{url}?session_id={session.id}")
         assert response.status_code == status.HTTP_200_OK
-        assert len(response.data) == 1
-        assert response.data[0]["message"] == "Hello, world!"
+        assert len(response.data["results"]) == 1
+        assert response.data["results"][0]["message"] == "Hello, world!"
+
+    def test_chat_message_cursor_pagination(self, authenticated_user):
+        """메시지 목록은 before/after 커서로 페이지 단위 조회된다."""
+        user, client = authenticated_user
+        session = ChatSession.objects.create(user=user, title="Long Session")
+        now = timezone.now()
+        ChatLog.objects.create_in_sequence(
+            [
+                ChatLog(
+                    user=user,
+                    session=session,
+                    sender=Sender.USER,
+                    message=f"message {i}",
+                    # 같은 timestamp끼리는 id로 순서가 정해진다
+                    timestamp=now + timedelta(seconds=i // 2),
+                )
+                for i in range(7)
+            ]
+        )
+        url = reverse("chat-messages-list-create")
+
+        response = client.get(f"{url}?session_id={session.id}&limit=3")
+        assert response.status_code == status.HTTP_200_OK
+        assert [m["message"] for m in response.data["results"]] == [
+            "message 4",
+            "message 5",
+            "message 6",
+        ]
+        assert response.data["next"] is None
+
+        previous = response.data["previous"]
+        response = client.get(
+            f"{url}?session_id={session.id}&limit=3&before={previous}"
+        )
+        assert [m["message"] for m in response.data["results"]] == [
+            "message 1",
+            "message 2",
+            "message 3",
+        ]
+
+        previous = response.data["previous"]
+        older = client.get(f"{url}?session_id={session.id}&limit=3&before={previous}")
+        assert [m["message"] for m in older.data["results"]] == ["message 0"]
+        assert older.data["previous"] is None
+
+        newer = client.get(
+            f"{url}?session_id={session.id}&limit=2&after={older.data['next']}"
+        )
+        assert [m["message"] for m in newer.data["results"]] == [
+            "message 1",
+            "message 2",
+        ]
+        assert newer.data["next"] is not None
+
+    def test_chat_message_seq_range(self, authenticated_user):
+        """메시지는 세션별로 1부터 연속된 seq를 받고, seq 구간으로 조회된다."""
+        user, client = authenticated_user
+        session = ChatSession.objects.create(user=user, title="Seq Session")
+        other = ChatSession.objects.create(user=user, title="Other Session")
+        url = reverse("chat-messages-list-create")
+
+        for i in range(5):
+            response = client.post(
+                url, {"session": session.id, "message": f"message {i}"}, format="json"
+            )
+            assert response.data["seq"] == i + 1
+        response = client.post(
+            url, {"session": other.id, "message": "other"}, format="json"
+        )
+        assert response.data["seq"] == 1
+        session.refresh_from_db()
+        assert session.last_seq == 5
+
+        response = client.get(
+            url, {"session_id": session.id, "from_seq": 2, "to_seq": 4}
+        )
+        assert response.status_code == status.HTTP_200_OK
+        assert [m["seq"] for m in response.data["results"]] == [2, 3, 4]
+        assert response.data["next"] is None
+
+        response = client.get(url, {"session_id": session.id, "from_seq": 4})
+        assert [m["message"] for m in response.data["results"]] == [
+            "message 3",
+            "message 4",
+        ]
+
+        response = client.get(
+            url, {"session_id": session.id, "from_seq": 2, "limit": 2}
+        )
+        assert [m["seq"] for m in response.data["results"]] == [2, 3]
+
+        response = client.get(
+            url, {"session_id": session.id, "from_seq": 4, "to_seq": 2}
+        )
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+        response = client.get(url, {"session_id": session.id, "to_seq": 2})
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+
+    def test_chat_message_invalid_cursor(self, authenticated_user):
+        """잘못된 커서는 404로 거부된다."""
+        user, client = authenticated_user
+        session = ChatSession.objects.create(user=user, title="Test Session")
+        url = reverse("chat-messages-list-create")
+
+        response = client.get(f"{url}?session_id={session.id}&after=not-a-cursor")
+        assert response.status_code == status.HTTP_404_NOT_FOUND
+
+    def test_chat_session_activity_summary(self, authenticated_user):
+        """메시지를 저장하면 세션 요약이 갱신되고 활동순 정렬에 반영된다."""
+        user, client = authenticated_user
+        older = ChatSession.objects.create(user=user, title="Older")
+        newer = ChatSession.objects.create(user=user, title="Newer")
+        message_url = reverse("chat-messages-list-create")
+        session_url = reverse("chat-sessions-list-create")
+
+        for text in ["first", "second"]:
+            client.post(
+                message_url, {"session": older.id, "message": text}, format="json"
+            )
+
+        older.refresh_from_db()
+        assert older.message_count == 2
+        assert older.last_message_preview == "second"
+        assert older.last_message_at is not None
+
+        response = client.get(session_url)
+        assert [s["title"] for s in response.data] == ["Newer", "Older"]
+
+        response = client.get(f"{session_url}?ordering=activity")
+        assert [s["title"] for s in response.data] == ["Older", "Newer"]
+        assert response.data[0]["message_count"] == 2
+        assert response.data[0]["last_message_preview"] == "second"
+        assert response.data[1]["last_message_at"] is None
+        assert newer.message_count == 0
+
+    def test_backfill_chat_activity_command(self, authenticated_user):
+        """backfill_chat_activity는 기존 ChatLog로 요약 정보를 재계산한다."""
+        user, _ = authenticated_user
+        session = ChatSession.objects.create(user=user, title="Legacy")
+        empty = ChatSession.objects.create(user=user, title="Empty")
+        now = timezone.now()
+        ChatLog.objects.bulk_create(
+            ChatLog(
+                user=user,
+                session=session,
+                sender=Sender.USER,
+                message="x" * 150 if i == 2 else f"message {i}",
+                seq=i + 1,
+                timestamp=now + timedelta(seconds=i),
+            )
+            for i in range(3)
+        )
+
+        call_command("backfill_chat_activity", batch_size=1, stdout=StringIO())
+
+        session.refresh_from_db()
+        empty.refresh_from_db()
+        assert session.message_count == 3
+        assert session.last_message_at == now + timedelta(seconds=2)
+        assert session.last_message_preview == "x" * 100
+        assert session.last_seq == 3
+        assert empty.message_count == 0
+        assert empty.last_message_at is None
+
+    def test_chat_message_search(self, authenticated_user):
+        """검색은 본인 세션의 메시지만 관련도 순으로 반환한다."""
+        user, client = authenticated_user
+        other = User.objects.create_user(email="other@example.com", password="pw")
+        session = ChatSession.objects.create(user=user, title="Mine")
+        others_session = ChatSession.objects.create(user=other, title="Theirs")
+        now = timezone.now()
+        for owner, chat_session, text in [
+            (user, session, "오늘 날씨 어때? weather is nice"),
+            (user, session, "weather weather forecast"),
+            (user, session, "nothing to see here"),
+            (other, others_session, "secret weather report"),
+        ]:
+            ChatLog.objects.create_in_sequence(
+                [
+                    ChatLog(
+                        user=owner,
+                        session=chat_session,
+                        sender=Sender.USER,
+                        message=text,
+                        timestamp=now,
+                    )
+                ]
+            )
+        url = reverse("chat-messages-search")
+
+        response = client.get(url, {"q": "weather"})
+        assert response.status_code == status.HTTP_200_OK
+        results = response.data["results"]
+        assert [r["snippet"] for r in results] == [
+            "<mark>weather</mark> <mark>weather</mark> forecast",
+            "오늘 날씨 어때? <mark>weather</mark> is nice",
+        ]
+        assert {r["session_id"] for r in results} == {session.id}
+        assert response.data["next_offset"] is None
+
+        response = client.get(url, {"q": "weather", "limit": 1})
+        assert len(response.data["results"]) == 1
+        assert response.data["next_offset"] == 1
+
+        response = client.get(url, {"q": '날씨 "OR'})
+        assert response.status_code == status.HTTP_200_OK
+        assert response.data["results"] == []
+
+        response = client.get(url)
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+
+    def test_cannot_export_others_transcript(self, authenticated_user):
+        """다른 사람의 세션 기록은 내려받을 수 없다."""
+        _, client = authenticated_user
+        other = User.objects.create_user(email="other@example.com", password="pw")
+        session = ChatSession.objects.create(user=other, title="Theirs")
+
+        response = client.get(reverse("chat-sessions-transcript", args=[session.id]))
+        assert response.status_code == status.HTTP_403_FORBIDDEN
+
+        response = client.get(reverse("chat-sessions-transcript", args=[0]))
+        assert response.status_code == status.HTTP_404_NOT_FOUND
+
+    def test_chat_sync_returns_changes_since_version(
+        self, authenticated_user, django_assert_num_queries
+    ):
+        """sync는 since 이후 바뀐 객체와 삭제 tombstone만 반환한다."""
+        user, client = authenticated_user
+        other = User.objects.create_user(email="other@example.com", password="pw")
+        ChatSession.objects.create(user=other, title="Theirs")
+        url = reverse("chat-sync")
+
+        session = ChatSession.objects.create(user=user, title="Sync")
+        for text in ["one", "two"]:
+            client.post(
+                reverse("chat-messages-list-create"),
+                {"session": session.id, "message": text},
+                format="json",
+            )
+        response = client.get(url)
+        assert response.status_code == status.HTTP_200_OK
+        assert [s["id"] for s in response.data["sessions"]] == [session.id]
+        assert response.data["sessions"][0]["message_count"] == 2
+        assert [m["message"] for m in response.data["messages"]] == ["one", "two"]
+        assert response.data["has_more"] is False
+        version = response.data["version"]
+
+        # 이미 최신이면 변경 이력 조회 한 번으로 빈 결과
+        with django_assert_num_queries(1):
+            response = client.get(url, {"since": version})
+        assert response.data["version"] == version
+        assert response.data["sessions"] == response.data["messages"] == []
+
+        first = ChatLog.objects.get(message="one")
+        first.is_important = True
+        first.save()
+        ChatLog.objects.get(message="two").delete()
+        voice_log = VoiceLog.objects.create(
+            user=user,
+            session=session,
+            input_audio_url="https://example.com/a.wav",
+            timestamp=timezone.now(),
+        )
+        response = client.get(url, {"since": version})
+        assert [m["id"] for m in response.data["messages"]] == [first.id]
+        assert [v["id"] for v in response.data["voice_logs"]] == [voice_log.id]
+        assert response.data["sessions"] == []
+        assert len(response.data["deleted"]["messages"]) == 1
+
+        # 한 객체가 여러 번 바뀌어도 한 번만, 페이지 단위로 이어 받는다
+        version = response.data["version"]
+        first.save()
+        first.save()
+        session_id = session.id
+        session.delete()
+        response = client.get(url, {"since": version, "limit": 2})
+        assert response.data["messages"] == []
+        assert response.data["has_more"] is True
+        response = client.get(url, {"since": response.data["version"]})
+        assert response.data["deleted"]["sessions"] == [session_id]
+        assert response.data["deleted"]["messages"] == []
+        assert response.data["has_more"] is False
+
+    def test_deletes_record_tombstones_without_loading_rows(self, authenticated_user):
+        """세션 삭제는 메시지를 읽지 않고, 직접 지운 메시지는 tombstone을 남긴다."""
+        user, _ = authenticated_user
+        session = ChatSession.objects.create(user=user, title="Delete")
+        for seq, text in enumerate(["one", "two", "three"], start=1):
+            ChatLog.objects.create(
+                user=user,
+                session=session,
+                sender=Sender.USER,
+                message=text,
+                seq=seq,
+                timestamp=timezone.now(),
+            )
+        VoiceLog.objects.create(
+            user=user,
+            session=session,
+            input_audio_url="https://example.com/a.wav",
+            timestamp=timezone.now(),
+        )
+
+        ids = list(
+            ChatLog.objects.filter(message__in=["one", "two"]).values_list(
+                "id", flat=True
+            )
+        )
+        ChatLog.objects.filter(id__in=ids).delete()
+        tombstones = ChangeLog.objects.filter(deleted=True).order_by("version")
+        assert [(c.kind, c.object_id) for c in tombstones] == [
+            (ChangeKind.MESSAGE, ids[0]),
+            (ChangeKind.MESSAGE, ids[1]),
+        ]
+
+        session_id = session.id
+        with CaptureQueriesContext(connection) as queries:
+            session.delete()
+        # 메시지/음성 기록은 fast-delete: 행을 읽지 않고 세션 id로 지운다
+        selects = [
+            query["sql"]
+            for query in queries
+            if query["sql"].startswith("SELECT")
+            and ("chat_chatlog" in query["sql"] or "chat_voicelog" in query["sql"])
+        ]
+        assert selects == []
+        assert not ChatLog.objects.exists()
+        assert not VoiceLog.objects.exists()
+        # 세션 tombstone 하나로 대신한다
+        tombstones = ChangeLog.objects.filter(deleted=True).order_by("-version")
+        assert (tombstones[0].kind, tombstones[0].object_id) == (
+            ChangeKind.SESSION,
+            session_id,
+        )
+        assert tombstones.count() == 3
+
+    def test_chat_connection_stats_is_admin_only(self, authenticated_user):
+        """연결별 송신 큐 지표는 운영자만 볼 수 있다."""
+        user, client = authenticated_user
+        url = reverse("chat-connections-stats")
+
+        assert client.get(url).status_code == status.HTTP_403_FORBIDDEN
+        user.is_staff = True
+        user.save()
+        response = client.get(url)
+        assert response.status_code == status.HTTP_200_OK
+        assert isinstance(response.data["connections"], list)
+
+    def test_voice_log_processed_by_pipeline(self, authenticated_user):
+        """음성 로그는 pending으로 저장된 뒤 파이프라인이 결과를 채운다."""
+        user, client = authenticated_user
+        session = ChatSession.objects.create(user=user, title="Voice")
+        url = reverse("voice-logs-list-create")
+
+        for name in ["hello", "bye", "broken"]:
+            response = client.post(
+                url,
+                {
+                    "session": session.id,
+                    "input_audio_url": f"https://example.com/{name}.wav",
+                },
+                format="json",
+            )
+            assert response.status_code == status.HTTP_201_CREATED
+            assert response.data["status"] == VoiceStatus.PENDING
+            assert response.data["transcribed_text"] is None
+
+        def transcribe(audio_url):
+            if "broken" in audio_url:
+                raise ValueError("unreadable audio")
+            return stub_transcribe(audio_url)
+
+        pipeline = VoicePipeline(transcribe, stub_synthesize, workers=2, batch_size=2)
+        assert pipeline.queue_depth() == 3
+        assert pipeline.run_once() == 2
+        assert pipeline.run_once() == 1
+        assert pipeline.run_once() == 0
+        pipeline.shutdown()
+
+        logs = {
+            log.input_audio_url.rsplit("/", 1)[1]: log for log in VoiceLog.objects.all()
+        }
+        assert logs["hello.wav"].status == VoiceStatus.DONE
+        assert logs["hello.wav"].transcribed_text == "[transcript] hello"
+        assert logs["hello.wav"].output_audio_url.startswith("https://tts.invalid/")
+        assert logs["broken.wav"].status == VoiceStatus.FAILED
+
+        stats = pipeline.stats()
+        assert stats["queue_depth"] == 0
+        assert stats["processed"] == 2
+        assert stats["failed"] == 1
+
+    def test_process_voice_logs_command(self, authenticated_user):
+        """process_voice_logs --once는 대기 중인 작업을 모두 처리한다."""
+        user, _ = authenticated_user
+        session = ChatSession.objects.create(user=user, title="Voice")
+        VoiceLog.objects.create(
+            user=user,
+            session=session,
+            input_audio_url="https://example.com/a.wav",
+            timestamp=timezone.now(),
+        )
+
+        out = StringIO()
+        call_command("process_voice_logs", once=True, stdout=out)
+        assert "Processed 1 voice logs." in out.getvalue()
+        assert VoiceLog.objects.get().status == VoiceStatus.DONE
+
+    def test_voice_pipeline_gives_up_after_max_attempts(self, authenticated_user):
+        """processing으로 멈춘 작업은 MAX_ATTEMPTS번까지만 다시 가져간다."""
+        user, _ = authenticated_user
+        session = ChatSession.objects.create(user=user, title="Voice")
+        voice_log = VoiceLog.objects.create(
+            user=user,
+            session=session,
+            input_audio_url="https://example.com/crash.wav",
+            timestamp=timezone.now(),
+        )
+        pipeline = VoicePipeline(
+            stub_transcribe, stub_synthesize, stale_after=0, max_attempts=2
+        )
+        # 처리 도중 워커가 죽은 것처럼 가져가기만 한다
+        assert [log.id for log in pipeline.claim()] == [voice_log.id]
+        assert [log.id for log in pipeline.claim()] == [voice_log.id]
+        assert pipeline.claim() == []
+        pipeline.shutdown()
+
+        voice_log.refresh_from_db()
+        assert voice_log.status == VoiceStatus.FAILED
+        assert voice_log.attempts == 2
+        assert pipeline.stats()["failed"] == 1
+
+    @override_settings(VOICE_PIPELINE={"TRANSCRIBER": None, "SYNTHESIZER": None})
+    def test_process_voice_logs_requires_backends(self):
+        """STT/TTS 백엔드가 설정되지 않으면 실행하지 않는다."""
+        with pytest.raises(CommandError):
+            call_command("process_voice_logs", once=True, stdout=StringIO())
 
     def test_cannot_access_others_session(self, authenticated_user):
         """사용자는 다른 사람의 세션에 접근할 수 없다."""
@@ -95,6 +569,63 @@ class TestChatAPI:
         assert response.status_code == status.HTTP_403_FORBIDDEN
 
 
+@pytest.mark.django_db(transaction=True)
+class TestChatTranscriptExport:
+    def test_chat_transcript_export(self, monkeypatch):
+        """대화 기록은 ChatLog와 VoiceLog를 시간순으로 병합한 NDJSON으로 내려받는다."""
+        # 줄마다 내보내 응답이 한 번에 모이지 않고 나뉘어 나가는지 확인한다
+        monkeypatch.setattr("chat.export.FLUSH_BYTES", 1)
+        asyncio.run(self._test_chat_transcript_export())
+
+    async def _test_chat_transcript_export(self):
+        user = await User.objects.acreate(email="test@example.com", password="pw")
+        session = await ChatSession.objects.acreate(user=user, title="Transcript")
+        now = timezone.now()
+        for i, text in enumerate(["hi", "how are you"]):
+            await ChatLog.objects.acreate(
+                user=user,
+                session=session,
+                sender=Sender.USER,
+                message=text,
+                seq=i + 1,
+                timestamp=now + timedelta(seconds=i * 2),
+            )
+        await VoiceLog.objects.acreate(
+            user=user,
+            session=session,
+            input_audio_url="https://example.com/a.wav",
+            timestamp=now + timedelta(seconds=1),
+        )
+        client = AsyncClient()
+        await client.aforce_login(user)
+        url = reverse("chat-sessions-transcript", args=[session.id])
+
+        response = await client.get(url)
+        assert response.status_code == status.HTTP_200_OK
+        # ASGI에서 sync iterator는 전부 읽은 뒤에 보내지므로 async여야 한다
+        assert response.is_async
+        assert response["Content-Type"] == "application/x-ndjson"
+        chunks = [chunk async for chunk in response.streaming_content]
+        assert len(chunks) == 3
+        lines = b"".join(chunks).decode().splitlines()
+        events = [json.loads(line) for line in lines]
+        assert [event["type"] for event in events] == ["chat", "voice", "chat"]
+        assert events[0]["message"] == "hi"
+        assert events[1]["input_audio_url"] == "https://example.com/a.wav"
+
+        response = await client.get(url, headers={"Accept-Encoding": "gzip, br"})
+        assert response["Content-Encoding"] == "gzip"
+        body = gzip.decompress(
+            b"".join([chunk async for chunk in response.streaming_content])
+        )
+        assert body.decode().splitlines() == lines
+
+        response = await client.get(url, headers={"Accept-Encoding": "gzip;q=0, *"})
+        assert not response.has_header("Content-Encoding")
+        body = b"".join([chunk async for chunk in response.streaming_content])
+        assert body.decode().splitlines() == lines
+
+
 @pytest.mark.django_db(transaction=True)
 class TestChatConsumer:
     def test_authenticated_user_can_connect(self):
@@ -177,4 +708,960 @@ class TestChatConsumer:
         ).aexists()
         assert log_exists
 
+        await session.arefresh_from_db()
+        assert session.message_count == 1
+        assert session.last_message_preview == "hello"
+
+        await communicator.disconnect()
+
+    @override_settings(
+        CHAT_WRITE_BUFFER={"ENABLED": True, "MAX_SIZE": 2, "FLUSH_INTERVAL": 60}
+    )
+    def test_write_behind_buffer_flushes_in_order(self):
+        asyncio.run(self._test_write_behind_buffer_flushes_in_order())
+
+    async def _test_write_behind_buffer_flushes_in_order(self):
+        user = await User.objects.acreate(email="test@example.com", password="password")
+        session = await ChatSession.objects.acreate(user=user, title="Test Session")
+
+        communicator = WebsocketCommunicator(
+            application, f"/ws/chat-sessions/{session.id}/"
+        )
+        communicator.scope["user"] = user
+        await communicator.connect()
+
+        # MAX_SIZE에 도달하기 전에는 버퍼에만 쌓이고, 방송도 저장 이후에 한다
+        await communicator.send_json_to({"message": "first"})
+        assert await communicator.receive_nothing()
+        assert not await ChatLog.objects.filter(session=session).aexists()
+        assert get_write_buffer().depth == 1
+
+        await communicator.send_json_to({"message": "second"})
+        frames = [await communicator.receive_json_from() for _ in range(2)]
+        assert [frame["message"] for frame in frames] == ["first", "second"]
+        assert [frame["seq"] for frame in frames] == [1, 2]
+        assert all(frame["id"] for frame in frames)
+        await communicator.send_json_to({"message": "third"})
+        assert await communicator.receive_nothing()
+        assert await ChatLog.objects.filter(session=session).acount() == 2
+
+        # 연결 종료 시 남은 메시지도 저장된다
+        await communicator.disconnect()
+        messages = [
+            log.message
+            async for log in ChatLog.objects.filter(session=session).order_by("id")
+        ]
+        assert messages == ["first", "second", "third"]
+        seqs = [
+            seq
+            async for seq in ChatLog.objects.filter(session=session)
+            .order_by("id")
+            .values_list("seq", flat=True)
+        ]
+        assert seqs == [1, 2, 3]
+
+        await session.arefresh_from_db()
+        assert session.message_count == 3
+        assert session.last_message_preview == "third"
+
+        stats = get_write_buffer().stats()
+        assert stats["depth"] == 0
+        assert stats["flushed_messages"] == 3
+        assert stats["flush_count"] == 2
+
+    @override_settings(
+        CHAT_WRITE_BUFFER={"ENABLED": True, "MAX_SIZE": 100, "FLUSH_INTERVAL": 60}
+    )
+    def test_write_behind_failure_is_isolated_per_session(self):
+        asyncio.run(self._test_write_behind_failure_is_isolated_per_session())
+
+    async def _test_write_behind_failure_is_isolated_per_session(self):
+        user = await User.objects.acreate(email="test@example.com", password="password")
+        kept = await ChatSession.objects.acreate(user=user, title="Kept")
+        deleted = await ChatSession.objects.acreate(user=user, title="Deleted")
+        write_buffer = get_write_buffer()
+        broadcast = []
+
+        async def on_saved(chat_log):
+            broadcast.append((chat_log.message, chat_log.seq))
+
+        for session, text in [(kept, "a"), (deleted, "b"), (kept, "c")]:
+            await write_buffer.add(
+                ChatLog(
+                    session_id=session.id,
+                    user=user,
+                    sender=Sender.USER,
+                    message=text,
+                    timestamp=timezone.now(),
+                ),
+                on_saved=on_saved,
+            )
+        # 버퍼에 있는 동안 세션이 삭제되어도 다른 세션의 메시지는 저장된다
+        await deleted.adelete()
+        await write_buffer.flush()
+
+        assert broadcast == [("a", 1), ("c", 2)]
+        messages = [
+            log.message
+            async for log in ChatLog.objects.filter(session=kept).order_by("seq")
+        ]
+        assert messages == ["a", "c"]
+        stats = write_buffer.stats()
+        assert stats["flushed_messages"] == 2
+        assert stats["failed_messages"] == 1
+
+    def test_write_behind_flush_sync_saves_without_broadcast(self):
+        user = User.objects.create(email="test@example.com", password="password")
+        session = ChatSession.objects.create(user=user, title="Test Session")
+        write_buffer = MessageWriteBuffer(flush_interval=60)
+        broadcast = []
+
+        async def on_saved(chat_log):
+            broadcast.append(chat_log.seq)
+
+        async def add(text):
+            chat_log = ChatLog(
+                session_id=session.id,
+                user=user,
+                sender=Sender.USER,
+                message=text,
+                timestamp=timezone.now(),
+            )
+            await write_buffer.add(chat_log, on_saved=on_saved)
+
+        for text in ["a", "b"]:
+            asyncio.run(add(text))
+        write_buffer.flush_sync()
+
+        # 저장만 하고 방송과 링 버퍼 적재는 하지 않는다
+        assert list(
+            ChatLog.objects.filter(session=session)
+            .order_by("seq")
+            .values_list("message", "seq")
+        ) == [("a", 1), ("b", 2)]
+        assert broadcast == []
+        history = get_history(get_channel_layer())
+        assert asyncio.run(history.read(session.id)) == []
+
+        # 이후 메시지가 링 버퍼에 들어가도 빠진 구간은 DB 재전송으로 넘어간다
+        async def add_and_flush():
+            await add("c")
+            await write_buffer.flush()
+            return entries_since(await history.read(session.id), 0)
+
+        assert asyncio.run(add_and_flush()) is None
+        assert broadcast == [3]
+
+    def test_receive_queries_per_message(self):
+        asyncio.run(self._test_receive_queries_per_message())
+
+    async def _test_receive_queries_per_message(self):
+        user = await User.objects.acreate(email="test@example.com", password="password")
+        session = await ChatSession.objects.acreate(user=user, title="Test Session")
+
+        communicator = WebsocketCommunicator(
+            application, f"/ws/chat-sessions/{session.id}/"
+        )
+        communicator.scope["user"] = user
+        await communicator.connect()
+
+        queries = []
+
+        def record(execute, sql, params, many, context):
+            queries.append(sql)
+            return execute(sql, params, many, context)
+
+        # ORM 쿼리는 thread-sensitive 스레드에서 실행되므로 그 스레드의 커넥션에 설치
+        await sync_to_async(lambda: connection.execute_wrappers.append(record))()
+        frames = []
+        try:
+            for i in range(5):
+                await communicator.send_json_to({"message": f"message {i}"})
+                frames.append(await communicator.receive_json_from())
+        finally:
+            await sync_to_async(lambda: connection.execute_wrappers.remove(record))()
+
+        # 메시지당 네 문장: seq 할당(UPDATE ... RETURNING), 메시지 INSERT,
+        # 변경 버전 할당(UPDATE ... RETURNING), 변경 이력 INSERT. 세션 재조회 없음
+        queries = [sql for sql in queries if sql != "BEGIN"]
+        statements = [
+            (sql.split()[0], re.search(r'"(\w+)"', sql)[1]) for sql in queries
+        ]
+        assert (
+            statements
+            == [
+                ("UPDATE", "chat_chatsession"),
+                ("INSERT", "chat_chatlog"),
+                ("UPDATE", "chat_syncstate"),
+                ("INSERT", "chat_changelog"),
+            ]
+            * 5
+        )
+        assert all("RETURNING" in sql for sql in queries if sql.startswith("UPDATE"))
+        # 연결별 순번
+        assert [frame["sequence"] for frame in frames] == [1, 2, 3, 4, 5]
+        assert [frame["seq"] for frame in frames] == [1, 2, 3, 4, 5]
+        await communicator.disconnect()
+
+    def test_reconnect_replays_missed_messages_from_ring_buffer(self):
+        asyncio.run(self._test_reconnect_replays_missed_messages_from_ring_buffer())
+
+    async def _test_reconnect_replays_missed_messages_from_ring_buffer(self):
+        user = await User.objects.acreate(email="test@example.com", password="password")
+        session = await ChatSession.objects.acreate(user=user, title="Test Session")
+        path = f"/ws/chat-sessions/{session.id}/"
+
+        sender = WebsocketCommunicator(application, path)
+        sender.scope["user"] = user
+        await sender.connect()
+        seqs = []
+        for text in ["one", "two", "three"]:
+            await sender.send_json_to({"message": text})
+            seqs.append((await sender.receive_json_from())["seq"])
+        await sender.disconnect()
+
+        queries = []
+
+        def record(execute, sql, params, many, context):
+            queries.append(sql)
+            return execute(sql, params, many, context)
+
+        communicator = WebsocketCommunicator(application, f"{path}?since={seqs[0]}")
+        communicator.scope["user"] = user
+        await sync_to_async(lambda: connection.execute_wrappers.append(record))()
+        try:
+            await communicator.connect()
+            replayed = [await communicator.receive_json_from() for _ in range(3)]
+        finally:
+            await sync_to_async(lambda: connection.execute_wrappers.remove(record))()
+
+        assert [frame.get("message") for frame in replayed[:2]] == ["two", "three"]
+        # 재전송도 송신 큐를 거쳐 연결별 순번을 받는다
+        assert [frame["sequence"] for frame in replayed[:2]] == [1, 2]
+        assert replayed[2] == {
+            "type": "replay_complete",
+            "session_id": session.id,
+            "truncated": False,
+        }
+        # 세션 소유자 확인 외에는 DB를 읽지 않는다
+        assert len(queries) == 1
+        await communicator.disconnect()
+
+    @override_settings(CHAT_HISTORY={"RING_SIZE": 2, "DB_REPLAY_LIMIT": 3})
+    def test_reconnect_falls_back_to_database(self):
+        asyncio.run(self._test_reconnect_falls_back_to_database())
+
+    async def _test_reconnect_falls_back_to_database(self):
+        user = await User.objects.acreate(email="test@example.com", password="password")
+        session = await ChatSession.objects.acreate(user=user, title="Test Session")
+        path = f"/ws/chat-sessions/{session.id}/"
+
+        sender = WebsocketCommunicator(application, path)
+        sender.scope["user"] = user
+        await sender.connect()
+        seqs = []
+        for i in range(6):
+            await sender.send_json_to({"message": f"message {i}"})
+            seqs.append((await sender.receive_json_from())["seq"])
+        await sender.disconnect()
+
+        # since가 링 버퍼(최근 2개)에 없으므로 DB에서 최대 3개를 재전송
+        communicator = WebsocketCommunicator(application, f"{path}?since={seqs[0]}")
+        communicator.scope["user"] = user
+        await communicator.connect()
+        replayed = [await communicator.receive_json_from() for _ in range(4)]
+        assert [frame.get("seq") for frame in replayed[:3]] == seqs[1:4]
+        assert replayed[3] == {
+            "type": "replay_complete",
+            "session_id": session.id,
+            "truncated": True,
+        }
+        await communicator.disconnect()
+
+    def test_reconnect_falls_back_to_database_on_ring_gap(self):
+        asyncio.run(self._test_reconnect_falls_back_to_database_on_ring_gap())
+
+    async def _test_reconnect_falls_back_to_database_on_ring_gap(self):
+        user = await User.objects.acreate(email="test@example.com", password="password")
+        session = await ChatSession.objects.acreate(user=user, title="Test Session")
+        path = f"/ws/chat-sessions/{session.id}/"
+
+        sender = WebsocketCommunicator(application, path)
+        sender.scope["user"] = user
+        await sender.connect()
+        for text in ["one", "two", "three"]:
+            await sender.send_json_to({"message": text})
+            await sender.receive_json_from()
+        await sender.disconnect()
+
+        # 다른 경로의 적재가 늦어 링 버퍼에 빈 seq가 있고 순서도 뒤바뀐 상태
+        history = get_history(get_channel_layer())
+        entries = await history.read(session.id)
+        history._rings[session.id].clear()
+        await history.extend(session.id, [entries[2], entries[0]])
+        assert entries_since(await history.read(session.id), 0) is None
+        await history.extend(session.id, [entries[1]])
+        replay = entries_since(await history.read(session.id), 0)
+        assert [entry["seq"] for entry in replay] == [1, 2, 3]
+        history._rings[session.id].remove(entries[1])
+
+        communicator = WebsocketCommunicator(application, f"{path}?since=0")
+        communicator.scope["user"] = user
+        await communicator.connect()
+        replayed = [await communicator.receive_json_from() for _ in range(4)]
+        messages = [frame.get("message") for frame in replayed[:3]]
+        assert messages == ["one", "two", "three"]
+        assert replayed[3]["type"] == "replay_complete"
+        await communicator.disconnect()
+
+    def test_message_to_deleted_session_closes_cleanly(self):
+        asyncio.run(self._test_message_to_deleted_session_closes_cleanly())
+
+    async def _test_message_to_deleted_session_closes_cleanly(self):
+        user = await User.objects.acreate(email="test@example.com", password="password")
+        session = await ChatSession.objects.acreate(user=user, title="Deleted")
+        session_id = session.id
+        kept = await ChatSession.objects.acreate(user=user, title="Kept")
+
+        communicator = WebsocketCommunicator(
+            application, f"/ws/chat-sessions/{session.id}/"
+        )
+        communicator.scope["user"] = user
+        await communicator.connect()
+        multiplexed = WebsocketCommunicator(application, "/ws/chat/")
+        multiplexed.scope["user"] = user
+        await multiplexed.connect()
+        await multiplexed.send_json_to(
+            {"type": "subscribe", "session_ids": [session.id, kept.id]}
+        )
+        await multiplexed.receive_json_from()
+
+        # 연결 중에 세션이 삭제되면 오류 프레임을 보내고 닫는다
+        await session.adelete()
+        await communicator.send_json_to({"message": "hello"})
+        assert await communicator.receive_json_from() == {
+            "type": "error",
+            "session_id": session_id,
+            "detail": "Chat session no longer exists.",
+        }
+        output = await communicator.receive_output()
+        assert output == {"type": "websocket.close", "code": 404}
+        await communicator.wait()
+
+        # 다중 구독 연결은 그 세션의 구독만 끊는다
+        await multiplexed.send_json_to(
+            {"type": "message", "session_id": session_id, "message": "hello"}
+        )
+        assert (await multiplexed.receive_json_from())["type"] == "error"
+        await multiplexed.send_json_to(
+            {"type": "message", "session_id": session_id, "message": "again"}
+        )
+        frame = await multiplexed.receive_json_from()
+        assert frame["detail"] == "Not subscribed to this session."
+        await multiplexed.send_json_to(
+            {"type": "message", "session_id": kept.id, "message": "still here"}
+        )
+        assert (await multiplexed.receive_json_from())["message"] == "still here"
+        await multiplexed.disconnect()
+        assert not await ChatLog.objects.filter(session_id=session_id).aexists()
+
+    def test_multiplexed_connection_subscribes_to_many_sessions(self):
+        asyncio.run(self._test_multiplexed_connection_subscribes_to_many_sessions())
+
+    async def _test_multiplexed_connection_subscribes_to_many_sessions(self):
+        user = await User.objects.acreate(email="test@example.com", password="password")
+        other = await User.objects.acreate(email="other@example.com", password="pw")
+        first = await ChatSession.objects.acreate(user=user, title="First")
+        second = await ChatSession.objects.acreate(user=user, title="Second")
+        others = await ChatSession.objects.acreate(user=other, title="Theirs")
+
+        communicator = WebsocketCommunicator(application, "/ws/chat/")
+        communicator.scope["user"] = user
+        connected, _ = await communicator.connect()
+        assert connected
+
+        queries = []
+
+        def record(execute, sql, params, many, context):
+            queries.append(sql)
+            return execute(sql, params, many, context)
+
+        await sync_to_async(lambda: connection.execute_wrappers.append(record))()
+        try:
+            await communicator.send_json_to(
+                {
+                    "type": "subscribe",
+                    "session_ids": [first.id, second.id, others.id, 999999],
+                }
+            )
+            response = await communicator.receive_json_from()
+        finally:
+            await sync_to_async(lambda: connection.execute_wrappers.remove(record))()
+        # 세션 수와 관계없이 소유권 확인은 쿼리 한 번
+        assert len(queries) == 1
+        assert response == {
+            "type": "subscribed",
+            "session_ids": [first.id, second.id],
+            "rejected": [others.id, 999999],
+        }
+
+        await communicator.send_json_to(
+            {"type": "message", "session_id": second.id, "message": "hi"}
+        )
+        frame = await communicator.receive_json_from()
+        assert (frame["session_id"], frame["message"]) == (second.id, "hi")
+
+        # 다른 연결에서 보낸 메시지도 세션 id가 붙어 전달된다
+        single = WebsocketCommunicator(application, f"/ws/chat-sessions/{first.id}/")
+        single.scope["user"] = user
+        await single.connect()
+        await single.send_json_to({"message": "from single"})
+        await single.receive_json_from()
+        frame = await communicator.receive_json_from()
+        assert (frame["session_id"], frame["message"]) == (first.id, "from single")
+
+        await communicator.send_json_to(
+            {"type": "unsubscribe", "session_ids": [first.id]}
+        )
+        assert await communicator.receive_json_from() == {
+            "type": "unsubscribed",
+            "session_ids": [first.id],
+        }
+        await single.send_json_to({"message": "after unsubscribe"})
+        await single.receive_json_from()
+        assert await communicator.receive_nothing()
+
+        await communicator.send_json_to(
+            {"type": "message", "session_id": first.id, "message": "nope"}
+        )
+        frame = await communicator.receive_json_from()
+        assert frame["type"] == "error"
+        assert frame["session_id"] == first.id
+
+        # 재구독하면서 놓친 메시지를 since로 받는다
+        await communicator.send_json_to(
+            {"type": "subscribe", "session_ids": [first.id], "since": {first.id: 1}}
+        )
+        assert (await communicator.receive_json_from())["session_ids"] == [first.id]
+        frame = await communicator.receive_json_from()
+        assert (frame["session_id"], frame["message"]) == (
+            first.id,
+            "after unsubscribe",
+        )
+        assert (await communicator.receive_json_from())["type"] == "replay_complete"
+
+        await single.disconnect()
         await communicator.disconnect()
+
+    def test_multiplexed_connection_requires_authentication(self):
+        asyncio.run(self._test_multiplexed_connection_requires_authentication())
+
+    async def _test_multiplexed_connection_requires_authentication(self):
+        from django.contrib.auth.models import AnonymousUser
+
+        communicator = WebsocketCommunicator(application, "/ws/chat/")
+        communicator.scope["user"] = AnonymousUser()
+        connected, code = await communicator.connect()
+        assert not connected
+        assert code == 401
+
+    @override_settings(AI_REPLY_GENERATOR="ai.generation.stub_generator")
+    def test_ai_reply_is_streamed_and_saved_once(self):
+        asyncio.run(self._test_ai_reply_is_streamed_and_saved_once())
+
+    async def _test_ai_reply_is_streamed_and_saved_once(self):
+        user = await User.objects.acreate(email="test@example.com", password="password")
+        session = await ChatSession.objects.acreate(user=user, title="Test Session")
+
+        communicator = WebsocketCommunicator(
+            application, f"/ws/chat-sessions/{session.id}/"
+        )
+        communicator.scope["user"] = user
+        await communicator.connect()
+
+        started = time.perf_counter()
+        await communicator.send_json_to({"message": "tell me a story"})
+
+        # 사용자 메시지 방송과 AI delta는 섞여서 도착할 수 있다
+        deltas = []
+        first_token_latency = None
+        while True:
+            frame = await communicator.receive_json_from()
+            if frame.get("type") == "ai_delta":
+                if first_token_latency is None:
+                    first_token_latency = time.perf_counter() - started
+                deltas.append(frame["delta"])
+            elif frame["sender"] == "ai":
+                break
+        elapsed = time.perf_counter() - started
+        logger.info(
+            "AI stream: first token %.2fms, %.0f tokens/s",
+            first_token_latency * 1000,
+            len(deltas) / elapsed,
+        )
+
+        assert frame["sender"] == "ai"
+        assert frame["message"] == "".join(deltas) == "You said: tell me a story"
+        assert len(deltas) == 6
+        # 청크마다가 아니라 완성된 응답 한 건만 저장된다
+        ai_logs = ChatLog.objects.filter(session=session, sender=Sender.AI)
+        assert await ai_logs.acount() == 1
+        await communicator.disconnect()
+
+    @override_settings(
+        AI_REPLY_GENERATOR="ai.generation.stub_generator",
+        AI_RESULT_CACHE={"ENABLED": True},
+    )
+    def test_cached_ai_reply_is_sent_at_once(self):
+        asyncio.run(self._test_cached_ai_reply_is_sent_at_once())
+
+    async def _test_cached_ai_reply_is_sent_at_once(self):
+        user = await User.objects.acreate(email="test@example.com", password="password")
+        session = await ChatSession.objects.acreate(user=user, title="Test Session")
+
+        communicator = WebsocketCommunicator(
+            application, f"/ws/chat-sessions/{session.id}/"
+        )
+        communicator.scope["user"] = user
+        await communicator.connect()
+
+        delta_counts = []
+        for text in ["hello there", "hello  there"]:
+            await communicator.send_json_to({"message": text})
+            deltas = []
+            while True:
+                frame = await communicator.receive_json_from()
+                if frame.get("type") == "ai_delta":
+                    deltas.append(frame["delta"])
+                elif frame["sender"] == "ai":
+                    break
+            assert frame["message"] == "".join(deltas) == "You said: hello there"
+            delta_counts.append(len(deltas))
+
+        # 두 번째는 모델을 다시 호출하지 않고 캐시된 응답을 한 번에 보낸다
+        assert delta_counts == [4, 1]
+        assert await ModelResult.objects.acount() == 1
+        await communicator.disconnect()
+
+    def test_outbound_queue_coalesces_deltas_for_slow_client(self):
+        asyncio.run(self._test_outbound_queue_coalesces_deltas_for_slow_client())
+
+    async def _test_outbound_queue_coalesces_deltas_for_slow_client(self):
+        sent = []
+        release = asyncio.Event()
+
+        async def slow_send(text_data):
+            await release.wait()
+            sent.append(json.loads(text_data))
+
+        queue = OutboundQueue(slow_send, maxsize=4)
+        for i in range(100):
+            queue.put({"type": "ai_delta", "stream_id": "s", "delta": f"{i} "})
+            assert queue.depth <= 4
+        await asyncio.sleep(0)
+
+        release.set()
+        while queue.depth:
+            await asyncio.sleep(0)
+        await queue.close()
+
+        assert "".join(frame["delta"] for frame in sent) == "".join(
+            f"{i} " for i in range(100)
+        )
+        assert len(sent) <= 5
+        assert queue.coalesced_frames >= 95
+
+    def test_outbound_queue_coalesce_and_drop_policies(self):
+        asyncio.run(self._test_outbound_queue_coalesce_and_drop_policies())
+
+    async def _test_outbound_queue_coalesce_and_drop_policies(self):
+        release = asyncio.Event()
+        coalesced, dropped = [], []
+
+        def slow_sender(sent):
+            async def send(text_data):
+                await release.wait()
+                sent.append(json.loads(text_data))
+
+            return send
+
+        # coalesce: 밀린 chat_message는 세션별 gap 프레임으로 합쳐진다
+        queue = OutboundQueue(slow_sender(coalesced), maxsize=4, policy="coalesce")
+        queue.put({"type": "rate_limited", "retry_after": 1})
+        for seq in range(1, 51):
+            for session_id in (1, 2):
+                queue.put(
+                    {"type": "chat_message", "session_id": session_id, "seq": seq}
+                )
+                assert queue.depth <= 4
+
+        # drop_oldest: 최신 프레임 maxsize개만 남는다
+        drop_queue = OutboundQueue(
+            slow_sender(dropped), maxsize=4, policy="drop_oldest"
+        )
+        for seq in range(1, 11):
+            drop_queue.put({"type": "chat_message", "session_id": 1, "seq": seq})
+        assert drop_queue.dropped_frames == 6
+        await asyncio.sleep(0.01)
+        assert queue.stats()["lag_ms"] >= 10
+
+        release.set()
+        while queue.depth or drop_queue.depth:
+            await asyncio.sleep(0)
+        await queue.close()
+        await drop_queue.close()
+
+        assert coalesced[0]["type"] == "rate_limited"
+        assert len(coalesced) <= 5
+        gaps = {f["session_id"]: f for f in coalesced if f["type"] == "gap"}
+        assert gaps[1]["from_seq"] == gaps[2]["from_seq"] == 1
+        last_seen = {
+            f["session_id"]: f.get("to_seq", f.get("seq")) for f in coalesced[1:]
+        }
+        assert last_seen == {1: 50, 2: 50}
+        assert [frame["seq"] for frame in dropped] == [7, 8, 9, 10]
+
+    def test_outbound_queue_disconnect_policy_gives_resume_hint(self):
+        asyncio.run(self._test_outbound_queue_disconnect_policy_gives_resume_hint())
+
+    async def _test_outbound_queue_disconnect_policy_gives_resume_hint(self):
+        sent, hints = [], []
+        stalled = asyncio.Event()
+
+        async def stalling_send(text_data):
+            frame = json.loads(text_data)
+            if frame["seq"] > 2:
+                await stalled.wait()
+            sent.append(frame)
+
+        async def on_overflow(resume_hint):
+            hints.append(resume_hint)
+
+        queue = OutboundQueue(
+            stalling_send, maxsize=2, policy="disconnect", on_overflow=on_overflow
+        )
+        for seq in (1, 2):
+            queue.put({"type": "chat_message", "session_id": 7, "seq": seq})
+        while len(sent) < 2:
+            await asyncio.sleep(0)
+
+        # seq 3에서 소켓이 멈춘 뒤 큐가 넘치면 보낸 seq까지를 힌트로 넘기고 끊는다
+        for seq in range(3, 7):
+            queue.put({"type": "chat_message", "session_id": 7, "seq": seq})
+            await asyncio.sleep(0)
+        assert queue.overflowed
+        assert hints == [{7: 2}]
+        queue.put({"type": "chat_message", "session_id": 7, "seq": 7})
+        assert queue.depth == 0
+        assert queue.stats()["dropped_frames"] == 3
+        await queue.close()
+
+    @override_settings(CHAT_OUTBOUND={"CLOSE_CODE": 4408})
+    def test_outbound_overflow_only_closes(self):
+        asyncio.run(self._test_outbound_overflow_only_closes())
+
+    async def _test_outbound_overflow_only_closes(self):
+        calls = []
+        consumer = ChatConsumer()
+
+        async def send(text_data):
+            calls.append(("send", json.loads(text_data)))
+
+        async def close(code=None):
+            calls.append(("close", code))
+
+        async def disconnect(close_code):
+            calls.append(("disconnect", close_code))
+
+        consumer.send, consumer.close, consumer.disconnect = send, close, disconnect
+        await consumer.outbound_overflow({7: 2})
+        # 정리는 서버가 보내는 websocket.disconnect에서 한 번만 한다
+        assert calls == [
+            ("send", {"type": "resume", "since": {"7": 2}}),
+            ("close", 4408),
+        ]
+
+    def test_voice_upload_streams_into_spool_and_creates_voice_log(self, tmp_path):
+        with override_settings(
+            VOICE_UPLOAD={
+                "DIR": str(tmp_path),
+                "URL": "https://cdn.example.com/voice/",
+                "INITIAL_SIZE": 1024,
+                "PARTIAL_TRANSCRIBER": "ai.speech.stub_transcribe_partial",
+                "PARTIAL_INTERVAL": 2048,
+            }
+        ):
+            asyncio.run(self._test_voice_upload(tmp_path))
+
+    async def _test_voice_upload(self, tmp_path):
+        user = await User.objects.acreate(email="test@example.com", password="password")
+        session = await ChatSession.objects.acreate(user=user, title="Test Session")
+
+        communicator = WebsocketCommunicator(
+            application, f"/ws/voice-sessions/{session.id}/?format=webm"
+        )
+        communicator.scope["user"] = user
+        connected, _ = await communicator.connect()
+        assert connected
+
+        # 초기 할당(1KB)보다 큰 업로드로 mmap 확장을 확인
+        chunks = [bytes([i]) * 700 for i in range(6)]
+        for chunk in chunks:
+            await communicator.send_to(bytes_data=chunk)
+
+        partial = await communicator.receive_json_from()
+        assert partial["type"] == "partial_transcript"
+        assert partial["bytes"] >= 2048
+
+        await communicator.send_json_to({"type": "end"})
+        done = await communicator.receive_json_from()
+        while done["type"] == "partial_transcript":
+            done = await communicator.receive_json_from()
+        assert done["type"] == "upload_complete"
+        assert done["bytes"] == 4200
+
+        voice_log = await VoiceLog.objects.aget(id=done["voice_log_id"])
+        assert voice_log.status == VoiceStatus.PENDING
+        assert voice_log.input_audio_url.startswith("https://cdn.example.com/voice/")
+        assert voice_log.input_audio_url.endswith(".webm")
+        filename = voice_log.input_audio_url.rsplit("/", 1)[1]
+        assert (tmp_path / filename).read_bytes() == b"".join(chunks)
+        assert not list(tmp_path.glob("*.part"))
+        await communicator.wait()
+
+    def test_voice_upload_logs_failed_partial_transcription(self, tmp_path, caplog):
+        with override_settings(
+            VOICE_UPLOAD={
+                "DIR": str(tmp_path),
+                "URL": "https://cdn.example.com/voice/",
+                "INITIAL_SIZE": 1024,
+                "PARTIAL_TRANSCRIBER": "chat.tests.failing_transcribe_partial",
+                "PARTIAL_INTERVAL": 1024,
+            }
+        ):
+            asyncio.run(self._test_voice_upload_logs_failed_partial_transcription())
+        assert "Partial transcription failed" in caplog.text
+
+    async def _test_voice_upload_logs_failed_partial_transcription(self):
+        user = await User.objects.acreate(email="test@example.com", password="password")
+        session = await ChatSession.objects.acreate(user=user, title="Test Session")
+
+        communicator = WebsocketCommunicator(
+            application, f"/ws/voice-sessions/{session.id}/"
+        )
+        communicator.scope["user"] = user
+        await communicator.connect()
+        for i in range(4):
+            await communicator.send_to(bytes_data=bytes([i]) * 700)
+
+        # 부분 인식이 실패해도 업로드는 끝까지 처리된다
+        await communicator.send_json_to({"type": "end"})
+        done = await communicator.receive_json_from()
+        assert (done["type"], done["bytes"]) == ("upload_complete", 2800)
+        await communicator.wait()
+
+    def test_voice_upload_rejects_oversized_audio(self, tmp_path):
+        with override_settings(
+            VOICE_UPLOAD={
+                "DIR": str(tmp_path),
+                "URL": "https://cdn.example.com/voice/",
+                "INITIAL_SIZE": 512,
+                "MAX_SIZE": 1000,
+            }
+        ):
+            asyncio.run(self._test_voice_upload_rejects_oversized_audio(tmp_path))
+
+    async def _test_voice_upload_rejects_oversized_audio(self, tmp_path):
+        user = await User.objects.acreate(email="test@example.com", password="password")
+        session = await ChatSession.objects.acreate(user=user, title="Test Session")
+
+        communicator = WebsocketCommunicator(
+            application, f"/ws/voice-sessions/{session.id}/"
+        )
+        communicator.scope["user"] = user
+        await communicator.connect()
+
+        await communicator.send_to(bytes_data=b"\0" * 600)
+        await communicator.send_to(bytes_data=b"\0" * 600)
+        output = await communicator.receive_output()
+        assert output == {"type": "websocket.close", "code": 1009}
+        await communicator.wait()
+
+        # 임시 파일은 남지 않고 VoiceLog도 만들어지지 않는다
+        assert not list(tmp_path.iterdir())
+        assert not await VoiceLog.objects.aexists()
+
+    def test_voice_upload_closes_on_malformed_frame(self, tmp_path):
+        with override_settings(
+            VOICE_UPLOAD={"DIR": str(tmp_path), "URL": "https://cdn.example.com/v/"}
+        ):
+            asyncio.run(self._test_voice_upload_closes_on_malformed_frame(tmp_path))
+
+    async def _test_voice_upload_closes_on_malformed_frame(self, tmp_path):
+        user = await User.objects.acreate(email="test@example.com", password="password")
+        session = await ChatSession.objects.acreate(user=user, title="Test Session")
+
+        for text in ["not json", "[1, 2]"]:
+            communicator = WebsocketCommunicator(
+                application, f"/ws/voice-sessions/{session.id}/"
+            )
+            communicator.scope["user"] = user
+            await communicator.connect()
+            await communicator.send_to(bytes_data=b"\0" * 100)
+            await communicator.send_to(text_data=text)
+            assert await communicator.receive_json_from() == {
+                "type": "error",
+                "detail": "Malformed frame.",
+            }
+            output = await communicator.receive_output()
+            assert output == {"type": "websocket.close", "code": 1007}
+            await communicator.wait()
+
+        # 임시 파일은 남지 않는다
+        assert not list(tmp_path.iterdir())
+
+    @override_settings(VOICE_UPLOAD={"DIR": "/tmp", "URL": "/media/voice/"})
+    def test_voice_upload_requires_absolute_url(self):
+        asyncio.run(self._test_voice_upload_requires_absolute_url())
+
+    async def _test_voice_upload_requires_absolute_url(self):
+        user = await User.objects.acreate(email="test@example.com", password="password")
+        session = await ChatSession.objects.acreate(user=user, title="Test Session")
+
+        communicator = WebsocketCommunicator(
+            application, f"/ws/voice-sessions/{session.id}/"
+        )
+        communicator.scope["user"] = user
+        connected, close_code = await communicator.connect()
+        assert not connected
+        assert close_code == 1011
+
+    @override_settings(CHAT_RATE_LIMIT={"RATE": 0.001, "BURST": 2, "POLICY": "drop"})
+    def test_rate_limit_drops_excess_frames(self):
+        asyncio.run(self._test_rate_limit_drops_excess_frames())
+
+    async def _test_rate_limit_drops_excess_frames(self):
+        user = await User.objects.acreate(email="test@example.com", password="password")
+        session = await ChatSession.objects.acreate(user=user, title="Test Session")
+
+        communicator = WebsocketCommunicator(
+            application, f"/ws/chat-sessions/{session.id}/"
+        )
+        communicator.scope["user"] = user
+        await communicator.connect()
+        rejected_before = throttle_stats["rejected"]
+
+        for i in range(4):
+            await communicator.send_json_to({"message": f"message {i}"})
+        frames = [await communicator.receive_json_from() for _ in range(4)]
+
+        assert [f["message"] for f in frames if "message" in f] == [
+            "message 0",
+            "message 1",
+        ]
+        assert [f["type"] for f in frames if "type" in f] == ["rate_limited"] * 2
+        assert await ChatLog.objects.filter(session=session).acount() == 2
+        assert throttle_stats["rejected"] - rejected_before == 2
+        await communicator.disconnect()
+
+    @override_settings(
+        CHAT_RATE_LIMIT={
+            "RATE": 100,
+            "BURST": 100,
+            "USER_RATE": 0.001,
+            "USER_BURST": 2,
+            "POLICY": "close",
+        }
+    )
+    def test_per_user_rate_limit_closes_connection(self):
+        asyncio.run(self._test_per_user_rate_limit_closes_connection())
+
+    async def _test_per_user_rate_limit_closes_connection(self):
+        user = await User.objects.acreate(email="test@example.com", password="password")
+        session = await ChatSession.objects.acreate(user=user, title="Test Session")
+        path = f"/ws/chat-sessions/{session.id}/"
+
+        # 같은 사용자의 두 연결이 사용자 버킷을 공유한다
+        first = WebsocketCommunicator(application, path)
+        first.scope["user"] = user
+        await first.connect()
+        second = WebsocketCommunicator(application, path)
+        second.scope["user"] = user
+        await second.connect()
+
+        await first.send_json_to({"message": "one"})
+        await first.receive_json_from()
+        await second.receive_json_from()
+        await second.send_json_to({"message": "two"})
+        await first.receive_json_from()
+        await second.receive_json_from()
+
+        await second.send_json_to({"message": "three"})
+        assert await second.receive_output() == {
+            "type": "websocket.close",
+            "code": 4429,
+        }
+        assert await ChatLog.objects.filter(session=session).acount() == 2
+        await first.disconnect()
+
+    @override_settings(CHAT_RATE_LIMIT={"RATE": 50, "BURST": 1, "POLICY": "delay"})
+    def test_rate_limit_delay_policy_paces_frames(self):
+        asyncio.run(self._test_rate_limit_delay_policy_paces_frames())
+
+    async def _test_rate_limit_delay_policy_paces_frames(self):
+        user = await User.objects.acreate(email="test@example.com", password="password")
+        session = await ChatSession.objects.acreate(user=user, title="Test Session")
+
+        communicator = WebsocketCommunicator(
+            application, f"/ws/chat-sessions/{session.id}/"
+        )
+        communicator.scope["user"] = user
+        await communicator.connect()
+
+        started = time.perf_counter()
+        for i in range(4):
+            await communicator.send_json_to({"message": f"message {i}"})
+        frames = [await communicator.receive_json_from() for _ in range(4)]
+        # 버스트 1개 이후 초당 50개 속도로 지연 처리된다
+        assert time.perf_counter() - started >= 3 / 50
+        assert [f["message"] for f in frames] == [f"message {i}" for i in range(4)]
+        await communicator.disconnect()
+
+
+class TestTokenBucket:
+    def test_rejected_frames_do_not_accumulate_debt(self):
+        now = [0.0]
+        bucket = TokenBucket(rate=10, burst=1, clock=lambda: now[0])
+        assert bucket.consume(max_wait=2.0) == 0.0
+        # MAX_DELAY 안에서 기다릴 수 있는 만큼만 미리 차감한다
+        for _ in range(20):
+            bucket.consume(max_wait=2.0)
+        assert bucket.tokens == pytest.approx(-20)
+        for _ in range(1000):
+            assert bucket.consume(max_wait=2.0) > 2.0
+        assert bucket.tokens == pytest.approx(-20)
+
+        now[0] = 2.1
+        assert bucket.consume(max_wait=0.0) == 0.0
+
+    def test_refund(self):
+        bucket = TokenBucket(rate=1, burst=2, clock=lambda: 0.0)
+        bucket.consume()
+        bucket.refund()
+        bucket.refund()
+        assert bucket.tokens == 2
+
+    def test_user_buckets_evict_full_buckets(self):
+        now = [0.0]
+        buckets = InMemoryUserBuckets(rate=1, burst=2, clock=lambda: now[0])
+        asyncio.run(buckets.consume(1))
+        asyncio.run(buckets.consume(2))
+        assert len(buckets._buckets) == 2
+
+        now[0] = 1.9
+        asyncio.run(buckets.consume(2))
+        asyncio.run(buckets.consume(2))
+        now[0] = 2.0
+        asyncio.run(buckets.consume(3))
+        # 1번 사용자 버킷은 가득 차서 버리고, 2번은 아직 차는 중이라 남긴다
+        assert set(buckets._buckets) == {2, 3}
@@ -0,0 +1,166 @@
+import time
+from collections import Counter
+from weakref import WeakKeyDictionary
+
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+
+try:
+    from channels_redis.core import RedisChannelLayer
+except ImportError:  # pragma: no cover - channels_redis는 운영 환경에만 필요
+    RedisChannelLayer = None
+
+DEFAULTS = {
+    "RATE": 10.0,  # 연결당 초당 프레임 수
+    "BURST": 20,
+    "USER_RATE": None,  # 사용자당 (모든 연결 합산), None이면 사용 안 함
+    "USER_BURST": None,
+    "POLICY": "drop",  # drop | delay | close
+    "MAX_DELAY": 2.0,  # seconds, delay 정책에서 이보다 오래 기다려야 하면 drop
+    "CLOSE_CODE": 4429,
+}
+
+POLICIES = ("drop", "delay", "close")
+
+# 튜닝용 카운터: rejected(drop/close로 거부된 프레임), delayed, closed
+stats = Counter()
+
+
+def get_config():
+    config = {**DEFAULTS, **getattr(settings, "CHAT_RATE_LIMIT", {})}
+    if config["POLICY"] not in POLICIES:
+        raise ValueError(f"CHAT_RATE_LIMIT POLICY must be one of {POLICIES}.")
+    return config
+
+
+class TokenBucket:
+    def __init__(self, rate, burst, clock=time.monotonic):
+        self.rate = rate
+        self.burst = burst
+        self.clock = clock
+        self.tokens = burst
+        self.updated = clock()
+
+    def refill(self):
+        now = self.clock()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        return self.tokens
+
+    def consume(self, cost=1, max_wait=0.0):
+        """
+        토큰을 꺼내고 기다려야 하는 시간(초)을 반환한다. 0이면 바로 허용.
+        기다릴 시간이 max_wait 이하면 부족해도 미리 차감해 대기 순서를 보장하고,
+        max_wait보다 길면 차감하지 않는다(거부된 프레임이 빚을 쌓지 않도록).
+        """
+        self.refill()
+        wait = max(cost - self.tokens, 0) / self.rate
+        if wait <= max_wait:
+            self.tokens -= cost
+        return wait
+
+    def refund(self, cost=1):
+        self.tokens = min(self.burst, self.tokens + cost)
+
+
+class InMemoryUserBuckets:
+    """InMemoryChannelLayer용: 같은 프로세스의 연결끼리 사용자 버킷을 공유."""
+
+    def __init__(self, rate, burst, clock=time.monotonic):
+        self.rate = rate
+        self.burst = burst
+        self.clock = clock
+        self._buckets = {}
+        self._swept = clock()
+
+    async def consume(self, user_id, cost=1, max_wait=0.0):
+        self._evict_full()
+        bucket = self._buckets.get(user_id)
+        if bucket is None:
+            bucket = self._buckets[user_id] = TokenBucket(
+                self.rate, self.burst, self.clock
+            )
+        return bucket.consume(cost, max_wait)
+
+    def _evict_full(self):
+        # 가득 찬 버킷은 새로 만든 것과 같으므로 버린다 (가득 차는 시간마다 한 번)
+        if self.clock() - self._swept < self.burst / self.rate:
+            return
+        self._swept = self.clock()
+        for user_id, bucket in list(self._buckets.items()):
+            if bucket.refill() >= self.burst:
+                del self._buckets[user_id]
+
+
+class RedisUserBuckets:
+    """RedisChannelLayer용: 모든 워커가 채널 레이어의 Redis에서 버킷을 공유."""
+
+    SCRIPT = """
+    local rate, burst = tonumber(ARGV[1]), tonumber(ARGV[2])
+    local now, cost = tonumber(ARGV[3]), tonumber(ARGV[4])
+    local state = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+    local tokens = tonumber(state[1]) or burst
+    local ts = tonumber(state[2]) or now
+    tokens = math.min(burst, tokens + math.max(0, now - ts) * rate)
+    local wait = 0
+    if tokens >= cost then
+        tokens = tokens - cost
+    else
+        wait = (cost - tokens) / rate
+        if wait <= tonumber(ARGV[5]) then tokens = tokens - cost end
+    end
+    redis.call('HSET', KEYS[1], 'tokens', tokens, 'ts', now)
+    redis.call('EXPIRE', KEYS[1], math.ceil(burst / rate) + 60)
+    return tostring(wait)
+    """
+
+    def __init__(self, channel_layer, rate, burst):
+        self.channel_layer = channel_layer
+        self.rate = rate
+        self.burst = burst
+
+    async def consume(self, user_id, cost=1, max_wait=0.0):
+        key = f"{self.channel_layer.prefix}:ratelimit:user:{user_id}"
+        connection = self.channel_layer.connection(
+            self.channel_layer.consistent_hash(key)
+        )
+        wait = await connection.eval(
+            self.SCRIPT,
+            1,
+            key,
+            self.rate,
+            self.burst,
+            time.time(),
+            cost,
+            max_wait,
+        )
+        return float(wait)
+
+
+_user_buckets = WeakKeyDictionary()
+
+
+def get_user_buckets(channel_layer):
+    """USER_RATE가 설정되어 있으면 채널 레이어 백엔드에 맞는 사용자 버킷을 반환."""
+    config = get_config()
+    if not config["USER_RATE"]:
+        return None
+    buckets = _user_buckets.get(channel_layer)
+    if buckets is None:
+        rate = config["USER_RATE"]
+        burst = config["USER_BURST"] or rate
+        if RedisChannelLayer is not None and isinstance(
+            channel_layer, RedisChannelLayer
+        ):
+            buckets = RedisUserBuckets(channel_layer, rate, burst)
+        else:
+            buckets = InMemoryUserBuckets(rate, burst)
+        _user_buckets[channel_layer] = buckets
+    return buckets
+
+
+@receiver(setting_changed)
+def reset_user_buckets(*, setting, **kwargs):
+    if setting == "CHAT_RATE_LIMIT":
+        _user_buckets.clear()
@@ -1,8 +1,12 @@
 from django.urls import path
 
 from .views import (
+    ChatConnectionStatsView,
     ChatMessageListCreateView,
+    ChatMessageSearchView,
     ChatSessionListCreateView,
+    ChatSyncView,
+    ChatTranscriptExportView,
     VoiceLogListCreateView,
 )
 
@@ -12,10 +16,26 @@ urlpatterns = [
         ChatSessionListCreateView.as_view(),
         name="chat-sessions-list-create",
     ),
+    path(
+        "chat-sessions/<int:session_id>/transcript",
+        ChatTranscriptExportView.as_view(),
+        name="chat-sessions-transcript",
+    ),
     path(
         "chat-messages",
         ChatMessageListCreateView.as_view(),
         name="chat-messages-list-create",
     ),
+    path(
+        "chat-messages/search",
+        ChatMessageSearchView.as_view(),
+        name="chat-messages-search",
+    ),
+    path("sync", ChatSyncView.as_view(), name="chat-sync"),
+    path(
+        "chat-connections/stats",
+        ChatConnectionStatsView.as_view(),
+        name="chat-connections-stats",
+    ),
     path("voice-logs", VoiceLogListCreateView.as_view(), name="voice-logs-list-create"),
 ]
@@ -1,9 +1,30 @@
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+from django.db import transaction
+from django.http import StreamingHttpResponse
+from django.shortcuts import get_object_or_404
 from django.utils import timezone
+from django.utils.cache import patch_vary_headers
 from rest_framework import generics, permissions
-from rest_framework.exceptions import PermissionDenied
-
-from .models import ChatLog, ChatSession, Sender, VoiceLog
-from .serializers import ChatLogSerializer, ChatSessionSerializer, VoiceLogSerializer
+from rest_framework.exceptions import NotFound, PermissionDenied
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+from .export import accepts_gzip, stream_transcript
+from .history import get_history, serialize_chat_log
+from .models import ChangeKind, ChatLog, ChatSession, Sender, VoiceLog
+from .outbound import connection_stats
+from .pagination import ChatLogCursorPagination
+from .search import search_messages
+from .serializers import (
+    ChatLogSerializer,
+    ChatMessageSearchQuerySerializer,
+    ChatMessageSearchResultSerializer,
+    ChatSessionSerializer,
+    ChatSyncQuerySerializer,
+    VoiceLogSerializer,
+)
+from .sync import changes_since
 
 
 class ChatSessionListCreateView(generics.ListCreateAPIView):
@@ -12,9 +33,11 @@ class ChatSessionListCreateView(generics.ListCreateAPIView):
 
     def get_queryset(self):
         # Removed explicit authentication check, let permission_classes handle it
-        return ChatSession.objects.filter(user=self.request.user).order_by(
-            "-created_at"
-        )
+        queryset = ChatSession.objects.filter(user=self.request.user)
+        # ordering=activity: 최근 메시지(없으면 생성 시각) 순, 인덱스로 정렬
+        if self.request.query_params.get("ordering") == "activity":
+            return queryset.order_by_activity()
+        return queryset.order_by("-created_at")
 
     def perform_create(self, serializer):
         # Removed explicit authentication check, let permission_classes handle it
@@ -24,6 +47,7 @@ class ChatSessionListCreateView(generics.ListCreateAPIView):
 class ChatMessageListCreateView(generics.ListCreateAPIView):
     serializer_class = ChatLogSerializer
     permission_classes = [permissions.IsAuthenticated]  # Re-enabled
+    pagination_class = ChatLogCursorPagination
 
     def get_queryset(self):
         # Removed explicit authentication check, let permission_classes handle it
@@ -42,13 +66,125 @@ class ChatMessageListCreateView(generics.ListCreateAPIView):
                 "You do not have permission to view this chat session."
             )
 
-        return ChatLog.objects.filter(session_id=session_id).order_by("timestamp")
+        # 정렬과 범위 조건은 ChatLogCursorPagination이 (timestamp, id) 또는 seq로 적용
+        return ChatLog.objects.filter(session_id=session_id)
 
+    @transaction.atomic
     def perform_create(self, serializer):
         # Removed explicit authentication check, let permission_classes handle it
-        serializer.save(
-            user=self.request.user, sender=Sender.USER, timestamp=timezone.now()
+        # seq 할당, 세션 요약 갱신, 변경 이력 기록을 웹소켓 저장 경로와 같이 처리
+        chat_log = ChatLog(
+            **serializer.validated_data,
+            user=self.request.user,
+            sender=Sender.USER,
+            timestamp=timezone.now(),
+        )
+        ChatLog.objects.create_in_sequence([chat_log])
+        if chat_log.pk is None:
+            # 검증 이후 세션이 삭제되었다
+            raise NotFound("Chat session not found.")
+        serializer.instance = chat_log
+        # 웹소켓 재접속 시 재전송할 수 있도록 최근 메시지 링 버퍼에도 적재
+        history = get_history(get_channel_layer())
+        transaction.on_commit(
+            lambda: async_to_sync(history.extend)(
+                chat_log.session_id, [serialize_chat_log(chat_log)]
+            )
+        )
+
+
+class ChatMessageSearchView(APIView):
+    permission_classes = [permissions.IsAuthenticated]
+    default_limit = 20
+    max_limit = 100
+
+    def get(self, request):
+        serializer = ChatMessageSearchQuerySerializer(data=request.query_params)
+        serializer.is_valid(raise_exception=True)
+        query = serializer.validated_data["q"]
+        limit = min(
+            serializer.validated_data.get("limit", self.default_limit), self.max_limit
+        )
+        offset = serializer.validated_data.get("offset", 0)
+
+        # 다음 페이지 존재 여부 확인을 위해 하나 더 조회
+        rows = search_messages(request.user.id, query, limit + 1, offset)
+        return Response(
+            {
+                "next_offset": offset + limit if len(rows) > limit else None,
+                "results": ChatMessageSearchResultSerializer(
+                    rows[:limit], many=True
+                ).data,
+            }
+        )
+
+
+class ChatSyncView(APIView):
+    """
+    GET sync?since=<version>: 마지막으로 받은 version 이후 바뀐 세션/메시지/음성 기록과
+    삭제된 id를 반환한다. 응답의 version을 저장해 두었다가 다음 요청의 since로 쓴다.
+    """
+
+    permission_classes = [permissions.IsAuthenticated]
+    default_limit = 500
+    max_limit = 1000
+    serializer_classes = {
+        ChangeKind.SESSION: ("sessions", ChatSessionSerializer),
+        ChangeKind.MESSAGE: ("messages", ChatLogSerializer),
+        ChangeKind.VOICE_LOG: ("voice_logs", VoiceLogSerializer),
+    }
+
+    def get(self, request):
+        serializer = ChatSyncQuerySerializer(data=request.query_params)
+        serializer.is_valid(raise_exception=True)
+        limit = min(
+            serializer.validated_data.get("limit", self.default_limit), self.max_limit
+        )
+
+        changes = changes_since(
+            request.user.id, serializer.validated_data["since"], limit
         )
+        data = {"version": changes["version"], "has_more": changes["has_more"]}
+        deleted = {}
+        for kind, (key, serializer_class) in self.serializer_classes.items():
+            data[key] = serializer_class(changes["objects"][kind], many=True).data
+            deleted[key] = changes["deleted"][kind]
+        data["deleted"] = deleted
+        return Response(data)
+
+
+class ChatTranscriptExportView(APIView):
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get(self, request, session_id):
+        session = get_object_or_404(ChatSession, id=session_id)
+        if session.user_id != request.user.id:
+            raise PermissionDenied(
+                "You do not have permission to view this chat session."
+            )
+
+        # 세션 길이와 무관하게 메모리 사용량이 일정하도록 스트리밍으로 응답
+        use_gzip = accepts_gzip(request.headers.get("Accept-Encoding", ""))
+        response = StreamingHttpResponse(
+            stream_transcript(session.id, gzip=use_gzip),
+            content_type="application/x-ndjson",
+        )
+        if use_gzip:
+            response["Content-Encoding"] = "gzip"
+        patch_vary_headers(response, ["Accept-Encoding"])
+        response["Content-Disposition"] = (
+            f'attachment; filename="chat-session-{session.id}.ndjson"'
+        )
+        return response
+
+
+class ChatConnectionStatsView(APIView):
+    """이 워커 프로세스의 웹소켓 연결별 송신 큐 지표 (lag 큰 순). 운영자 전용."""
+
+    permission_classes = [permissions.IsAdminUser]
+
+    def get(self, request):
+        return Response({"connections": connection_stats()})
 
 
 class VoiceLogListCreateView(generics.ListCreateAPIView):
@@ -73,5 +209,6 @@ class VoiceLogListCreateView(generics.ListCreateAPIView):
         return VoiceLog.objects.filter(session_id=session_id).order_by("timestamp")
 
     def perform_create(self, serializer):
-        # output_audio_url, transcribed_text 등은 AI 처리 후 별도로 업데이트
+        # pending 상태로 저장만 하고 반환한다. output_audio_url, transcribed_text는
+        # process_voice_logs 워커(chat/voice.py)가 처리 후 채운다
         serializer.save(user=self.request.user, timestamp=timezone.now())
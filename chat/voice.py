@@ -0,0 +1,215 @@
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from urllib.parse import urlsplit
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.db import close_old_connections, transaction
+from django.db.models import F, Q
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from .models import ChangeKind, ChangeLog, VoiceLog, VoiceStatus
+
+logger = logging.getLogger(__name__)
+
+DEFAULTS = {
+    # dotted path. 기본값이 없다: ai.speech.stub_*는 테스트 전용
+    "TRANSCRIBER": None,  # (input_audio_url) -> text
+    "SYNTHESIZER": None,  # (text) -> output_audio_url
+    "WORKERS": 4,
+    "BATCH_SIZE": 20,
+    "POLL_INTERVAL": 1.0,  # seconds
+    "STALE_AFTER": 300,  # seconds, processing 상태로 멈춘 작업을 다시 가져가는 기준
+    # 이만큼 가져간 뒤에도 processing으로 멈춘 작업은 failed로 처리
+    # (워커를 죽이는 입력을 계속 다시 가져가지 않도록)
+    "MAX_ATTEMPTS": 3,
+}
+
+UPLOAD_DEFAULTS = {
+    # 업로드 파일(.part 임시 파일 포함)을 쓰는 디렉터리. 음성 파이프라인 워커도
+    # 읽을 수 있는 공유 스토리지여야 하고, 그 내용이 URL 아래에서 제공되어야 한다
+    "DIR": None,
+    "URL": None,  # 절대 URL (예: https://cdn.example.com/voice/)
+    "INITIAL_SIZE": 1024 * 1024,  # bytes, 업로드마다 미리 할당하는 크기
+    "MAX_SIZE": 25 * 1024 * 1024,  # bytes
+    "PARTIAL_TRANSCRIBER": None,  # dotted path, (path, size) -> text
+    "PARTIAL_INTERVAL": 256 * 1024,  # bytes, 부분 인식 간격
+}
+
+
+def get_upload_config():
+    config = {**UPLOAD_DEFAULTS, **getattr(settings, "VOICE_UPLOAD", {})}
+    url = urlsplit(config["URL"] or "")
+    if not config["DIR"] or url.scheme not in ("http", "https") or not url.netloc:
+        # VoiceLog.input_audio_url은 URLField이고 파이프라인이 이 URL로 오디오를 읽는다
+        raise ImproperlyConfigured(
+            "VOICE_UPLOAD needs a shared storage DIR and an absolute http(s) URL."
+        )
+    return config
+
+
+class VoicePipeline:
+    """
+    대기(pending) 중인 VoiceLog를 배치로 가져와 제한된 워커 풀에서
+    STT(transcriber) → TTS(synthesizer) 단계를 실행하고, 결과를
+    bulk_update로 한 번에 기록한다. API 요청 스레드는 VoiceLog를
+    pending으로 저장만 하고 바로 반환한다.
+    """
+
+    def __init__(
+        self,
+        transcriber,
+        synthesizer,
+        workers=4,
+        batch_size=20,
+        poll_interval=1.0,
+        stale_after=300,
+        max_attempts=3,
+    ):
+        self.transcriber = transcriber
+        self.synthesizer = synthesizer
+        self.batch_size = batch_size
+        self.poll_interval = poll_interval
+        self.stale_after = stale_after
+        self.max_attempts = max_attempts
+        self.executor = ThreadPoolExecutor(
+            max_workers=workers, thread_name_prefix="voice-pipeline"
+        )
+        self.processed = 0
+        self.failed = 0
+        self.total_latency = 0.0
+        self.max_latency = 0.0
+
+    @classmethod
+    def from_settings(cls):
+        config = {**DEFAULTS, **getattr(settings, "VOICE_PIPELINE", {})}
+        if not config["TRANSCRIBER"] or not config["SYNTHESIZER"]:
+            raise ImproperlyConfigured(
+                "VOICE_PIPELINE TRANSCRIBER and SYNTHESIZER must be configured."
+            )
+        return cls(
+            transcriber=import_string(config["TRANSCRIBER"]),
+            synthesizer=import_string(config["SYNTHESIZER"]),
+            workers=config["WORKERS"],
+            batch_size=config["BATCH_SIZE"],
+            poll_interval=config["POLL_INTERVAL"],
+            stale_after=config["STALE_AFTER"],
+            max_attempts=config["MAX_ATTEMPTS"],
+        )
+
+    def queue_depth(self):
+        return VoiceLog.objects.filter(status=VoiceStatus.PENDING).count()
+
+    def stats(self):
+        completed = self.processed + self.failed
+        return {
+            "queue_depth": self.queue_depth(),
+            "processed": self.processed,
+            "failed": self.failed,
+            "avg_latency_ms": (
+                self.total_latency / completed * 1000 if completed else 0.0
+            ),
+            "max_latency_ms": self.max_latency * 1000,
+        }
+
+    def claim(self):
+        """
+        처리할 작업을 processing 상태로 바꾸며 가져온다. 멈춘 작업을
+        MAX_ATTEMPTS번 가져갔다면 다시 가져가지 않고 failed로 바꾼다.
+        """
+        stale = timezone.now() - timedelta(seconds=self.stale_after)
+        with transaction.atomic():
+            # 여러 워커 프로세스가 같은 행을 가져가지 않도록 잠긴 행은 건너뛴다
+            rows = list(
+                VoiceLog.objects.select_for_update(skip_locked=True)
+                .filter(
+                    Q(status=VoiceStatus.PENDING)
+                    | Q(status=VoiceStatus.PROCESSING, updated_at__lt=stale)
+                )
+                .order_by("id")
+                .values_list("id", "user_id", "attempts")[: self.batch_size]
+            )
+            ids, exhausted = [], []
+            for voice_log_id, _, attempts in rows:
+                if attempts >= self.max_attempts:
+                    exhausted.append(voice_log_id)
+                else:
+                    ids.append(voice_log_id)
+            now = timezone.now()
+            VoiceLog.objects.filter(id__in=ids).update(
+                status=VoiceStatus.PROCESSING,
+                attempts=F("attempts") + 1,
+                updated_at=now,
+            )
+            if exhausted:
+                VoiceLog.objects.filter(id__in=exhausted).update(
+                    status=VoiceStatus.FAILED, updated_at=now
+                )
+                self.failed += len(exhausted)
+                logger.error(
+                    "Giving up on VoiceLogs %s after %d attempts",
+                    exhausted,
+                    self.max_attempts,
+                )
+            ChangeLog.objects.record(
+                (user_id, ChangeKind.VOICE_LOG, voice_log_id, False)
+                for voice_log_id, user_id, _ in rows
+            )
+        return list(
+            VoiceLog.objects.filter(id__in=ids)
+            .order_by("id")
+            .only("id", "user_id", "input_audio_url")
+        )
+
+    def _process(self, voice_log):
+        started = time.perf_counter()
+        try:
+            voice_log.transcribed_text = self.transcriber(voice_log.input_audio_url)
+            voice_log.output_audio_url = self.synthesizer(voice_log.transcribed_text)
+            voice_log.status = VoiceStatus.DONE
+        except Exception:
+            logger.exception("Voice processing failed for VoiceLog %s", voice_log.id)
+            voice_log.status = VoiceStatus.FAILED
+        return voice_log, time.perf_counter() - started
+
+    def run_once(self):
+        """한 배치를 처리하고 처리한 작업 수를 반환한다."""
+        voice_logs = self.claim()
+        if not voice_logs:
+            return 0
+
+        results = list(self.executor.map(self._process, voice_logs))
+        now = timezone.now()
+        for voice_log, latency in results:
+            voice_log.updated_at = now
+            if voice_log.status == VoiceStatus.DONE:
+                self.processed += 1
+            else:
+                self.failed += 1
+            self.total_latency += latency
+            self.max_latency = max(self.max_latency, latency)
+
+        with transaction.atomic():
+            VoiceLog.objects.bulk_update(
+                [voice_log for voice_log, _ in results],
+                ["status", "transcribed_text", "output_audio_url", "updated_at"],
+            )
+            ChangeLog.objects.record(
+                (voice_log.user_id, ChangeKind.VOICE_LOG, voice_log.id, False)
+                for voice_log, _ in results
+            )
+        return len(results)
+
+    def run_forever(self, stop_event=None):
+        stop_event = stop_event or threading.Event()
+        while not stop_event.is_set():
+            close_old_connections()
+            if self.run_once() == 0:
+                stop_event.wait(self.poll_interval)
+
+    def shutdown(self):
+        self.executor.shutdown(wait=True)
@@ -55,6 +55,7 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     "django.middleware.security.SecurityMiddleware",
+    "ai.middleware.RequestLogMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
     "django.middleware.csrf.CsrfViewMiddleware",
@@ -100,6 +101,130 @@ else:
         },
     }
 
+# ChatConsumer 메시지 write-behind 버퍼 (chat/buffer.py)
+CHAT_WRITE_BUFFER = {
+    "ENABLED": os.environ.get("CHAT_WRITE_BUFFER_ENABLED", "0") == "1",
+    "MAX_SIZE": int(os.environ.get("CHAT_WRITE_BUFFER_MAX_SIZE", "100")),
+    "FLUSH_INTERVAL": float(os.environ.get("CHAT_WRITE_BUFFER_FLUSH_INTERVAL", "0.05")),
+}
+
+# 웹소켓 재접속 시 재전송용 세션별 최근 메시지 링 버퍼 (chat/history.py)
+CHAT_HISTORY = {
+    "RING_SIZE": int(os.environ.get("CHAT_HISTORY_RING_SIZE", "200")),
+    "DB_REPLAY_LIMIT": int(os.environ.get("CHAT_HISTORY_DB_REPLAY_LIMIT", "500")),
+}
+
+# ChatConsumer 수신 프레임 rate limit (chat/throttling.py)
+CHAT_RATE_LIMIT = {
+    "RATE": float(os.environ.get("CHAT_RATE_LIMIT_RATE", "10")),
+    "BURST": int(os.environ.get("CHAT_RATE_LIMIT_BURST", "20")),
+    "USER_RATE": float(os.environ.get("CHAT_RATE_LIMIT_USER_RATE", "0")) or None,
+    "USER_BURST": int(os.environ.get("CHAT_RATE_LIMIT_USER_BURST", "0")) or None,
+    "POLICY": os.environ.get("CHAT_RATE_LIMIT_POLICY", "drop"),
+}
+
+# 웹소켓 연결별 송신 큐 크기와 느린 클라이언트 처리 정책 (chat/outbound.py)
+CHAT_OUTBOUND = {
+    "MAX_SIZE": int(os.environ.get("CHAT_OUTBOUND_MAX_SIZE", "64")),
+    "POLICY": os.environ.get("CHAT_OUTBOUND_POLICY", "coalesce"),
+}
+
+# 요청 로그(ai.RequestLog) 비동기 배치 기록 (ai/middleware.py)
+AI_REQUEST_LOG = {
+    "ENABLED": os.environ.get(
+        "AI_REQUEST_LOG_ENABLED", "0" if os.environ.get("RUNNING_TESTS") else "1"
+    )
+    == "1",
+    "MAX_QUEUE": int(os.environ.get("AI_REQUEST_LOG_MAX_QUEUE", "10000")),
+    "BATCH_SIZE": int(os.environ.get("AI_REQUEST_LOG_BATCH_SIZE", "500")),
+    "FLUSH_INTERVAL": float(os.environ.get("AI_REQUEST_LOG_FLUSH_INTERVAL", "1.0")),
+    "BODY_SAMPLE_RATE": float(os.environ.get("AI_REQUEST_LOG_BODY_SAMPLE_RATE", "0.1")),
+    "BODY_MAX_LENGTH": int(os.environ.get("AI_REQUEST_LOG_BODY_MAX_LENGTH", "2048")),
+}
+
+# ChatConsumer가 스트리밍할 AI 응답 생성기 (dotted path, 비우면 AI 응답 없음)
+# 예: "ai.generation.stub_generator"
+AI_REPLY_GENERATOR = os.environ.get("AI_REPLY_GENERATOR") or None
+
+# 같은 입력의 AI 응답 재사용 캐시: 메모리 LRU + ModelResult (ai/cache.py)
+AI_RESULT_CACHE = {
+    "ENABLED": os.environ.get("AI_RESULT_CACHE_ENABLED", "0") == "1",
+    "MAX_ENTRIES": int(os.environ.get("AI_RESULT_CACHE_MAX_ENTRIES", "1024")),
+    "TTL": int(os.environ.get("AI_RESULT_CACHE_TTL", str(60 * 60 * 24))),
+}
+
+# AICharacterState 기억: 토큰 예산과 백그라운드 압축 (ai/memory.py)
+AI_MEMORY = {
+    "TOKEN_BUDGET": int(os.environ.get("AI_MEMORY_TOKEN_BUDGET", "1024")),
+    "SUMMARY_BUDGET": int(os.environ.get("AI_MEMORY_SUMMARY_BUDGET", "256")),
+    "COMPACT_AT": int(os.environ.get("AI_MEMORY_COMPACT_AT", "2048")),
+    "SUMMARIZER": os.environ.get(
+        "AI_MEMORY_SUMMARIZER", "ai.memory.extractive_summary"
+    ),
+}
+
+# AI 프롬프트 컨텍스트 토큰 예산 (ai/context.py)
+AI_CONTEXT = {
+    "TOKEN_BUDGET": int(os.environ.get("AI_CONTEXT_TOKEN_BUDGET", "4096")),
+    "MEMORY_BUDGET": int(os.environ.get("AI_CONTEXT_MEMORY_BUDGET", "512")),
+}
+
+# 워커 프로세스 단위 AI 추론 마이크로 배치 (ai/scheduler.py)
+# AI_REPLY_GENERATOR="ai.scheduler.batched_generator"일 때 사용
+AI_BATCH_SCHEDULER = {
+    "BACKEND": os.environ.get("AI_BATCH_BACKEND", "ai.generation.stub_batch_model"),
+    "MAX_BATCH_SIZE": int(os.environ.get("AI_BATCH_MAX_SIZE", "16")),
+    "MAX_WAIT": float(os.environ.get("AI_BATCH_MAX_WAIT", "0.01")),
+    "MAX_CONCURRENCY": int(os.environ.get("AI_BATCH_MAX_CONCURRENCY", "1")),
+}
+
+# 모델 서버 클라이언트: 연결 풀, 동시 호출 제한, deadline, hedge (ai/client.py)
+# BASE_URL이 비어 있으면 클라이언트를 쓰지 않는다
+AI_CLIENT = {
+    "BASE_URL": os.environ.get("AI_CLIENT_BASE_URL") or None,
+    "MODEL_VERSION": os.environ.get("AI_CLIENT_MODEL_VERSION", "default"),
+    "POOL_SIZE": int(os.environ.get("AI_CLIENT_POOL_SIZE", "10")),
+    "MAX_CONCURRENCY": int(os.environ.get("AI_CLIENT_MAX_CONCURRENCY", "32")),
+    "PER_USER_CONCURRENCY": int(os.environ.get("AI_CLIENT_PER_USER_CONCURRENCY", "2")),
+    "TIMEOUT": float(os.environ.get("AI_CLIENT_TIMEOUT", "30")),
+    "HEDGE_AFTER": float(os.environ.get("AI_CLIENT_HEDGE_AFTER", "0")) or None,
+}
+
+# ai 로그 보존 기간과 일별 집계 (ai/retention.py, manage.py purge_ai_logs)
+AI_RETENTION = {
+    "REQUEST_LOG_DAYS": int(os.environ.get("AI_RETENTION_REQUEST_LOG_DAYS", "30")),
+    "MODEL_RESULT_DAYS": int(os.environ.get("AI_RETENTION_MODEL_RESULT_DAYS", "30")),
+    "PREPROCESSED_DATA_DAYS": int(
+        os.environ.get("AI_RETENTION_PREPROCESSED_DATA_DAYS", "30")
+    ),
+    "BATCH_SIZE": int(os.environ.get("AI_RETENTION_BATCH_SIZE", "1000")),
+    "BATCH_SLEEP": float(os.environ.get("AI_RETENTION_BATCH_SLEEP", "0")),
+}
+
+# VoiceLog STT/TTS 처리 파이프라인 (chat/voice.py, manage.py process_voice_logs)
+# TRANSCRIBER/SYNTHESIZER가 없으면 process_voice_logs는 실행되지 않는다
+VOICE_PIPELINE = {
+    "TRANSCRIBER": os.environ.get("VOICE_TRANSCRIBER") or None,
+    "SYNTHESIZER": os.environ.get("VOICE_SYNTHESIZER") or None,
+    "WORKERS": int(os.environ.get("VOICE_PIPELINE_WORKERS", "4")),
+    "BATCH_SIZE": int(os.environ.get("VOICE_PIPELINE_BATCH_SIZE", "20")),
+    "MAX_ATTEMPTS": int(os.environ.get("VOICE_PIPELINE_MAX_ATTEMPTS", "3")),
+}
+if os.environ.get("RUNNING_TESTS"):
+    # 가짜 인식 결과와 tts.invalid URL을 만드는 스텁은 테스트에서만 쓴다
+    VOICE_PIPELINE["TRANSCRIBER"] = "ai.speech.stub_transcribe"
+    VOICE_PIPELINE["SYNTHESIZER"] = "ai.speech.stub_synthesize"
+
+# 웹소켓 음성 업로드 저장 위치 (chat.consumers.VoiceUploadConsumer)
+VOICE_UPLOAD = {
+    # 음성 파이프라인 워커와 공유하는 스토리지, 그 내용을 제공하는 절대 URL
+    # (둘 다 설정하지 않으면 음성 업로드 연결을 받지 않는다)
+    "DIR": os.environ.get("VOICE_UPLOAD_DIR") or None,
+    "URL": os.environ.get("VOICE_UPLOAD_URL") or None,
+    "MAX_SIZE": int(os.environ.get("VOICE_UPLOAD_MAX_SIZE", str(25 * 1024 * 1024))),
+    "PARTIAL_TRANSCRIBER": os.environ.get("VOICE_PARTIAL_TRANSCRIBER") or None,
+}
+
 
 # Database
 # https://docs.djangoproject.com/en/5.0/ref/settings/#databases
@@ -134,10 +259,17 @@ if os.environ.get("RUNNING_TESTS"):
 else:
     REST_FRAMEWORK = {
         "DEFAULT_AUTHENTICATION_CLASSES": (
-            "rest_framework_simplejwt.authentication.JWTAuthentication",
+            "users.authentication.CachedJWTAuthentication",
         )
     }
 
+# JWT 인증 사용자 프로세스 캐시 (users/authentication.py)
+AUTH_USER_CACHE = {
+    "MAX_ENTRIES": int(os.environ.get("AUTH_USER_CACHE_MAX_ENTRIES", "10000")),
+    "TTL": int(os.environ.get("AUTH_USER_CACHE_TTL", "60")),
+    "SHARED_CACHE": os.environ.get("AUTH_USER_CACHE_SHARED_CACHE") or None,
+}
+
 SIMPLE_JWT = {
     "ACCESS_TOKEN_LIFETIME": timedelta(minutes=60),
     "REFRESH_TOKEN_LIFETIME": timedelta(days=1),
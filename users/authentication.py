@@ -0,0 +1,161 @@
+import copy
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+from django.utils.translation import gettext_lazy as _
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.utils import get_md5_hash_password
+
+DEFAULTS = {
+    "MAX_ENTRIES": 10000,  # 프로세스마다 캐시하는 사용자 수
+    "TTL": 60,  # seconds, 신호를 놓친 변경(QuerySet.update 등)이 반영되는 최대 시간
+    # CACHES alias. 설정하면 다른 워커 프로세스의 무효화도 반영한다
+    # (요청마다 DB 조회 대신 이 캐시를 한 번 조회)
+    "SHARED_CACHE": None,
+}
+
+
+class UserCache:
+    """
+    인증된 사용자 객체의 프로세스 로컬 LRU + TTL 캐시.
+
+    SHARED_CACHE가 있으면 사용자별 버전 키를 공유 캐시에 두고, 로컬 항목의
+    버전이 다르면 버린다. 한 워커에서 무효화하면 모든 워커에 반영된다.
+    """
+
+    def __init__(self, max_entries=10000, ttl=60, shared_cache=None):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.shared_cache = caches[shared_cache] if shared_cache else None
+        # str(user_id) -> (user, version, expires_at)
+        # 토큰 클레임은 문자열, 신호의 instance.pk는 정수이므로 키를 통일한다
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._invalidations = 0
+        self.hits = 0
+        self.misses = 0
+
+    def stats(self):
+        return {"entries": len(self._entries), "hits": self.hits, "misses": self.misses}
+
+    def _version_key(self, user_id):
+        return f"auth-user-version:{user_id}"
+
+    def _shared_version(self, user_id):
+        if self.shared_cache is None:
+            return None
+        return self.shared_cache.get(self._version_key(user_id), 0)
+
+    def marker(self, user_id):
+        """
+        DB 조회 전에 받아 두고 set()에 넘긴다. 그 사이 이 프로세스에서 무효화되면
+        저장하지 않고, 다른 프로세스에서 무효화되면 저장한 항목의 버전이 맞지 않아
+        다음 get()에서 버린다.
+        """
+        return self._invalidations, self._shared_version(str(user_id))
+
+    def get(self, user_id):
+        user_id = str(user_id)
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is not None:
+                self._entries.move_to_end(user_id)
+        if entry is not None:
+            user, version, expires_at = entry
+            if expires_at > time.monotonic() and (
+                version == self._shared_version(user_id)
+            ):
+                self.hits += 1
+                return copy.copy(user)
+            self.discard(user_id)
+        self.misses += 1
+        return None
+
+    def set(self, user_id, user, marker):
+        user_id = str(user_id)
+        invalidations, version = marker
+        with self._lock:
+            if invalidations != self._invalidations:
+                return
+            self._entries[user_id] = (
+                copy.copy(user),
+                version,
+                time.monotonic() + self.ttl,
+            )
+            self._entries.move_to_end(user_id)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def discard(self, user_id):
+        user_id = str(user_id)
+        with self._lock:
+            self._entries.pop(user_id, None)
+
+    def invalidate(self, user_id):
+        user_id = str(user_id)
+        with self._lock:
+            self._invalidations += 1
+            self._entries.pop(user_id, None)
+        if self.shared_cache is not None:
+            self.shared_cache.set(
+                self._version_key(user_id), time.time_ns(), timeout=self.ttl
+            )
+
+
+_cache = None
+
+
+def get_user_cache():
+    global _cache
+    if _cache is None:
+        config = {**DEFAULTS, **getattr(settings, "AUTH_USER_CACHE", {})}
+        _cache = UserCache(
+            max_entries=config["MAX_ENTRIES"],
+            ttl=config["TTL"],
+            shared_cache=config["SHARED_CACHE"],
+        )
+    return _cache
+
+
+@receiver(setting_changed)
+def reset_user_cache(*, setting, **kwargs):
+    global _cache
+    if setting in ("AUTH_USER_CACHE", "CACHES"):
+        _cache = None
+
+
+class CachedJWTAuthentication(JWTAuthentication):
+    """
+    JWTAuthentication과 같지만 토큰의 사용자를 UserCache에서 찾아 요청마다
+    users_user를 조회하지 않는다. is_active, role, 비밀번호 등이 바뀌면
+    users.signals가 캐시를 무효화한다.
+    """
+
+    def get_user(self, validated_token):
+        user_id = validated_token.get(api_settings.USER_ID_CLAIM)
+        if user_id is None:
+            return super().get_user(validated_token)
+
+        cache = get_user_cache()
+        user = cache.get(user_id)
+        if user is None:
+            marker = cache.marker(user_id)
+            user = super().get_user(validated_token)
+            cache.set(user_id, user, marker)
+            return user
+
+        # 비밀번호 변경 후 발급 전 토큰 거부 (캐시된 사용자에도 토큰마다 확인)
+        if api_settings.CHECK_REVOKE_TOKEN and validated_token.get(
+            api_settings.REVOKE_TOKEN_CLAIM
+        ) != get_md5_hash_password(user.password):
+            raise AuthenticationFailed(
+                _("The user's password has been changed."), code="password_changed"
+            )
+        return user
@@ -0,0 +1,27 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .authentication import get_user_cache
+from .models import User
+
+# 이 필드가 바뀌면 캐시된 인증 사용자를 버린다 (update_fields 없이 저장하면 항상)
+AUTH_FIELDS = {"password", "is_active", "role", "is_staff", "is_superuser"}
+
+
+@receiver(post_save, sender=User)
+def invalidate_cached_user(sender, instance, created, update_fields, **kwargs):
+    if created:
+        return
+    if update_fields is None or AUTH_FIELDS.intersection(update_fields):
+        invalidate_on_commit(instance.pk)
+
+
+@receiver(post_delete, sender=User)
+def discard_deleted_user(sender, instance, **kwargs):
+    invalidate_on_commit(instance.pk)
+
+
+def invalidate_on_commit(user_id):
+    # 커밋 전에 무효화하면 동시 요청이 커밋 전 행을 다시 캐시할 수 있다
+    transaction.on_commit(lambda: get_user_cache().invalidate(user_id))
@@ -1,11 +1,15 @@
 import pytest
 from django.contrib.admin.sites import AdminSite
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 from django.utils import timezone
 from rest_framework import status
 from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import AccessToken
 
 from users.admin import TokenAdmin, UserAdmin, UserProfileAdmin
+from users.authentication import CachedJWTAuthentication, UserCache, get_user_cache
 from users.models import Token, User, UserProfile
 from users.serializers import (
     PasswordChangeSerializer,
@@ -14,6 +18,7 @@ from users.serializers import (
     UserProfileSerializer,
     UserSerializer,
 )
+from users.views import UserProfileView
 
 
 @pytest.mark.django_db
@@ -243,3 +248,71 @@ class TestAdmin:
         readonly_fields = self.token_admin.get_readonly_fields(object())
         assert "issued_at" in readonly_fields
         assert "expires_at" in readonly_fields
+
+
+@pytest.mark.django_db
+class TestCachedJWTAuthentication:
+    @pytest.fixture(autouse=True)
+    def setup(self, settings, monkeypatch):
+        # authentication_classes는 뷰 클래스 정의 시점에 정해지므로 직접 바꾼다
+        monkeypatch.setattr(
+            UserProfileView, "authentication_classes", [CachedJWTAuthentication]
+        )
+        settings.AUTH_USER_CACHE = {}  # 테스트마다 새 캐시
+        self.user = User.objects.create_user(email="jwt@test.com", password="pw")
+        UserProfile.objects.create(user=self.user, nickname="jwt")
+        self.client = APIClient()
+        self.client.credentials(
+            HTTP_AUTHORIZATION=f"Bearer {AccessToken.for_user(self.user)}"
+        )
+        self.url = reverse("user-profile", args=[self.user.id])
+
+    def get(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(self.url)
+        return response, len(queries)
+
+    def test_cached_user_saves_a_query(self):
+        first, first_queries = self.get()
+        second, second_queries = self.get()
+        assert first.status_code == second.status_code == status.HTTP_200_OK
+        assert second_queries == first_queries - 1
+        assert get_user_cache().stats()["hits"] == 1
+
+    def test_auth_field_changes_invalidate(self, django_capture_on_commit_callbacks):
+        self.get()
+        # 인증과 무관한 필드만 저장하면 캐시를 유지한다
+        with django_capture_on_commit_callbacks(execute=True):
+            self.user.login_fail_count = 1
+            self.user.save(update_fields=["login_fail_count"])
+        assert self.get()[1] == 1
+
+        # 무효화는 커밋된 뒤에 한다
+        with django_capture_on_commit_callbacks(execute=True):
+            self.user.is_active = False
+            self.user.save(update_fields=["is_active"])
+            assert self.get()[0].status_code == status.HTTP_200_OK
+        response, _ = self.get()
+        assert response.status_code == status.HTTP_401_UNAUTHORIZED
+
+    def test_shared_cache_invalidates_other_processes(self):
+        worker_a = UserCache(shared_cache="default")
+        worker_b = UserCache(shared_cache="default")
+        for cache in (worker_a, worker_b):
+            cache.set(self.user.id, self.user, cache.marker(self.user.id))
+            assert cache.get(self.user.id) == self.user
+
+        worker_a.invalidate(self.user.id)
+        assert worker_b.get(self.user.id) is None
+
+        # 조회 중에 무효화되면 오래된 사용자를 저장하지 않는다
+        marker = worker_b.marker(self.user.id)
+        worker_b.invalidate(self.user.id)
+        worker_b.set(self.user.id, self.user, marker)
+        assert worker_b.get(self.user.id) is None
+
+        # 다른 프로세스에서 무효화되어도 조회 전 버전으로 저장되어 다음 get에서 버린다
+        marker = worker_b.marker(self.user.id)
+        worker_a.invalidate(self.user.id)
+        worker_b.set(self.user.id, self.user, marker)
+        assert worker_b.get(self.user.id) is None